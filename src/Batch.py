@@ -0,0 +1,109 @@
+import sys
+import argparse
+from functools import partial
+from Main import main as run_job
+from modules.module_osm_cache import DEFAULT_CACHE_DIRECTORY
+from modules.module_batch import (
+    read_job_file, prepare_regions, run_batch, DEFAULT_JOB_MEMORY_GB,
+)
+
+
+def parse_arguments(argv):
+    """
+    Parses the command-line arguments of a batch run.
+    :param argv: command-line arguments without the program name
+    :return argparse.Namespace: parsed arguments
+    :raises SystemExit: If the arguments are invalid
+    """
+    parser = argparse.ArgumentParser(usage="python Batch.py <job_file> [options]")
+    parser.add_argument("job_file", help="JSON file listing the regions, module types, "
+                                         "weights, route counts and the output root")
+    parser.add_argument(
+        "--workers", type=int, default=1, help="maximum number of jobs running at once",
+    )
+    parser.add_argument(
+        "--memory-limit-gb", type=float, default=None,
+        help="memory budget of all running jobs in GiB",
+    )
+    parser.add_argument(
+        "--job-memory-gb", type=float, default=DEFAULT_JOB_MEMORY_GB,
+        help="memory reserved per running job in GiB; a job is only started while this "
+             "much memory is available",
+    )
+    parser.add_argument(
+        "--cache-dir", default=DEFAULT_CACHE_DIRECTORY,
+        help="folder of the OpenStreetMap cache the regions are downloaded into once",
+    )
+    parser.add_argument(
+        "--offline", action="store_true",
+        help="only use cached OpenStreetMap data, never download",
+    )
+    parser.add_argument(
+        "--no-plot", action="store_true",
+        help="do not draw the centrality maps of the jobs",
+    )
+    arguments = parser.parse_args(argv)
+    if arguments.workers < 1:
+        parser.error("--workers must be at least 1")
+    if arguments.job_memory_gb <= 0:
+        parser.error("--job-memory-gb must be positive")
+    if arguments.memory_limit_gb is not None and arguments.memory_limit_gb <= 0:
+        parser.error("--memory-limit-gb must be positive")
+    return arguments
+
+
+def main(
+    job_file, workers=1, memory_limit_gb=None, job_memory_gb=DEFAULT_JOB_MEMORY_GB,
+    cache_dir=DEFAULT_CACHE_DIRECTORY, offline=False, plot=True,
+):
+    """
+    Runs all jobs of a job file without user interaction.
+    :param job_file: path of the JSON job file
+    :param workers: maximum number of jobs running at the same time. Default 1
+    :param memory_limit_gb: memory budget of all running jobs in GiB. Default None
+    :param job_memory_gb: memory reserved per running job in GiB. Default 2
+    :param cache_dir: folder of the OpenStreetMap cache. Default the cache of Main.py
+    :param offline: only use cached OpenStreetMap data. Default False
+    :param plot: draw the centrality maps of the jobs. Default True
+    :raises SystemExit: If the job file is invalid or a job failed
+    """
+    try:
+        jobs, output_root = read_job_file(job_file)
+    except (OSError, ValueError) as error:
+        print(f"Invalid job file: {error}")
+        sys.exit(1)
+
+    failed_regions = {}
+    if not offline:
+        geographical = any(job["module_type"] == "geographical" for job in jobs)
+        failed_regions = prepare_regions(
+            [job["region"] for job in jobs], cache_dir, polygons=geographical
+        )
+    # Skipping the maps does not change the outputs a finished job is recognized by
+    runner = run_job if plot else partial(run_job, plot=False)
+    records = run_batch(
+        jobs, runner, output_root, cache_dir, workers=workers,
+        memory_limit_gb=memory_limit_gb, job_memory_gb=job_memory_gb, offline=offline,
+        failed_regions=failed_regions,
+    )
+
+    statuses = [record["status"] for record in records]
+    print(
+        f"{statuses.count('done')} jobs done, {statuses.count('skipped')} skipped, "
+        f"{statuses.count('failed')} failed."
+    )
+    if "failed" in statuses:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    arguments = parse_arguments(sys.argv[1:])
+    main(
+        arguments.job_file,
+        workers=arguments.workers,
+        memory_limit_gb=arguments.memory_limit_gb,
+        job_memory_gb=arguments.job_memory_gb,
+        cache_dir=arguments.cache_dir,
+        offline=arguments.offline,
+        plot=not arguments.no_plot,
+    )
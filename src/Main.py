@@ -1,11 +1,18 @@
 import os
 import sys
-import tkinter as tk
-from tkinter import filedialog
-from modules.module_create_region import Region
-from modules.module_output_folder import create_output_folder
-from modules.module_networkx_centrality import NetworkxCentrality
-from modules.module_geographical_centrality import GeographicalCentrality
+import argparse
+# Only modules without third party imports are loaded before the arguments are checked;
+# osmnx, geopandas, networkx and matplotlib are imported where they are needed
+from modules.module_options import (
+    MODULE_TYPES, WEIGHTS, BACKENDS, ROUTING_MODES, SAMPLING_STRATEGIES, SPEED_PROFILE_NAMES,
+    DEFAULT_SPEED_PROFILE, DEFAULT_POPULATION_RASTER, RENDERERS, DEFAULT_RENDERER,
+    RASTER_AGGREGATIONS,
+)
+from modules.module_output_folder import (
+    create_output_folder, profile_suffix, centrality_file_name,
+)
+from modules.module_edge_output import OUTPUT_FORMATS
+from modules.module_instrumentation import enable_profiling, disable_profiling, stage
 
 
 def get_output_folder():
@@ -14,6 +21,9 @@ def get_output_folder():
     :return str: Path to selected or created output folder
     :raises SystemExit: If user cancels the folder selection
     """
+    import tkinter as tk
+    from tkinter import filedialog
+
     root = tk.Tk()
     root.withdraw()
 
@@ -26,114 +36,642 @@ def get_output_folder():
     return output_folder
 
 
-def main(region, module_type, weight, number_of_routes):
+def run_edge_criticality(
+    centrality_gdf, csr_graph, top_k, origins, destinations, workers, output_file
+):
     """
-    The main function that orchestrates the workflow for centrality analysis.
-    :param region: Region of interest
-    :param module_type: Type of centrality analysis module ("networkx" or "geographical")
-    :param weight: used weight parameter ("length" or "travel_time")
-    :param number_of_routes: Number of random routes only for geographical centrality analysis
-    :raises SystemExit: If there is an error in the workflow
+    Evaluates the removal of the most central edges and saves the result.
+    :param centrality_gdf: GeoDataFrame with the calculated centrality
+    :param csr_graph: CsrGraph with the routing weight of the centrality
+    :param top_k: number of most central edges removed one at a time
+    :param origins: array of origin node indices of the scenarios
+    :param destinations: array of destination node indices of the scenarios
+    :param workers: number of worker processes
+    :param output_file: path of the GeoPackage or GeoParquet output file
     """
-    # Get selected or created output folder
-    selected_output_folder = get_output_folder()
-    output_folder = create_output_folder(
-        selected_output_folder, region, module_type, weight, number_of_routes
+    from modules.module_edge_criticality import edge_criticality, save_edge_criticality
+
+    print(f"Evaluating the removal of the {top_k} most central edges...")
+    with stage("criticality", scenarios=top_k, pairs=len(origins), workers=workers):
+        criticality_gdf = edge_criticality(
+            centrality_gdf, csr_graph, top_k, origins, destinations, workers=workers
+        )
+        save_edge_criticality(criticality_gdf, output_file)
+
+
+def generate_loads(my_centrality, graph, zone_demand=None, points_per_zone=1):
+    """
+    Counts the edge loads of random routes or assigns a zone demand matrix.
+    :param my_centrality: GeographicalCentrality instance
+    :param graph: The network graph version
+    :param zone_demand: tuple of zones and demand matrix. Default None uses random routes
+    :param points_per_zone: points snapped per zone of the demand matrix. Default 1
+    """
+    if zone_demand is None:
+        my_centrality.generate_random_routes(graph)
+    else:
+        my_centrality.generate_demand_loads(graph, *zone_demand, points_per_zone)
+
+
+def parse_arguments(argv):
+    """
+    Parses the command-line arguments.
+    :param argv: command-line arguments without the program name
+    :return argparse.Namespace: parsed arguments
+    :raises SystemExit: If the arguments are invalid
+    """
+    parser = argparse.ArgumentParser(
+        usage="python Main.py <region> <module_type> <weight> [number_of_routes] [options]"
+    )
+    parser.add_argument("region", help="study area, e.g. Heidelberg,Germany")
+    parser.add_argument("module_type", choices=MODULE_TYPES, help="centrality module")
+    parser.add_argument("weight", choices=WEIGHTS, help="routing weight")
+    parser.add_argument(
+        "number_of_routes", nargs="?", type=int, default=None,
+        help="number of random routes (geographical only)",
+    )
+    parser.add_argument(
+        "--backend", choices=BACKENDS, default="networkx",
+        help="implementation of the networkx betweenness centrality",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=1,
+        help="number of processes for the csr backend, the geographical routes and the "
+             "criticality scenarios",
+    )
+    parser.add_argument(
+        "--pivots", type=int, default=None,
+        help="estimate the csr centrality from this many sampled source nodes",
+    )
+    parser.add_argument(
+        "--adaptive", action="store_true",
+        help="add batches of --pivots (networkx) or of number_of_routes routes "
+             "(geographical) until the centrality is stable",
+    )
+    parser.add_argument(
+        "--tolerance", type=float, default=0.01,
+        help="accepted change per batch of the rank correlation and the top 100 edges of "
+             "adaptive geographical routes",
+    )
+    parser.add_argument(
+        "--time-budget", type=float, default=None,
+        help="maximum time in seconds for adaptive geographical routes",
+    )
+    parser.add_argument(
+        "--max-routes", type=int, default=None,
+        help="maximum number of adaptive geographical routes",
+    )
+    parser.add_argument(
+        "--seed", type=int, default=42,
+        help="seed of the random sampling; geographical routes do not depend on --workers",
     )
+    parser.add_argument(
+        "--largest-component", action="store_true",
+        help="start and end geographical routes only in the largest strongly connected "
+             "component",
+    )
+    parser.add_argument(
+        "--routing", choices=ROUTING_MODES, default="shortest_path",
+        help="solve geographical routes one by one, with one shortest path tree per origin "
+             "or with a contraction hierarchy saved next to the graph",
+    )
+    parser.add_argument(
+        "--tile-size", type=float, default=None,
+        help="route geographical centrality tile by tile on square tiles of this size in "
+             "degrees, for networks too large for the memory; requires --graph-file",
+    )
+    parser.add_argument(
+        "--destinations-per-origin", type=int, default=1,
+        help="number of geographical route destinations sampled per origin",
+    )
+    parser.add_argument(
+        "--cache-dir", default=None,
+        help="folder to cache OpenStreetMap graphs and study area polygons in",
+    )
+    parser.add_argument(
+        "--offline", action="store_true",
+        help="only use cached OpenStreetMap data, never download",
+    )
+    parser.add_argument(
+        "--speed-profiles", nargs="+", choices=SPEED_PROFILE_NAMES,
+        default=[DEFAULT_SPEED_PROFILE],
+        help="speed profiles of the travel_time weight, one result per profile",
+    )
+    parser.add_argument(
+        "--graph-file", default=None,
+        help="folder of a compact graph file, run from it instead of a NetworkX graph; "
+             "created from the downloaded data if it does not exist",
+    )
+    parser.add_argument(
+        "--criticality", type=int, default=None, metavar="K",
+        help="remove each of the K most central edges and measure the impact on routes",
+    )
+    parser.add_argument(
+        "--criticality-pairs", type=int, default=1000,
+        help="number of origin destination pairs of the criticality scenarios",
+    )
+    parser.add_argument(
+        "--sampling", choices=SAMPLING_STRATEGIES, default="uniform",
+        help="sample geographical route ends uniformly or weighted by population",
+    )
+    parser.add_argument(
+        "--population-raster", default=DEFAULT_POPULATION_RASTER,
+        help="population raster of the population sampling",
+    )
+    parser.add_argument(
+        "--zones", default=None,
+        help="file of zone polygons; load the --demand matrix instead of random routes",
+    )
+    parser.add_argument(
+        "--demand", default=None,
+        help="CSV demand matrix between the --zones, origins in rows and destinations "
+             "in columns",
+    )
+    parser.add_argument(
+        "--zone-id", default="zone_id", help="column of the zone ids in the --zones file",
+    )
+    parser.add_argument(
+        "--output-format", choices=sorted(set(OUTPUT_FORMATS.values())), default="gpkg",
+        help="format of the output files; parquet and arrow require pyarrow",
+    )
+    parser.add_argument(
+        "--output-folder", default=None,
+        help="folder to create the output folder of the run in, instead of asking for one",
+    )
+    parser.add_argument(
+        "--no-plot", action="store_true",
+        help="do not draw the centrality maps, e.g. in batch runs",
+    )
+    parser.add_argument(
+        "--renderer", choices=RENDERERS, default=DEFAULT_RENDERER,
+        help="draw the maps with GeoDataFrame.plot, or faster as one collection of "
+             "simplified lines or as a raster image",
+    )
+    parser.add_argument(
+        "--raster-aggregation", choices=RASTER_AGGREGATIONS, default="max",
+        help="maximum or sum of the edges crossing a pixel of the raster renderer",
+    )
+    parser.add_argument(
+        "--profile", action="store_true",
+        help="record time, memory and item counts of every stage in run_report.json",
+    )
+    parser.add_argument(
+        "--points-per-zone", type=int, default=1,
+        help="snap the zone centroid (1) or this number of sampled points per zone",
+    )
+    arguments = parser.parse_args(argv)
+    if arguments.workers < 1:
+        parser.error("--workers must be at least 1")
+    networkx_backend = arguments.module_type == "networkx" and arguments.backend != "csr"
+    if arguments.workers > 1 and networkx_backend:
+        parser.error("--workers requires --backend csr")
+    if arguments.pivots is not None and arguments.backend != "csr":
+        parser.error("--pivots requires --backend csr")
+    if arguments.pivots is not None and arguments.pivots < 1:
+        parser.error("--pivots must be at least 1")
+    if arguments.adaptive and arguments.module_type == "networkx" and arguments.pivots is None:
+        parser.error("--adaptive requires --pivots")
+    if arguments.adaptive and arguments.module_type == "geographical":
+        if not arguments.number_of_routes:
+            parser.error("--adaptive requires a number_of_routes per batch")
+        if arguments.zones is not None:
+            parser.error("--adaptive cannot be combined with --zones")
+        if (
+            arguments.tolerance == 0 and arguments.time_budget is None
+            and arguments.max_routes is None
+        ):
+            parser.error("--adaptive with --tolerance 0 requires --time-budget or --max-routes")
+    if not 0 <= arguments.tolerance < 1:
+        parser.error("--tolerance must be at least 0 and below 1")
+    if arguments.time_budget is not None and arguments.time_budget <= 0:
+        parser.error("--time-budget must be positive")
+    if arguments.max_routes is not None and arguments.max_routes < 1:
+        parser.error("--max-routes must be at least 1")
+    if arguments.destinations_per_origin < 1:
+        parser.error("--destinations-per-origin must be at least 1")
+    if arguments.criticality is not None and arguments.criticality < 1:
+        parser.error("--criticality must be at least 1")
+    if arguments.criticality_pairs < 1:
+        parser.error("--criticality-pairs must be at least 1")
+    if (arguments.zones is None) != (arguments.demand is None):
+        parser.error("--zones and --demand are required together")
+    if arguments.zones is not None and arguments.module_type != "geographical":
+        parser.error("--zones requires the geographical module")
+    if arguments.points_per_zone < 1:
+        parser.error("--points-per-zone must be at least 1")
+    if arguments.tile_size is not None:
+        if arguments.tile_size <= 0:
+            parser.error("--tile-size must be positive")
+        if arguments.module_type != "geographical" or arguments.graph_file is None:
+            parser.error("--tile-size requires the geographical module and --graph-file")
+        for option, used in (
+            ("--zones", arguments.zones is not None), ("--adaptive", arguments.adaptive),
+            ("--criticality", arguments.criticality is not None),
+            ("--largest-component", arguments.largest_component),
+            ("--workers", arguments.workers > 1),
+        ):
+            if used:
+                parser.error(f"--tile-size cannot be combined with {option}")
+    elif arguments.graph_file is not None:
+        if arguments.module_type == "networkx" and arguments.backend != "csr":
+            parser.error("--graph-file requires --backend csr")
+        if arguments.module_type == "geographical" and arguments.routing == "shortest_path":
+            parser.error("--graph-file requires --routing tree or ch")
+    return arguments
 
-    # Check if output folder creation was successful
-    if not output_folder:
-        print("Failed to create the output folder.")
-        sys.exit(1)
+
+def load_network(region, cache_dir=None, offline=False, graph_file=None, osm_download=None):
+    """
+    Loads the street network of a region, from a compact graph, the OpenStreetMap cache or
+    a download.
+    :param region: Region of interest
+    :param cache_dir: folder of the OpenStreetMap cache. Default None disables the cache
+    :param offline: only use cached OpenStreetMap data. Default False
+    :param graph_file: folder of a compact graph to run from. Default None
+    :param osm_download: tuple of edge data frame and graph of the region, already loaded.
+    Default None downloads it
+    :return tuple: Region, edge data frame (None for a compact graph) and network graph
+    :raises SystemExit: If the network can not be loaded
+    """
+    from modules.module_create_region import Region
+    from modules.module_osm_cache import OsmCache
 
     # Create a Region instance for the specified region
-    my_region = Region(region, "drive")
-    edges_df, osm_data = my_region.download_osm()
-
-    # Check module type and weight parameters for networkx analysis
-    if module_type == "networkx":
-        if weight == "length":
-            # Networkx centrality analysis for shortest routes
-            my_centrality = NetworkxCentrality(weight=weight)
-            output_file_path = os.path.join(output_folder, f"Networkx_centrality_{weight}.gpkg")
-            my_centrality.get_centrality_short(
-                osm_data, edges_df, output_file=output_file_path
+    cache = None
+    if cache_dir or offline:
+        cache = OsmCache(cache_dir, offline=offline)
+    my_region = Region(region, "drive", cache=cache)
+    with stage("download", graph_file=graph_file is not None) as counts:
+        if graph_file:
+            edges_df, osm_data = None, my_region.load_compact_graph(graph_file)
+            if osm_data is None:
+                sys.exit(1)
+        else:
+            if osm_download is None:
+                osm_download = my_region.download_osm()
+            if osm_download is None:
+                sys.exit(1)
+            edges_df, osm_data = osm_download
+        counts["nodes"] = len(osm_data.nodes)
+        counts["edges"] = osm_data.number_of_edges if edges_df is None else len(edges_df)
+    return my_region, edges_df, osm_data
+
+
+def run_networkx(
+    osm_data, edges_df, output_folder, weight, extension, backend="networkx", workers=1,
+    pivots=None, adaptive=False, seed=42, speed_profiles=(DEFAULT_SPEED_PROFILE,),
+    criticality=None, criticality_pairs=1000, plot=True, renderer=DEFAULT_RENDERER,
+    raster_aggregation="max",
+):
+    """
+    Calculates the networkx centrality of a network and saves the results. The other
+    parameters are those of 'main'.
+    :param osm_data: network graph
+    :param edges_df: edge data frame, None for a compact graph
+    :param output_folder: folder of the output files
+    :param weight: "length" or "travel_time"
+    :param extension: file extension of the output format, e.g. ".gpkg"
+    :raises SystemExit: If the weight is invalid
+    """
+    from modules.module_networkx_centrality import NetworkxCentrality
+    from modules.module_edge_criticality import random_od_pairs
+
+    if weight == "length":
+        # Networkx centrality analysis for shortest routes
+        my_centrality = NetworkxCentrality(
+            weight=weight, backend=backend, workers=workers,
+            pivots=pivots, adaptive=adaptive, seed=seed,
+        )
+        output_file_path = os.path.join(
+            output_folder, centrality_file_name("networkx", weight, None, extension)
+        )
+        my_centrality.get_centrality_short(
+            osm_data, edges_df, output_file=output_file_path
+        )
+        if plot:
+            my_centrality.explore_centrality_short(
+                output_folder=output_folder, renderer=renderer,
+                aggregation=raster_aggregation,
             )
-            my_centrality.explore_centrality_short(output_folder=output_folder)
-        elif weight == "travel_time":
-            # Networkx centrality analysis for fastest routes
-            my_centrality = NetworkxCentrality(weight=weight)
+        if criticality:
+            csr_graph = my_centrality.get_csr_graph(osm_data)
+            run_edge_criticality(
+                my_centrality.centrality_short_gdf, csr_graph, criticality,
+                *random_od_pairs(csr_graph.number_of_nodes, criticality_pairs, seed),
+                workers,
+                os.path.join(output_folder, f"Edge_criticality_{weight}{extension}"),
+            )
+    elif weight == "travel_time":
+        # Networkx centrality analysis for fastest routes
+        my_centrality = NetworkxCentrality(
+            weight=weight, backend=backend, workers=workers,
+            pivots=pivots, adaptive=adaptive, seed=seed,
+        )
+        for speed_profile in speed_profiles:
             output_file_path = os.path.join(
-                output_folder, f"Networkx_centrality_{weight}.gpkg"
+                output_folder,
+                centrality_file_name("networkx", weight, None, extension, speed_profile),
             )
             my_centrality.get_centrality_fast(
-                osm_data, edges_df, output_file=output_file_path
+                osm_data, edges_df, output_file=output_file_path,
+                speed_profile=speed_profile,
             )
-            my_centrality.explore_centrality_fast(output_folder=output_folder)
-        else:
-            print("Invalid weight parameter. Use 'length' or 'travel_time'.")
+            if plot:
+                my_centrality.explore_centrality_fast(
+                    output_folder=output_folder, speed_profile=speed_profile,
+                    renderer=renderer, aggregation=raster_aggregation,
+                )
+            if criticality:
+                csr_graph = my_centrality.get_csr_graph(osm_data, speed_profile)
+                run_edge_criticality(
+                    my_centrality.centrality_fast_gdf, csr_graph, criticality,
+                    *random_od_pairs(csr_graph.number_of_nodes, criticality_pairs, seed),
+                    workers, os.path.join(
+                        output_folder, f"Edge_criticality_{weight}"
+                        f"{profile_suffix(speed_profile)}{extension}",
+                    ),
+                )
+    else:
+        print("Invalid weight parameter. Use 'length' or 'travel_time'.")
+        sys.exit(1)
+
+
+def run_geographical(
+    my_region, osm_data, edges_df, output_folder, weight, number_of_routes, extension,
+    workers=1, adaptive=False, seed=42, largest_component=False, routing="shortest_path",
+    destinations_per_origin=1, sampling="uniform", population_raster=DEFAULT_POPULATION_RASTER,
+    zones=None, demand=None, zone_id="zone_id", points_per_zone=1, tolerance=0.01,
+    time_budget=None, max_routes=None, tile_size=None, speed_profiles=(DEFAULT_SPEED_PROFILE,),
+    criticality=None, criticality_pairs=1000, plot=True, renderer=DEFAULT_RENDERER,
+    raster_aggregation="max",
+):
+    """
+    Calculates the geographical centrality of a network and saves the results. The other
+    parameters are those of 'main'.
+    :param my_region: Region of the study area
+    :param osm_data: network graph
+    :param edges_df: edge data frame, None for a compact graph
+    :param output_folder: folder of the output files
+    :param weight: "length" or "travel_time"
+    :param number_of_routes: number of random routes, per batch in adaptive mode
+    :param extension: file extension of the output format, e.g. ".gpkg"
+    :raises SystemExit: If the study area is not cached in offline mode or the weight is
+    invalid
+    """
+    from modules.module_osm_cache import CacheMissError
+    from modules.module_geographical_centrality import (
+        GeographicalCentrality, read_zone_demand,
+    )
+
+    output_file_path = os.path.join(
+        output_folder,
+        centrality_file_name("geographical", weight, number_of_routes, extension),
+    )
+    my_centrality = GeographicalCentrality(
+        study_area=my_region,
+        weight=weight,
+        graph=osm_data,
+        edges_df=edges_df,
+        number_of_routes=number_of_routes,
+        largest_component_only=largest_component,
+        routing=routing,
+        destinations_per_origin=destinations_per_origin,
+        sampling=sampling,
+        population_raster=population_raster,
+        seed=seed,
+        workers=workers,
+        adaptive=adaptive,
+        tolerance=tolerance,
+        time_budget=time_budget,
+        max_routes=max_routes,
+        tile_size=tile_size,
+    )
+    with stage("study_area"):
+        try:
+            my_centrality.create_study_area_polygon()
+        except CacheMissError as error:
+            # Reported like a graph which is not in the offline cache
+            print(f"Error downloading OpenStreetMap data: {error}")
             sys.exit(1)
-    # Check module type and weight parameters for geographical analysis
-    elif module_type == "geographical":
-        output_file_path = os.path.join(
-            output_folder, f"Geographical_centrality_{weight}_routes_{number_of_routes}.gpkg"
+    zone_demand = None
+    if zones is not None:
+        with stage("read_zone_demand") as counts:
+            zone_demand = read_zone_demand(zones, demand, zone_id)
+            counts["zones"] = len(zone_demand[0])
+    if weight == "length":
+        # Geographical centrality analysis for shortest routes
+        generate_loads(my_centrality, my_centrality.graph, zone_demand, points_per_zone)
+        my_centrality.analyze_centrality()
+        my_centrality.save_data_in_file(
+            output_folder=output_folder,
+            output_file=output_file_path,
+            image_name=f"geographical_centrality_{weight}_routes_{number_of_routes}.png",
+            plot=plot,
+            renderer=renderer,
+            aggregation=raster_aggregation,
         )
-        my_centrality = GeographicalCentrality(
-            study_area=my_region,
-            weight=weight,
-            graph=osm_data,
-            edges_df=edges_df,
-            number_of_routes=number_of_routes,
-        )
-        my_centrality.create_study_area_polygon()
-        if weight == "length":
-            # Geographical centrality analysis for shortest routes
-            my_centrality.generate_random_routes(my_centrality.graph)
-            my_centrality.analyze_centrality()
-            my_centrality.save_data_in_file(
-                output_folder=output_folder,
-                output_file=output_file_path,
-                image_name=f"geographical_centrality_{weight}_routes_{number_of_routes}.png",
+        if criticality:
+            run_edge_criticality(
+                my_centrality.centrality_geographical_gdf,
+                my_centrality.get_csr_graph(my_centrality.graph), criticality,
+                *my_centrality.sample_od_nodes(my_centrality.graph, criticality_pairs),
+                workers,
+                os.path.join(output_folder, f"Edge_criticality_{weight}{extension}"),
             )
-        elif weight == "travel_time":
-            # Geographical centrality analysis for fastest routes
+    elif weight == "travel_time":
+        # Geographical centrality analysis for fastest routes
+        for speed_profile in speed_profiles:
+            suffix = profile_suffix(speed_profile)
+            my_centrality.speed_profile = speed_profile
             my_centrality.get_graph_travel_time()
-            my_centrality.generate_random_routes(my_centrality.graph_with_travel_time)
+            generate_loads(
+                my_centrality, my_centrality.graph_with_travel_time, zone_demand,
+                points_per_zone,
+            )
             my_centrality.analyze_centrality()
             my_centrality.save_data_in_file(
                 output_folder=output_folder,
-                output_file=output_file_path,
-                image_name=f"geographical_centrality_{weight}_routes_{number_of_routes}.png",
+                output_file=os.path.join(
+                    output_folder,
+                    centrality_file_name(
+                        "geographical", weight, number_of_routes, extension, speed_profile
+                    ),
+                ),
+                image_name=(
+                    f"geographical_centrality_{weight}_routes_{number_of_routes}"
+                    f"{suffix}.png"
+                ),
+                plot=plot,
+                renderer=renderer,
+                aggregation=raster_aggregation,
             )
-        else:
-            print("Invalid weight parameter. Use 'length' or 'travel_time'.")
-            sys.exit(1)
+            if criticality:
+                graph = my_centrality.graph_with_travel_time
+                run_edge_criticality(
+                    my_centrality.centrality_geographical_gdf,
+                    my_centrality.get_csr_graph(graph), criticality,
+                    *my_centrality.sample_od_nodes(graph, criticality_pairs),
+                    workers, os.path.join(
+                        output_folder, f"Edge_criticality_{weight}{suffix}{extension}"
+                    ),
+                )
     else:
-        print("Invalid module type. Use 'networkx' or 'geographical'.")
+        print("Invalid weight parameter. Use 'length' or 'travel_time'.")
         sys.exit(1)
 
 
-if __name__ == "__main__":
-    # Check if correct number of command-line arguments is provided
-    if len(sys.argv) < 4 or len(sys.argv) > 5:
-        print(
-            "Usage: python Main.py <region> <module_type> <weight> [number_of_routes]"
-        )
+def main(
+    region, module_type, weight, number_of_routes, backend="networkx", workers=1,
+    pivots=None, adaptive=False, seed=42, largest_component=False,
+    routing="shortest_path", destinations_per_origin=1, cache_dir=None, offline=False,
+    graph_file=None, speed_profiles=(DEFAULT_SPEED_PROFILE,), criticality=None,
+    criticality_pairs=1000, sampling="uniform", population_raster=DEFAULT_POPULATION_RASTER,
+    zones=None, demand=None, zone_id="zone_id", points_per_zone=1, output_format="gpkg",
+    profile=False, output_root=None, osm_download=None, tolerance=0.01, time_budget=None,
+    max_routes=None, tile_size=None, plot=True, renderer=DEFAULT_RENDERER,
+    raster_aggregation="max",
+):
+    """
+    The main function that orchestrates the workflow for centrality analysis.
+    :param region: Region of interest
+    :param module_type: Type of centrality analysis module ("networkx" or "geographical")
+    :param weight: used weight parameter ("length" or "travel_time")
+    :param number_of_routes: Number of random routes only for geographical centrality analysis
+    :param backend: betweenness implementation for networkx analysis. Default "networkx"
+    :param workers: number of processes for the csr backend, the geographical routes and
+    the criticality scenarios. Default 1
+    :param pivots: number of sampled sources for approximate csr centrality. Default None
+    :param adaptive: add pivots (networkx) or batches of number_of_routes routes
+    (geographical) until the centrality is stable. Default False
+    :param seed: seed of the random sampling. Default 42
+    :param largest_component: route only within the largest strongly connected component
+    (geographical). Default False
+    :param routing: "shortest_path", "tree" or "ch" routing (geographical).
+    Default "shortest_path"
+    :param destinations_per_origin: destinations sampled per origin (geographical). Default 1
+    :param cache_dir: folder of the OpenStreetMap cache. Default None disables the cache
+    :param offline: only use cached OpenStreetMap data. Default False
+    :param graph_file: folder of a compact graph to run from. Default None
+    :param speed_profiles: speed profiles of the travel_time weight. Default ("free_flow",)
+    :param criticality: number of most central edges evaluated in removal scenarios.
+    Default None skips the scenarios
+    :param criticality_pairs: number of origin destination pairs of the scenarios. Default 1000
+    :param sampling: "uniform" or "population" sampling of route ends (geographical).
+    Default "uniform"
+    :param population_raster: population raster of the population sampling. Default the
+    GHS_POP raster of the data folder
+    :param zones: file of zone polygons, loads the demand matrix instead of random routes
+    (geographical). Default None
+    :param demand: CSV file of the demand matrix between the zones. Default None
+    :param zone_id: column of the zone ids in the zones file. Default "zone_id"
+    :param points_per_zone: points snapped per zone. Default 1 snaps the centroids
+    :param output_format: "gpkg", "parquet" (GeoParquet) or "arrow" output files.
+    Default "gpkg"
+    :param profile: write a report of the time, memory and item counts of every stage into
+    the output folder. Default False
+    :param output_root: folder to create the output folder in. Default None asks for one
+    in a dialog
+    :param osm_download: tuple of edge data frame and graph of the region, already loaded.
+    Default None downloads it
+    :param tolerance: accepted change per batch of adaptive geographical routes.
+    Default 0.01
+    :param time_budget: maximum time in seconds of adaptive geographical routes.
+    Default None
+    :param max_routes: maximum number of adaptive geographical routes. Default None
+    :param tile_size: route geographical centrality tile by tile on tiles of this size of a
+    compact graph. Default None
+    :param plot: draw the centrality maps. Default True
+    :param renderer: "geopandas", "lines" or "raster" maps. Default "geopandas"
+    :param raster_aggregation: "max" or "sum" of the edges crossing a pixel of raster maps.
+    Default "max"
+    :raises SystemExit: If there is an error in the workflow
+    """
+    # Get selected or created output folder
+    selected_output_folder = output_root or get_output_folder()
+    output_folder = create_output_folder(
+        selected_output_folder, region, module_type, weight, number_of_routes
+    )
+
+    # Check if output folder creation was successful
+    if not output_folder:
+        print("Failed to create the output folder.")
         sys.exit(1)
 
-    # Parse command-line arguments
-    used_region = sys.argv[1]
-    used_module_type = sys.argv[2]
-    used_weight = sys.argv[3]
+    extension = f".{output_format}"
+    profiler = None
+    if profile:
+        profiler = enable_profiling(
+            region=region, module_type=module_type, weight=weight,
+            number_of_routes=number_of_routes, backend=backend, workers=workers,
+            pivots=pivots, routing=routing, speed_profiles=list(speed_profiles),
+        )
 
-    # Set number_of_routes parameter if provided
-    used_number_of_routes = None
-    if len(sys.argv) == 5:
-        try:
-            used_number_of_routes = int(sys.argv[4])
-        except ValueError:
-            print("Error: number_of_routes must be an integer.")
+    # The run report is also written if the run fails or exits early
+    try:
+        my_region, edges_df, osm_data = load_network(
+            region, cache_dir, offline, graph_file, osm_download
+        )
+        if module_type == "networkx":
+            run_networkx(
+                osm_data, edges_df, output_folder, weight, extension, backend, workers, pivots,
+                adaptive, seed, speed_profiles, criticality, criticality_pairs, plot, renderer,
+                raster_aggregation,
+            )
+        elif module_type == "geographical":
+            run_geographical(
+                my_region, osm_data, edges_df, output_folder, weight, number_of_routes,
+                extension, workers, adaptive, seed, largest_component, routing,
+                destinations_per_origin, sampling, population_raster, zones, demand, zone_id,
+                points_per_zone, tolerance, time_budget, max_routes, tile_size, speed_profiles,
+                criticality, criticality_pairs, plot, renderer, raster_aggregation,
+            )
+        else:
+            print("Invalid module type. Use 'networkx' or 'geographical'.")
             sys.exit(1)
+    finally:
+        if profiler is not None:
+            disable_profiling()
+            print(f"Run report written to {profiler.write_report(output_folder)}.")
+
+
+if __name__ == "__main__":
+    # Parse and validate command-line arguments
+    arguments = parse_arguments(sys.argv[1:])
 
     # Call main function
-    main(used_region, used_module_type, used_weight, used_number_of_routes)
+    main(
+        arguments.region,
+        arguments.module_type,
+        arguments.weight,
+        arguments.number_of_routes,
+        backend=arguments.backend,
+        workers=arguments.workers,
+        pivots=arguments.pivots,
+        adaptive=arguments.adaptive,
+        seed=arguments.seed,
+        largest_component=arguments.largest_component,
+        routing=arguments.routing,
+        destinations_per_origin=arguments.destinations_per_origin,
+        cache_dir=arguments.cache_dir,
+        offline=arguments.offline,
+        graph_file=arguments.graph_file,
+        speed_profiles=arguments.speed_profiles,
+        criticality=arguments.criticality,
+        criticality_pairs=arguments.criticality_pairs,
+        sampling=arguments.sampling,
+        population_raster=arguments.population_raster,
+        zones=arguments.zones,
+        demand=arguments.demand,
+        zone_id=arguments.zone_id,
+        points_per_zone=arguments.points_per_zone,
+        output_format=arguments.output_format,
+        profile=arguments.profile,
+        output_root=arguments.output_folder,
+        tolerance=arguments.tolerance,
+        time_budget=arguments.time_budget,
+        max_routes=arguments.max_routes,
+        tile_size=arguments.tile_size,
+        plot=not arguments.no_plot,
+        renderer=arguments.renderer,
+        raster_aggregation=arguments.raster_aggregation,
+    )
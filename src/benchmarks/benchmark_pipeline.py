@@ -0,0 +1,390 @@
+"""
+Benchmark of the pipeline stages of both centrality modules on synthetic road networks.
+Every stage is timed separately and the results are written to a JSON file, which can be
+compared with the results of another version to catch regressions.
+
+Run from the repository root, e.g.
+    python -m src.benchmarks.benchmark_pipeline --sizes 10 30 60 --output benchmark.json
+    python -m src.benchmarks.benchmark_pipeline --output new.json --compare benchmark.json
+"""
+
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import subprocess
+from datetime import datetime, timezone
+
+# Plots are only written to files
+os.environ.setdefault("MPLBACKEND", "Agg")
+
+import numpy as np
+import scipy
+import pandas as pd
+import geopandas as gpd
+import networkx as nx
+import osmnx as ox
+import matplotlib.pyplot as plt
+from .synthetic_graphs import synthetic_graph, study_area, GRAPH_KINDS
+from ..modules.module_networkx_centrality import NetworkxCentrality
+from ..modules.module_geographical_centrality import GeographicalCentrality, ROUTING_MODES
+from ..modules.module_compact_graph import CompactGraph
+from ..modules.module_edge_output import save_edges
+
+# Version of the layout of the result file
+RESULT_VERSION = 1
+# Stages faster than this in the baseline are too noisy to be compared
+MIN_COMPARED_SECONDS = 0.05
+
+
+class StageTimer:
+    """
+    Times pipeline stages and collects one result record per stage.
+    """
+    def __init__(self, repeat=1):
+        """
+        Initializes the timer.
+        :param repeat: number of runs of every stage, the fastest run is reported. Default 1
+        """
+        self.repeat = repeat
+        self.records = []
+
+    def measure(self, stage, function, labels, setup=None):
+        """
+        Runs and times a stage.
+        :param stage: name of the stage
+        :param function: function without arguments running the stage
+        :param labels: dictionary describing the benchmark case, stored with the result
+        :param setup: function without arguments run before every run, not timed, e.g. to
+        clear caches. Default None
+        :return: result of the last run of the stage
+        """
+        runs = []
+        result = None
+        for _ in range(self.repeat):
+            if setup is not None:
+                setup()
+            start = time.perf_counter()
+            result = function()
+            runs.append(time.perf_counter() - start)
+        self.records.append({**labels, "stage": stage, "seconds": min(runs), "runs": runs})
+        print(f"{labels['case']:<45} {stage:<20} {min(runs):10.4f} s")
+        return result
+
+
+def benchmark_loading(timer, graph, labels, folder):
+    """
+    Times the conversion of a graph into edge GeoDataFrames and compact graph files.
+    :param timer: StageTimer
+    :param graph: synthetic network
+    :param labels: description of the benchmark case
+    :param folder: folder for the compact graph file
+    :return GeoDataFrame: edges of the graph
+    """
+    labels = {**labels, "method": "loading", "case": f"{labels['case']} loading"}
+    edges_df = timer.measure(
+        "graph_to_gdfs", lambda: ox.graph_to_gdfs(graph, nodes=False), labels
+    )
+    graph_file = os.path.join(folder, "compact_graph")
+    timer.measure(
+        "compact_graph_save", lambda: CompactGraph.from_graph(graph).save(graph_file), labels
+    )
+    timer.measure(
+        "compact_graph_load",
+        lambda: CompactGraph.load(graph_file).csr_graph("length"),
+        labels,
+    )
+    return edges_df
+
+
+def benchmark_networkx(timer, graph, edges_df, weight, backend, labels, folder):
+    """
+    Times the stages of NetworkxCentrality.
+    :param timer: StageTimer
+    :param graph: synthetic network
+    :param edges_df: edges of the network
+    :param weight: "length" or "travel_time"
+    :param backend: betweenness backend
+    :param labels: description of the benchmark case
+    :param folder: output folder
+    """
+    labels = {
+        **labels, "method": "networkx", "weight": weight, "variant": backend,
+        "case": f"{labels['case']} networkx {weight} {backend}",
+    }
+    centrality = NetworkxCentrality(weight=weight, backend=backend)
+
+    def reset():
+        centrality.speed_engine = None
+
+    if weight == "travel_time":
+        csr_graph = timer.measure(
+            "travel_time", lambda: centrality.get_csr_graph(graph), labels, setup=reset
+        )
+    else:
+        csr_graph = centrality.get_csr_graph(graph)
+    routing_weight = weight
+    if backend == "networkx" and weight == "travel_time":
+        routing_weight = centrality.get_speed_engine(graph).weight_function()
+    centrality_df = timer.measure(
+        "betweenness",
+        lambda: centrality.edge_betweenness_centrality(graph, routing_weight, csr_graph),
+        labels,
+    )
+    centrality_gdf = timer.measure(
+        "aggregation",
+        lambda: gpd.GeoDataFrame(
+            centrality.join_edge_data(centrality_df, graph, edges_df), crs=4326
+        ),
+        labels,
+    )
+    timer.measure(
+        "gpkg_output",
+        lambda: save_edges(centrality_gdf, os.path.join(folder, "networkx.gpkg")),
+        labels,
+    )
+    timer.measure(
+        "plot",
+        lambda: centrality.explore_centrality(
+            centrality_gdf, weight, output_folder=folder, image_name="networkx.png"
+        ),
+        labels, setup=lambda: plt.close("all"),
+    )
+    plt.close("all")
+
+
+def benchmark_geographical(
+    timer, graph, edges_df, weight, routing, number_of_routes, labels, folder
+):
+    """
+    Times the stages of GeographicalCentrality.
+    :param timer: StageTimer
+    :param graph: synthetic network
+    :param edges_df: edges of the network
+    :param weight: "length" or "travel_time"
+    :param routing: routing mode of the random routes
+    :param number_of_routes: number of random routes
+    :param labels: description of the benchmark case
+    :param folder: output folder
+    """
+    labels = {
+        **labels, "method": "geographical", "weight": weight, "variant": routing,
+        "case": f"{labels['case']} geographical {weight} {routing}",
+    }
+    centrality = GeographicalCentrality(
+        study_area=None, weight=weight, graph=graph, edges_df=edges_df,
+        number_of_routes=number_of_routes, routing=routing,
+    )
+    centrality.poly_study_area = gpd.GeoDataFrame(
+        geometry=[study_area(graph)], crs="EPSG:4326"
+    )
+
+    def reset():
+        centrality.graph_cache = {}
+
+    graph_version = graph
+    if weight == "travel_time":
+        def travel_time():
+            graph_with_travel_time = centrality.get_graph_travel_time()
+            centrality.get_csr_graph(graph_with_travel_time)
+            return graph_with_travel_time
+
+        graph_version = timer.measure("travel_time", travel_time, labels, setup=reset)
+
+    x, y = timer.measure(
+        "point_sampling",
+        lambda: centrality.random_coordinates_in_polygon(2 * number_of_routes),
+        labels, setup=lambda: setattr(centrality, "polygon_sampler", None),
+    )
+    timer.measure(
+        "snapping",
+        lambda: centrality.get_node_locator(graph_version).nearest(x, y),
+        labels, setup=lambda: centrality.graph_cache.pop(
+            ("node_locator_False", id(graph_version)), None
+        ),
+    )
+    timer.measure("routing", lambda: centrality.generate_random_routes(graph_version), labels)
+    timer.measure("aggregation", centrality.analyze_centrality, labels)
+    timer.measure(
+        "gpkg_output",
+        lambda: save_edges(
+            centrality.centrality_geographical_gdf, os.path.join(folder, "geographical.gpkg")
+        ),
+        labels,
+    )
+    timer.measure(
+        "plot",
+        lambda: centrality.plot_centrality(output_folder=folder, image_name="geographical.png"),
+        labels, setup=lambda: plt.close("all"),
+    )
+    plt.close("all")
+
+
+def run_benchmarks(
+    sizes, kinds=("grid",), weights=("travel_time",), routing="tree", number_of_routes=1000,
+    networkx_max_nodes=200, repeat=1, seed=0,
+):
+    """
+    Runs the benchmark cases of all sizes and kinds of synthetic networks.
+    :param sizes: sizes of the synthetic networks (nodes per side)
+    :param kinds: kinds of synthetic networks. Default ("grid",)
+    :param weights: routing weights. Default ("travel_time",)
+    :param routing: routing mode of the geographical routes. Default "tree"
+    :param number_of_routes: number of geographical routes. Default 1000
+    :param networkx_max_nodes: largest network also timed with the networkx backend.
+    Default 200
+    :param repeat: number of runs of every stage. Default 1
+    :param seed: seed of the synthetic networks. Default 0
+    :return list: result records
+    """
+    timer = StageTimer(repeat)
+    for kind in kinds:
+        for size in sizes:
+            graph = synthetic_graph(size, kind=kind, seed=seed)
+            labels = {
+                "kind": kind, "size": size, "nodes": graph.number_of_nodes(),
+                "edges": graph.number_of_edges(), "case": f"{kind} {size}",
+            }
+            with tempfile.TemporaryDirectory() as folder:
+                edges_df = benchmark_loading(timer, graph, labels, folder)
+                for weight in weights:
+                    backends = ["csr"]
+                    if graph.number_of_nodes() <= networkx_max_nodes:
+                        backends.append("networkx")
+                    for backend in backends:
+                        benchmark_networkx(
+                            timer, graph, edges_df, weight, backend, labels, folder
+                        )
+                    benchmark_geographical(
+                        timer, graph, edges_df, weight, routing, number_of_routes,
+                        labels, folder,
+                    )
+    return timer.records
+
+
+def environment_metadata():
+    """
+    Describes the software and machine the benchmark ran on.
+    :return dict: metadata of the benchmark run
+    """
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "result_version": RESULT_VERSION,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "versions": {
+            "numpy": np.__version__, "scipy": scipy.__version__, "pandas": pd.__version__,
+            "geopandas": gpd.__version__, "networkx": nx.__version__,
+            "osmnx": ox.__version__,
+        },
+    }
+
+
+def result_key(record):
+    """
+    Identifies the benchmark case and stage of a result record.
+    :param record: result record
+    :return tuple: key of the record
+    """
+    return tuple(
+        record.get(name) for name in ("kind", "size", "method", "weight", "variant", "stage")
+    )
+
+
+def compare_results(
+    records, baseline_records, tolerance=0.25, min_seconds=MIN_COMPARED_SECONDS
+):
+    """
+    Compares result records with the records of a baseline run.
+    :param records: result records
+    :param baseline_records: result records of the baseline
+    :param tolerance: allowed relative slowdown. Default 0.25
+    :param min_seconds: stages faster than this in the baseline are ignored. Default 0.05
+    :return list: (key, baseline seconds, seconds, ratio) of every slower stage
+    """
+    baseline = {result_key(record): record["seconds"] for record in baseline_records}
+    regressions = []
+    for record in records:
+        old = baseline.get(result_key(record))
+        if old is None or old < min_seconds:
+            continue
+        ratio = record["seconds"] / old
+        if ratio > 1 + tolerance:
+            regressions.append((result_key(record), old, record["seconds"], ratio))
+    return regressions
+
+
+def parse_arguments(argv):
+    """
+    Parses the command-line arguments of the benchmark.
+    :param argv: command-line arguments without the program name
+    :return argparse.Namespace: parsed arguments
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 30, 60],
+                        help="nodes per side of the synthetic networks")
+    parser.add_argument("--kinds", nargs="+", choices=GRAPH_KINDS, default=["grid"],
+                        help="layouts of the synthetic networks")
+    parser.add_argument("--weights", nargs="+", choices=("length", "travel_time"),
+                        default=["travel_time"], help="routing weights")
+    parser.add_argument("--routing", choices=ROUTING_MODES, default="tree",
+                        help="routing mode of the geographical routes")
+    parser.add_argument("--routes", type=int, default=1000,
+                        help="number of geographical routes")
+    parser.add_argument("--networkx-max-nodes", type=int, default=200,
+                        help="largest network also timed with the networkx backend")
+    parser.add_argument("--repeat", type=int, default=1,
+                        help="runs of every stage, the fastest run is reported")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the synthetic networks")
+    parser.add_argument("--output", default="benchmark_results.json",
+                        help="JSON file of the results")
+    parser.add_argument("--compare", default=None,
+                        help="JSON file of a baseline run; exit with status 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed relative slowdown compared with the baseline")
+    return parser.parse_args(argv)
+
+
+def main(argv):
+    """
+    Runs the benchmark, writes the results and compares them with a baseline.
+    :param argv: command-line arguments without the program name
+    :return int: exit status, 1 if a stage is slower than the baseline
+    """
+    arguments = parse_arguments(argv)
+    records = run_benchmarks(
+        arguments.sizes, kinds=arguments.kinds, weights=arguments.weights,
+        routing=arguments.routing, number_of_routes=arguments.routes,
+        networkx_max_nodes=arguments.networkx_max_nodes, repeat=arguments.repeat,
+        seed=arguments.seed,
+    )
+    with open(arguments.output, "w", encoding="utf-8") as file:
+        json.dump({"metadata": environment_metadata(), "results": records}, file, indent=2)
+    print(f"Results written to {arguments.output}.")
+
+    if arguments.compare:
+        with open(arguments.compare, encoding="utf-8") as file:
+            baseline = json.load(file)["results"]
+        regressions = compare_results(records, baseline, arguments.tolerance)
+        for key, old, new, ratio in regressions:
+            print(f"Regression {key}: {old:.4f} s -> {new:.4f} s ({ratio:.2f}x)")
+        if regressions:
+            return 1
+        print("No regressions compared with the baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
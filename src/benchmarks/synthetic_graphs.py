@@ -0,0 +1,145 @@
+"""
+Module to generate synthetic road networks shaped like osmnx graphs, so the pipeline can be
+benchmarked and tested without downloading OpenStreetMap data.
+"""
+
+import numpy as np
+import networkx as nx
+import osmnx as ox
+from scipy.spatial import cKDTree
+from shapely.geometry import LineString, box
+
+# Available layouts of the synthetic networks
+GRAPH_KINDS = ("grid", "random_geometric")
+# South west corner of the synthetic networks (near Heidelberg)
+ORIGIN = (8.65, 49.38)
+# Distance of neighbouring grid nodes in degrees (about 100 m)
+SPACING = 0.001
+# Highway classes of the random geometric networks and their probabilities
+HIGHWAY_CLASSES = ("residential", "tertiary", "secondary", "primary", "unclassified")
+HIGHWAY_PROBABILITIES = (0.55, 0.2, 0.12, 0.08, 0.05)
+
+
+def _grid_highway(line):
+    """
+    Returns the highway class of a grid line, major roads every few lines.
+    :param line: index of the row or column
+    :return str: highway class
+    """
+    if line % 10 == 0:
+        return "primary"
+    if line % 5 == 0:
+        return "secondary"
+    if line % 3 == 0:
+        return "tertiary"
+    return "residential"
+
+
+def _grid_edges(side, rng):
+    """
+    Creates the node coordinates and street segments of a jittered grid.
+    :param side: number of nodes per row and column
+    :param rng: numpy random Generator
+    :return tuple: node x and y arrays, array of (u, v) pairs and their highway classes
+    """
+    rows, columns = np.divmod(np.arange(side * side), side)
+    jitter = rng.uniform(-0.2, 0.2, size=(2, side * side)) * SPACING
+    x = ORIGIN[0] + columns * SPACING + jitter[0]
+    y = ORIGIN[1] + rows * SPACING + jitter[1]
+    pairs = []
+    highways = []
+    for row in range(side):
+        for column in range(side):
+            node = row * side + column
+            if column + 1 < side:
+                pairs.append((node, node + 1))
+                highways.append(_grid_highway(row))
+            if row + 1 < side:
+                pairs.append((node, node + side))
+                highways.append(_grid_highway(column))
+    return x, y, np.array(pairs, dtype=np.int64).reshape(-1, 2), highways
+
+
+def _random_geometric_edges(number_of_nodes, rng, neighbours=3):
+    """
+    Creates uniformly distributed nodes connected to their nearest neighbours.
+    :param number_of_nodes: number of nodes
+    :param rng: numpy random Generator
+    :param neighbours: number of nearest neighbours connected to every node. Default 3
+    :return tuple: node x and y arrays, array of (u, v) pairs and their highway classes
+    """
+    extent = np.sqrt(number_of_nodes) * SPACING
+    x = ORIGIN[0] + rng.uniform(0, extent, number_of_nodes)
+    y = ORIGIN[1] + rng.uniform(0, extent, number_of_nodes)
+    _, nearest = cKDTree(np.column_stack((x, y))).query(
+        np.column_stack((x, y)), k=min(neighbours + 1, number_of_nodes)
+    )
+    pairs = np.column_stack((
+        np.repeat(np.arange(number_of_nodes), nearest.shape[1] - 1), nearest[:, 1:].ravel()
+    ))
+    pairs = np.unique(np.sort(pairs, axis=1), axis=0)
+    highways = rng.choice(HIGHWAY_CLASSES, size=len(pairs), p=HIGHWAY_PROBABILITIES).tolist()
+    return x, y, pairs, highways
+
+
+def synthetic_graph(size, kind="grid", seed=0):
+    """
+    Generates a road network with the attributes of a simplified osmnx drive network:
+    node coordinates, edge lengths, highway classes, some tagged maxspeeds and one-way
+    streets, osm ids (lists for some merged edges) and edge geometries.
+    :param size: number of nodes per side of the grid, the random geometric network has
+    size * size nodes as well
+    :param kind: "grid" or "random_geometric". Default "grid"
+    :param seed: seed of the random layout and attributes. Default 0
+    :return nx.MultiDiGraph: synthetic network in EPSG:4326
+    :raises ValueError: If the kind is unknown or the size is below 2
+    """
+    if kind not in GRAPH_KINDS:
+        raise ValueError(f"Invalid kind '{kind}'. Use one of {GRAPH_KINDS}.")
+    if size < 2:
+        raise ValueError("Synthetic networks require a size of at least 2.")
+    rng = np.random.default_rng(seed)
+    if kind == "grid":
+        x, y, pairs, highways = _grid_edges(size, rng)
+    else:
+        x, y, pairs, highways = _random_geometric_edges(size * size, rng)
+
+    graph = nx.MultiDiGraph(crs="epsg:4326", simplified=True)
+    for node in range(len(x)):
+        graph.add_node(node, x=float(x[node]), y=float(y[node]))
+    tails, heads = pairs[:, 0], pairs[:, 1]
+    lengths = ox.distance.great_circle(y[tails], x[tails], y[heads], x[heads])
+    oneway = rng.random(len(pairs)) < 0.1
+    tagged = rng.random(len(pairs)) < 0.3
+    merged = rng.random(len(pairs)) < 0.1
+    for i, ((u, v), highway) in enumerate(zip(pairs.tolist(), highways)):
+        attributes = {
+            "osmid": [2 * i, 2 * i + 1] if merged[i] else 2 * i,
+            "highway": highway,
+            "length": round(float(lengths[i]), 3),
+        }
+        if tagged[i] and highway != "residential":
+            attributes["maxspeed"] = "70" if highway == "primary" else "50"
+        # One-way streets only among residential roads keep the network well connected
+        directions = [(u, v)] if oneway[i] and highway == "residential" else [(u, v), (v, u)]
+        for tail, head in directions:
+            graph.add_edge(
+                tail, head, key=0, oneway=len(directions) == 1, reversed=tail != u,
+                geometry=LineString([(x[tail], y[tail]), (x[head], y[head])]),
+                **attributes,
+            )
+    for node, degree in graph.to_undirected(as_view=True).degree():
+        graph.nodes[node]["street_count"] = degree
+    return graph
+
+
+def study_area(graph):
+    """
+    Returns a study area polygon covering all nodes of a synthetic network.
+    :param graph: synthetic network
+    :return Polygon: bounding box of the nodes, slightly enlarged
+    """
+    x = [data["x"] for _, data in graph.nodes(data=True)]
+    y = [data["y"] for _, data in graph.nodes(data=True)]
+    margin = SPACING / 2
+    return box(min(x) - margin, min(y) - margin, max(x) + margin, max(y) + margin)
@@ -0,0 +1,364 @@
+"""
+Module to run a matrix of regions, module types, weights and route counts without user
+interaction. Every region is downloaded once into the OSM cache and loaded at most once per
+worker process, the jobs run on a bounded pool of processes and jobs whose outputs already
+exist are skipped.
+"""
+
+import os
+import json
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+from .module_osm_cache import OsmCache
+from .module_edge_output import OUTPUT_FORMATS
+from .module_options import MODULE_TYPES, WEIGHTS, DEFAULT_SPEED_PROFILE
+from .module_output_folder import output_folder_name, centrality_file_name
+
+# Options of a job which are set by the batch itself
+RESERVED_OPTIONS = (
+    "region", "module_type", "weight", "number_of_routes", "output_root", "osm_download",
+    "cache_dir", "offline",
+)
+# Summary of all jobs, written into the output root
+BATCH_REPORT_FILE = "batch_report.json"
+# Parameters of a finished job, written into its output folder
+JOB_FILE = "batch_job.json"
+# Default memory reserved per running job in GiB
+DEFAULT_JOB_MEMORY_GB = 2.0
+
+# Job runner, region loader and cache settings of a worker process
+_worker_runner = None
+_worker_loader = None
+_worker_output_root = None
+_worker_cache_dir = None
+_worker_offline = False
+# Region data loaded in a worker process, only the region of the last job is kept
+_worker_regions = {}
+
+
+def _as_list(value):
+    """
+    Wraps a single value of the job file into a list.
+    :param value: value or list of values
+    :return list: list of values
+    """
+    return list(value) if isinstance(value, (list, tuple)) else [value]
+
+
+def expand_jobs(job_file_data):
+    """
+    Expands the matrix of a job file into single jobs, grouped by region. networkx jobs
+    do not depend on the number of routes and are created once per weight.
+    :param job_file_data: dictionary with the keys "regions", "module_types", "weights",
+    "number_of_routes" (required for geographical jobs) and "options" (keyword arguments of
+    the runner shared by all jobs)
+    :return list: job dictionaries with region, module_type, weight, number_of_routes and
+    options
+    :raises ValueError: If the job file is incomplete or contains invalid values
+    """
+    regions = _as_list(job_file_data.get("regions", []))
+    module_types = _as_list(job_file_data.get("module_types", MODULE_TYPES))
+    weights = _as_list(job_file_data.get("weights", WEIGHTS))
+    route_counts = _as_list(job_file_data.get("number_of_routes", []))
+    options = dict(job_file_data.get("options", {}))
+    if not regions:
+        raise ValueError("The job file lists no regions.")
+    for module_type in module_types:
+        if module_type not in MODULE_TYPES:
+            raise ValueError(f"Invalid module type '{module_type}'. Use one of {MODULE_TYPES}.")
+    for weight in weights:
+        if weight not in WEIGHTS:
+            raise ValueError(f"Invalid weight '{weight}'. Use one of {WEIGHTS}.")
+    if "geographical" in module_types and not route_counts:
+        raise ValueError("Geographical jobs require 'number_of_routes'.")
+    if any(not isinstance(count, int) or count < 0 for count in route_counts):
+        raise ValueError("'number_of_routes' must be non-negative integers.")
+    reserved = sorted(set(options) & set(RESERVED_OPTIONS))
+    if reserved:
+        raise ValueError(f"The options {reserved} are set by the batch.")
+    if "graph_file" in options:
+        raise ValueError("Compact graph files are per region and not supported in batches.")
+
+    jobs = []
+    for region in regions:
+        for module_type in module_types:
+            for weight in weights:
+                counts = route_counts if module_type == "geographical" else [None]
+                for number_of_routes in counts:
+                    jobs.append({
+                        "region": region,
+                        "module_type": module_type,
+                        "weight": weight,
+                        "number_of_routes": number_of_routes,
+                        "options": options,
+                    })
+    return jobs
+
+
+def read_job_file(job_file):
+    """
+    Reads a JSON job file. A relative output root is taken relative to the job file.
+    :param job_file: path of the job file
+    :return tuple: list of jobs (see 'expand_jobs') and the output root
+    :raises ValueError: If the job file has no output root or invalid jobs
+    """
+    with open(job_file, encoding="utf-8") as file:
+        job_file_data = json.load(file)
+    if not job_file_data.get("output_root"):
+        raise ValueError("The job file has no 'output_root'.")
+    output_root = os.path.join(
+        os.path.dirname(os.path.abspath(job_file)), job_file_data["output_root"]
+    )
+    return expand_jobs(job_file_data), output_root
+
+
+def job_outputs(job, output_root):
+    """
+    Returns the output folder and the centrality files a job creates.
+    :param job: job dictionary
+    :param output_root: folder the output folders of the jobs are created in
+    :return tuple: path of the output folder and list of paths of the centrality files
+    """
+    folder = os.path.join(output_root, output_folder_name(
+        job["region"], job["module_type"], job["weight"], job["number_of_routes"]
+    ))
+    options = job["options"]
+    extension = f".{options.get('output_format', 'gpkg')}"
+    if extension[1:] not in OUTPUT_FORMATS.values():
+        extension = ".gpkg"
+    speed_profiles = options.get("speed_profiles", [DEFAULT_SPEED_PROFILE])
+    if job["weight"] == "length":
+        speed_profiles = [DEFAULT_SPEED_PROFILE]
+    files = [
+        os.path.join(folder, centrality_file_name(
+            job["module_type"], job["weight"], job["number_of_routes"], extension, profile
+        ))
+        for profile in speed_profiles
+    ]
+    return folder, files
+
+
+def job_done(job, output_root):
+    """
+    Checks if a job has already finished: it recorded its parameters after it succeeded and
+    all its centrality files exist. Outputs of interrupted or differently configured runs
+    do not count.
+    :param job: job dictionary
+    :param output_root: folder the output folders of the jobs are created in
+    :return bool: True if the job can be skipped
+    """
+    folder, files = job_outputs(job, output_root)
+    try:
+        with open(os.path.join(folder, JOB_FILE), encoding="utf-8") as file:
+            finished_job = json.load(file)
+    except (OSError, ValueError):
+        return False
+    return finished_job == json.loads(json.dumps(job)) and all(map(os.path.exists, files))
+
+
+def available_memory_gb():
+    """
+    Returns the memory available for new processes.
+    :return float: available memory in GiB, None if the platform does not provide it
+    """
+    try:
+        with open("/proc/meminfo", encoding="ascii") as meminfo:
+            for line in meminfo:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) / 1024 ** 2
+    except OSError:
+        pass
+    return None
+
+
+def prepare_regions(regions, cache_dir, polygons=True):
+    """
+    Downloads the network and the study area polygon of every region once into the cache,
+    so the jobs only load them from disk.
+    :param regions: names of the regions
+    :param cache_dir: folder of the OSM cache
+    :param polygons: also cache the study area polygons of the geographical module.
+    Default True
+    :return dict: error messages of the regions that could not be downloaded
+    """
+    # osmnx is only loaded by the batch process if regions are downloaded
+    from .module_create_region import Region
+
+    cache = OsmCache(cache_dir)
+    failed = {}
+    for region in dict.fromkeys(regions):
+        try:
+            Region(region, "drive", cache=cache).download_graph()
+            if polygons:
+                cache.geocode_to_gdf(region)
+        except Exception as error:
+            print(f"Error downloading OpenStreetMap data of {region}: {error}")
+            failed[region] = str(error)
+    return failed
+
+
+def load_region(region, cache_dir):
+    """
+    Loads the edge data frame and the graph of a region from the cache.
+    :param region: name of the region
+    :param cache_dir: folder of the OSM cache
+    :return tuple: edge data frame and graph, None if the region is not cached
+    """
+    from .module_create_region import Region
+
+    return Region(region, "drive", cache=OsmCache(cache_dir, offline=True)).download_osm()
+
+
+def _init_worker(runner, loader, output_root, cache_dir, offline):
+    """
+    Stores the job runner, the region loader and the cache settings in a worker process.
+    :param runner: function running one job, called like Main.main
+    :param loader: function loading a region, see 'load_region'
+    :param output_root: folder the output folders of the jobs are created in
+    :param cache_dir: folder of the OSM cache
+    :param offline: only use cached data in the jobs
+    """
+    global _worker_runner, _worker_loader, _worker_output_root, _worker_cache_dir
+    global _worker_offline
+    _worker_runner = runner
+    _worker_loader = loader
+    _worker_output_root = output_root
+    _worker_cache_dir = cache_dir
+    _worker_offline = offline
+    _worker_regions.clear()
+
+
+def _worker_region(region):
+    """
+    Returns the data of a region, loading it only if the previous job had another region.
+    :param region: name of the region
+    :return tuple: edge data frame and graph, None if the region could not be loaded
+    """
+    if region not in _worker_regions:
+        _worker_regions.clear()
+        _worker_regions[region] = _worker_loader(region, _worker_cache_dir)
+    return _worker_regions[region]
+
+
+def _worker_run(job):
+    """
+    Runs one job inside a worker process and records its parameters once it succeeded.
+    A failing job is reported instead of stopping the worker.
+    :param job: job dictionary
+    :return dict: job record with status "done" or "failed", duration and error message
+    """
+    start = time.perf_counter()
+    record = {**job, "status": "failed", "error": None}
+    try:
+        osm_download = _worker_region(job["region"])
+        if osm_download is None:
+            raise RuntimeError(f"The region {job['region']} could not be loaded.")
+        _worker_runner(
+            job["region"], job["module_type"], job["weight"], job["number_of_routes"],
+            output_root=_worker_output_root, osm_download=osm_download,
+            cache_dir=_worker_cache_dir, offline=_worker_offline, **job["options"],
+        )
+        folder, _ = job_outputs(job, _worker_output_root)
+        with open(os.path.join(folder, JOB_FILE), "w", encoding="utf-8") as file:
+            json.dump(job, file, indent=2)
+        record["status"] = "done"
+    except SystemExit as error:
+        record["error"] = f"exited with status {error.code}"
+    except Exception as error:
+        record["error"] = "".join(traceback.format_exception_only(type(error), error)).strip()
+    record["seconds"] = time.perf_counter() - start
+    return record
+
+
+def run_batch(
+    jobs, runner, output_root, cache_dir, workers=1, memory_limit_gb=None,
+    job_memory_gb=DEFAULT_JOB_MEMORY_GB, offline=False, failed_regions=None,
+    loader=load_region,
+):
+    """
+    Runs the jobs on a pool of worker processes and writes a summary into the output root.
+    At most 'workers' jobs, and at most memory_limit_gb / job_memory_gb jobs, run at the
+    same time. A further job is only started while the system has job_memory_gb of memory
+    available. Jobs are started in the order given, so workers keep reusing the loaded
+    region while jobs of the same region are left.
+    :param jobs: job dictionaries, see 'expand_jobs'
+    :param runner: function running one job, called like Main.main with the keyword
+    arguments output_root, osm_download, cache_dir and offline. It must be picklable.
+    :param output_root: folder the output folders of the jobs are created in
+    :param cache_dir: folder of the OSM cache the regions are loaded from, see
+    'prepare_regions'
+    :param offline: only use cached data in the jobs, e.g. prepared population samplers.
+    Default False
+    :param workers: maximum number of jobs running at the same time. Default 1
+    :param memory_limit_gb: memory budget of all running jobs in GiB. Default None
+    :param job_memory_gb: memory reserved per running job in GiB. Default 2
+    :param failed_regions: dictionary of regions which could not be downloaded and their
+    error messages; their jobs fail without running. Default None
+    :param loader: function loading a region in a worker. Default 'load_region'
+    :return list: job records with status "done", "skipped" or "failed"
+    :raises ValueError: If workers or the memory settings are not positive
+    """
+    if workers < 1:
+        raise ValueError("Batches require at least 1 worker.")
+    if job_memory_gb <= 0 or (memory_limit_gb is not None and memory_limit_gb <= 0):
+        raise ValueError("The memory settings must be positive.")
+    concurrency = workers
+    if memory_limit_gb is not None:
+        concurrency = max(1, min(workers, int(memory_limit_gb // job_memory_gb)))
+    failed_regions = failed_regions or {}
+    os.makedirs(output_root, exist_ok=True)
+
+    records = []
+    pending = []
+    for job in jobs:
+        if job["region"] in failed_regions:
+            records.append({
+                **job, "status": "failed", "error": failed_regions[job["region"]],
+                "seconds": 0.0,
+            })
+        elif job_done(job, output_root):
+            print(f"Skipping finished job {job_outputs(job, output_root)[0]}.")
+            records.append({**job, "status": "skipped", "error": None, "seconds": 0.0})
+        else:
+            pending.append(job)
+
+    if pending:
+        print(f"Running {len(pending)} jobs on up to {concurrency} processes...")
+        with ProcessPoolExecutor(
+            max_workers=min(concurrency, len(pending)), initializer=_init_worker,
+            initargs=(runner, loader, output_root, cache_dir, offline),
+        ) as pool:
+            running = {}
+            pending.reverse()
+            while pending or running:
+                while pending and len(running) < concurrency:
+                    # Without running jobs one is always started, so the batch progresses
+                    memory = available_memory_gb()
+                    if running and memory is not None and memory < job_memory_gb:
+                        break
+                    job = pending.pop()
+                    try:
+                        running[pool.submit(_worker_run, job)] = job
+                    except BrokenProcessPool as error:
+                        # A killed worker, e.g. out of memory, stops the whole pool
+                        records.append({
+                            **job, "status": "failed", "error": str(error), "seconds": 0.0,
+                        })
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    job = running.pop(future)
+                    try:
+                        record = future.result()
+                    except BrokenProcessPool as error:
+                        record = {**job, "status": "failed", "error": str(error), "seconds": None}
+                    print(
+                        f"Job {record['region']} {record['module_type']} {record['weight']} "
+                        f"{record['number_of_routes']}: {record['status']}"
+                    )
+                    records.append(record)
+
+    with open(os.path.join(output_root, BATCH_REPORT_FILE), "w", encoding="utf-8") as file:
+        json.dump(records, file, indent=2)
+    return records
@@ -0,0 +1,445 @@
+"""
+Module implementing Brandes' edge betweenness centrality on CSR arrays.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from heapq import heappush, heappop
+import numpy as np
+from scipy.sparse.csgraph import dijkstra
+
+# Upper bound for the number of distance values computed in one batched Dijkstra call
+DISTANCE_BATCH_SIZE = 2 ** 22
+# Number of source chunks handed to every worker process, for load balancing
+CHUNKS_PER_WORKER = 4
+# Relative tolerance when comparing distances of reversed and forward searches
+RELATIVE_TOLERANCE = 1e-9
+# Standard normal quantile of the 95 % confidence interval of sampled betweenness
+CONFIDENCE_Z = 1.96
+
+# Read-only graph of a worker process, set once by the pool initializer
+_worker_graph = None
+
+
+def _heap_dependencies(collapsed, source):
+    """
+    Single source Brandes step in pure Python, following networkx step by step and
+    visiting the neighbours in the order of the original graph. Used for graphs with zero
+    weights, where distances alone do not order the shortest path DAG.
+    :param collapsed: CollapsedGraph
+    :param source: index of the source node
+    :return tuple: distances, indices of the edges of the shortest path DAG and their
+    dependencies
+    """
+    offsets = collapsed.offsets.tolist()
+    neighbour_order = collapsed.neighbour_order.tolist()
+    heads = collapsed.heads.tolist()
+    weights = collapsed.weights.tolist()
+    number_of_nodes = collapsed.number_of_nodes
+    sigma = [0.0] * number_of_nodes
+    sigma[source] = 1.0
+    settled = [None] * number_of_nodes
+    seen = {source: 0.0}
+    predecessors = {}
+    order = []
+    queue = [(0.0, 0, source, source)]
+    counter = 1
+    while queue:
+        d, _, pred, v = heappop(queue)
+        if settled[v] is not None:
+            continue
+        sigma[v] += sigma[pred]
+        order.append(v)
+        settled[v] = d
+        for pair in neighbour_order[offsets[v]:offsets[v + 1]]:
+            w = heads[pair]
+            vw_dist = d + weights[pair]
+            if settled[w] is None and (w not in seen or vw_dist < seen[w]):
+                seen[w] = vw_dist
+                heappush(queue, (vw_dist, counter, v, w))
+                counter += 1
+                sigma[w] = 0.0
+                predecessors[w] = [(v, pair)]
+            elif vw_dist == seen[w]:
+                sigma[w] += sigma[v]
+                predecessors.setdefault(w, []).append((v, pair))
+
+    delta = [0.0] * number_of_nodes
+    pairs = []
+    dependencies = []
+    while order:
+        w = order.pop()
+        coeff = (1.0 + delta[w]) / sigma[w]
+        for v, pair in predecessors.get(w, ()):
+            c = sigma[v] * coeff
+            pairs.append(pair)
+            dependencies.append(c)
+            delta[v] += c
+    dist = np.array([np.inf if d is None else d for d in settled])
+    return dist, np.array(pairs, dtype=np.int64), np.array(dependencies)
+
+
+def shortest_path_distances(collapsed, sources):
+    """
+    Yields single source shortest path distances for several sources, computed in
+    batches by the compiled Dijkstra of scipy.
+    :param collapsed: CollapsedGraph
+    :param sources: iterable of source node indices
+    :return generator: (source, distances) tuples
+    """
+    sources = np.asarray(sources, dtype=np.int64)
+    batch = max(1, DISTANCE_BATCH_SIZE // max(collapsed.number_of_nodes, 1))
+    for start in range(0, len(sources), batch):
+        chunk = sources[start:start + batch]
+        distances = dijkstra(collapsed.matrix, directed=True, indices=chunk)
+        for source, dist in zip(chunk.tolist(), np.atleast_2d(distances)):
+            yield source, dist
+
+
+def source_dependencies(collapsed, source, dist):
+    """
+    Computes the dependency of one source on every collapsed edge (Brandes accumulation).
+    :param collapsed: CollapsedGraph
+    :param source: index of the source node
+    :param dist: shortest path distances from the source, all edge weights positive
+    :return tuple: indices of the edges of the shortest path DAG and their dependencies
+    """
+    tails = collapsed.tails
+    heads = collapsed.heads
+    tail_dist = dist[tails]
+    tight = np.flatnonzero(
+        np.isfinite(tail_dist)
+        & (tail_dist + collapsed.weights == dist[heads])
+        & (tails != heads)
+    )
+    if len(tight) == 0:
+        return tight, np.empty(0, dtype=np.float64)
+
+    dag_tails = tails[tight]
+    dag_heads = heads[tight]
+    sigma = np.zeros(collapsed.number_of_nodes)
+    sigma[source] = 1.0
+    if np.bincount(dag_heads).max() == 1:
+        # Shortest path tree: every reached node has exactly one shortest path
+        sigma[dag_heads] = 1.0
+    else:
+        forward = np.argsort(dist[dag_tails], kind="stable")
+        sigma_list = sigma.tolist()
+        for v, w in zip(dag_tails[forward].tolist(), dag_heads[forward].tolist()):
+            sigma_list[w] += sigma_list[v]
+        sigma = np.array(sigma_list)
+
+    backward = np.argsort(-dist[dag_heads], kind="stable")
+    sigma_list = sigma.tolist()
+    delta = [0.0] * collapsed.number_of_nodes
+    dependencies = []
+    for v, w in zip(dag_tails[backward].tolist(), dag_heads[backward].tolist()):
+        c = sigma_list[v] / sigma_list[w] * (1.0 + delta[w])
+        dependencies.append(c)
+        delta[v] += c
+    return tight[backward], np.array(dependencies)
+
+
+def iter_dependencies(collapsed, sources):
+    """
+    Yields the dependencies of every source on the collapsed edges.
+    :param collapsed: CollapsedGraph
+    :param sources: iterable of source node indices
+    :return generator: (source, distances, edge indices, dependencies) tuples
+    """
+    if collapsed.has_zero_weights:
+        for source in np.asarray(sources, dtype=np.int64).tolist():
+            dist, pairs, dependencies = _heap_dependencies(collapsed, source)
+            yield source, dist, pairs, dependencies
+        return
+    for source, dist in shortest_path_distances(collapsed, sources):
+        pairs, dependencies = source_dependencies(collapsed, source, dist)
+        yield source, dist, pairs, dependencies
+
+
+def pair_betweenness(collapsed, sources):
+    """
+    Sums the dependencies of the given sources on every collapsed edge.
+    :param collapsed: CollapsedGraph
+    :param sources: iterable of source node indices
+    :return np.ndarray: unscaled betweenness of every collapsed edge
+    """
+    scores = np.zeros(collapsed.number_of_pairs)
+    for _, _, pairs, dependencies in iter_dependencies(collapsed, sources):
+        np.add.at(scores, pairs, dependencies)
+    return scores
+
+
+def pair_moments(collapsed, sources):
+    """
+    Sums the dependencies of the given sources and their squares on every collapsed edge.
+    :param collapsed: CollapsedGraph
+    :param sources: iterable of source node indices
+    :return np.ndarray: array of shape (2, number of pairs) with sums and sums of squares
+    """
+    moments = np.zeros((2, collapsed.number_of_pairs))
+    for _, _, pairs, dependencies in iter_dependencies(collapsed, sources):
+        np.add.at(moments[0], pairs, dependencies)
+        np.add.at(moments[1], pairs, dependencies ** 2)
+    return moments
+
+
+def _init_worker(collapsed):
+    """
+    Stores the shared graph in a worker process, so it is transferred once per worker
+    and not with every task.
+    :param collapsed: CollapsedGraph
+    """
+    global _worker_graph
+    _worker_graph = collapsed
+
+
+def _worker_accumulate(task):
+    """
+    Accumulates a chunk of sources inside a worker process.
+    :param task: tuple of the accumulation function and an array of source node indices
+    :return np.ndarray: partial result of the accumulation function
+    """
+    accumulate, sources = task
+    return accumulate(_worker_graph, sources)
+
+
+def parallel_pair_betweenness(collapsed, sources, workers, accumulate=pair_betweenness):
+    """
+    Sums the dependencies of the given sources on every collapsed edge using a pool of
+    worker processes. Every worker accumulates the partial scores of its source chunks.
+    :param collapsed: CollapsedGraph
+    :param sources: iterable of source node indices
+    :param workers: number of worker processes
+    :param accumulate: pair_betweenness or pair_moments. Default pair_betweenness
+    :return np.ndarray: summed result of the accumulation function
+    """
+    sources = np.asarray(sources, dtype=np.int64)
+    number_of_chunks = min(len(sources), workers * CHUNKS_PER_WORKER)
+    if workers <= 1 or number_of_chunks <= 1:
+        return accumulate(collapsed, sources)
+    # Interleaved chunks spread expensive neighbouring sources over all workers
+    tasks = [(accumulate, sources[i::number_of_chunks]) for i in range(number_of_chunks)]
+    result = None
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(collapsed,)
+    ) as pool:
+        for partial_result in pool.map(_worker_accumulate, tasks):
+            result = partial_result if result is None else result + partial_result
+    return result
+
+
+def rescale(scores, number_of_nodes, normalized=True, number_of_sources=None):
+    """
+    Rescales directed edge betweenness the way networkx does.
+    :param scores: unscaled edge betweenness
+    :param number_of_nodes: number of nodes of the graph
+    :param normalized: normalize by the number of node pairs. Default True
+    :param number_of_sources: number of sampled sources, None if all nodes were used
+    :return np.ndarray: rescaled scores
+    """
+    if not normalized or number_of_nodes <= 1:
+        return scores
+    scale = 1 / (number_of_nodes * (number_of_nodes - 1))
+    if number_of_sources is not None:
+        scale = scale * number_of_nodes / number_of_sources
+    return scores * scale
+
+
+def edge_betweenness(csr_graph, sources=None, normalized=True, workers=1):
+    """
+    Calculates edge betweenness centrality on a CsrGraph. Gives the same values as
+    nx.edge_betweenness_centrality on the original multigraph. With zero weights networkx
+    depends on the order of the neighbours, which is only known for graphs compiled by
+    CsrGraph.from_graph; other graphs use the order of the node indices.
+    :param csr_graph: CsrGraph
+    :param sources: node indices used as sources. Default None uses all nodes
+    :param normalized: normalize by the number of node pairs. Default True
+    :param workers: number of worker processes. Default 1 runs in this process
+    :return np.ndarray: betweenness of every edge id
+    """
+    collapsed = csr_graph.collapsed()
+    number_of_sources = None
+    if sources is None:
+        sources = np.arange(csr_graph.number_of_nodes)
+    else:
+        number_of_sources = len(sources)
+    scores = parallel_pair_betweenness(collapsed, sources, workers)
+    scores = rescale(scores, csr_graph.number_of_nodes, normalized, number_of_sources)
+    return collapsed.to_edge_scores(scores)
+
+
+def affected_sources(collapsed, pairs, weights):
+    """
+    Finds the sources whose shortest path DAG changes if the weights of some collapsed
+    edges change. A source is affected if a changed edge (t, h) is part of its DAG or
+    becomes at least as short as the known distance to h, i.e. if dist(s, t) + w <=
+    dist(s, h) for the lower of the old and new weight w. The distances to t and h from
+    all sources are found by two Dijkstra searches on the reversed graph per changed edge.
+    A small tolerance for rounding differences of the reversed sums may add unaffected
+    sources, which only costs time.
+    :param collapsed: CollapsedGraph before the changes
+    :param pairs: indices of the changed collapsed edges
+    :param weights: new weight of every changed collapsed edge, np.inf if it is removed
+    :return np.ndarray: node indices of the affected sources
+    """
+    reverse = collapsed.matrix.transpose().tocsr()
+    lowest = np.minimum(collapsed.weights[pairs], weights)
+    affected = np.zeros(collapsed.number_of_nodes, dtype=bool)
+    batch = max(1, DISTANCE_BATCH_SIZE // max(2 * collapsed.number_of_nodes, 1))
+    for start in range(0, len(pairs), batch):
+        chunk = pairs[start:start + batch]
+        indices = np.concatenate((collapsed.tails[chunk], collapsed.heads[chunk]))
+        distances = np.atleast_2d(dijkstra(reverse, directed=True, indices=indices))
+        to_tails, to_heads = distances[:len(chunk)], distances[len(chunk):]
+        with np.errstate(invalid="ignore"):
+            shorter = to_tails + lowest[start:start + batch, None] <= (
+                to_heads + RELATIVE_TOLERANCE * np.maximum(to_heads, 1.0)
+            )
+        affected |= (np.isfinite(to_tails) & shorter).any(axis=0)
+    return np.flatnonzero(affected)
+
+
+def update_edge_betweenness(csr_graph, scores, changes, normalized=True, workers=1):
+    """
+    Updates exact edge betweenness after edge weight changes and closures. Only the
+    sources whose shortest path DAG is affected are recomputed: their old dependencies are
+    subtracted and their new ones added, which gives the values of a full recomputation.
+    :param csr_graph: CsrGraph the scores were calculated on
+    :param scores: exact betweenness of every edge id of csr_graph
+    :param changes: dictionary of edge id to new weight, np.inf closes the edge
+    :param normalized: whether the scores are normalized. Default True
+    :param workers: number of worker processes. Default 1
+    :return tuple: CsrGraph after the changes, betweenness of its edge ids and the number
+    of recomputed sources
+    """
+    edge_ids = np.fromiter(changes.keys(), dtype=np.int64, count=len(changes))
+    new_weights = np.fromiter(changes.values(), dtype=np.float64, count=len(changes))
+    if (new_weights < 0).any() or np.isnan(new_weights).any():
+        raise ValueError("New edge weights must be non-negative numbers or np.inf.")
+    weights = csr_graph.weights.copy()
+    weights[edge_ids] = new_weights
+    new_graph = csr_graph.reweighted(weights)
+    closed = np.flatnonzero(np.isinf(weights))
+    if len(closed):
+        new_graph = new_graph.without_edges(closed)
+
+    collapsed = csr_graph.collapsed()
+    new_collapsed = new_graph.collapsed()
+    # Minimum weight of every collapsed edge after the changes, np.inf if removed
+    pair_weights = np.full(collapsed.number_of_pairs, np.inf)
+    pair_weights[np.searchsorted(collapsed.pair_keys, new_collapsed.pair_keys)] = (
+        new_collapsed.weights
+    )
+    changed = np.flatnonzero(pair_weights != collapsed.weights)
+
+    number_of_nodes = csr_graph.number_of_nodes
+    scale = rescale(1.0, number_of_nodes, normalized)
+    pair_scores = np.bincount(
+        collapsed.edge_pair, weights=scores, minlength=collapsed.number_of_pairs
+    ) / scale
+    sources = np.empty(0, dtype=np.int64)
+    if len(changed):
+        sources = affected_sources(collapsed, changed, pair_weights[changed])
+    if len(sources):
+        pair_scores -= parallel_pair_betweenness(collapsed, sources, workers)
+
+    # Map the remaining collapsed edges onto the collapsed graph after the changes
+    new_pair_scores = pair_scores[np.searchsorted(collapsed.pair_keys, new_collapsed.pair_keys)]
+    if len(sources):
+        new_pair_scores += parallel_pair_betweenness(new_collapsed, sources, workers)
+    # Remove rounding residues of edges that only affected sources passed
+    new_pair_scores = np.maximum(new_pair_scores, 0.0)
+    new_scores = new_collapsed.to_edge_scores(new_pair_scores * scale)
+    return new_graph, new_scores, len(sources)
+
+
+class BetweennessEstimate:
+    """
+    Edge betweenness estimated from sampled source pivots.
+    """
+    def __init__(self, centrality, low, high, pivots, converged):
+        """
+        :param centrality: estimated betweenness of every edge id
+        :param low: lower bound of the 95 % confidence interval of every edge id
+        :param high: upper bound of the 95 % confidence interval of every edge id
+        :param pivots: number of sampled source pivots
+        :param converged: whether the adaptive ranking criterion was met
+        """
+        self.centrality = centrality
+        self.low = low
+        self.high = high
+        self.pivots = pivots
+        self.converged = converged
+
+
+def _top_edges(scores, top_n):
+    """
+    :param scores: score of every edge id
+    :param top_n: number of edges
+    :return frozenset: edge ids with the highest scores
+    """
+    return frozenset(np.argsort(-scores, kind="stable")[:top_n].tolist())
+
+
+def approximate_edge_betweenness(
+    csr_graph, pivots, seed=42, workers=1, adaptive=False, top_n=100, patience=2,
+    max_pivots=None,
+):
+    """
+    Estimates edge betweenness from randomly sampled source pivots (sampling without
+    replacement) together with a normal approximation of its 95 % confidence interval.
+    In adaptive mode pivots are added in batches until the set of the top_n edges stays
+    the same for `patience` consecutive batches.
+    :param csr_graph: CsrGraph
+    :param pivots: number of sampled pivots, the batch size in adaptive mode
+    :param seed: seed of the pivot sampling. Default 42
+    :param workers: number of worker processes. Default 1
+    :param adaptive: keep adding pivots until the top_n ranking is stable. Default False
+    :param top_n: number of top edges compared between batches. Default 100
+    :param patience: number of unchanged batches required to stop. Default 2
+    :param max_pivots: upper bound for adaptive sampling. Default None allows all nodes
+    :return BetweennessEstimate: normalized estimate like nx.edge_betweenness_centrality
+    """
+    if pivots < 1:
+        raise ValueError("The number of pivots must be at least 1.")
+    collapsed = csr_graph.collapsed()
+    number_of_nodes = csr_graph.number_of_nodes
+    order = np.random.default_rng(seed).permutation(number_of_nodes)
+    if max_pivots is not None:
+        order = order[:max_pivots]
+
+    moments = np.zeros((2, collapsed.number_of_pairs))
+    used = 0
+    converged = False
+    previous_top = None
+    stable_batches = 0
+    while used < len(order):
+        batch = order[used:used + pivots]
+        moments += parallel_pair_betweenness(collapsed, batch, workers, pair_moments)
+        used += len(batch)
+        if not adaptive:
+            break
+        top = _top_edges(collapsed.to_edge_scores(moments[0]), top_n)
+        stable_batches = stable_batches + 1 if top == previous_top else 0
+        previous_top = top
+        if stable_batches >= patience:
+            converged = True
+            break
+
+    mean = moments[0] / used
+    variance = np.zeros_like(mean)
+    if used > 1:
+        variance = np.maximum(moments[1] - used * mean ** 2, 0.0) / (used - 1)
+    # Finite population correction, the error vanishes once every node is a pivot
+    correction = (number_of_nodes - used) / max(number_of_nodes - 1, 1)
+    error = number_of_nodes * np.sqrt(variance / used * correction) * CONFIDENCE_Z
+    total = rescale(number_of_nodes * mean, number_of_nodes)
+    error = rescale(error, number_of_nodes)
+
+    return BetweennessEstimate(
+        centrality=collapsed.to_edge_scores(total),
+        low=collapsed.to_edge_scores(np.maximum(total - error, 0.0)),
+        high=collapsed.to_edge_scores(total + error),
+        pivots=used,
+        converged=converged,
+    )
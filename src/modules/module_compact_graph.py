@@ -0,0 +1,258 @@
+"""
+Module to store a street network as flat arrays in a memory-mappable file format.
+"""
+
+import os
+import json
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+import osmnx as ox
+from .module_csr_graph import CsrGraph
+from .module_speed_profiles import edge_speed_attributes
+
+# Version of the file format, stored in the metadata of every compact graph
+FORMAT_VERSION = 1
+METADATA_FILE = "metadata.json"
+# Flat arrays of a compact graph, each stored as <name>.npy
+ARRAYS = (
+    "nodes", "node_x", "node_y", "offsets", "targets", "keys", "length", "maxspeed_kph",
+    "highway", "osmid_offsets", "osmid_values", "geometry_offsets", "geometry_coords",
+)
+
+
+def _offsets(counts):
+    """
+    Turns the number of values of every edge into offsets into a flat value array.
+    :param counts: number of values of every edge
+    :return np.ndarray: array of length m + 1 with the first value position of every edge
+    """
+    offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    return offsets
+
+
+def _flat_positions(offsets, edge_ids):
+    """
+    Returns the positions of the values of several edges in a flat value array.
+    :param offsets: array of length m + 1 with the first value position of every edge
+    :param edge_ids: array of edge ids
+    :return tuple: positions of all values in edge order and the number of values per edge
+    """
+    starts = offsets[edge_ids]
+    counts = offsets[edge_ids + 1] - starts
+    positions = np.arange(int(counts.sum()), dtype=np.int64)
+    positions += np.repeat(starts - (np.cumsum(counts) - counts), counts)
+    return positions, counts
+
+
+class CompactGraph:
+    """
+    Street network stored as flat arrays: node ids and coordinates, the CSR adjacency,
+    and per edge the length, maxspeed, highway class, osm ids and geometry. Variable
+    length attributes (osm ids, geometry coordinates) are stored as one flat array with
+    offsets per edge. Saved graphs are loaded memory-mapped, so they open in seconds and
+    worker processes share their pages.
+    """
+    def __init__(self, arrays, highway_names, crs):
+        """
+        Initializes a CompactGraph from its arrays.
+        :param arrays: dictionary with one array per name in ARRAYS
+        :param highway_names: highway class of every highway code
+        :param crs: coordinate reference system of the node coordinates and geometries
+        """
+        missing = [name for name in ARRAYS if name not in arrays]
+        if missing:
+            raise ValueError(f"Compact graph arrays missing: {missing}.")
+        for name in ARRAYS:
+            setattr(self, name, arrays[name])
+        self.highway_names = list(highway_names)
+        self.crs = crs
+        # Folder the graph was loaded from, None for graphs compiled in memory
+        self.directory = None
+        self._csr_graphs = {}
+
+    @classmethod
+    def from_graph(cls, graph):
+        """
+        Compiles an osmnx MultiDiGraph into a CompactGraph. Edges without a geometry get
+        the straight line between their nodes, like in ox.graph_to_gdfs.
+        :param graph: Networkx graph object with integer node ids
+        :return CompactGraph: compiled graph
+        """
+        csr_graph = CsrGraph.from_graph(graph, "length")
+        if csr_graph.nodes.dtype.kind not in "iu":
+            raise ValueError("Compact graphs require integer node ids.")
+        if csr_graph.keys.dtype.kind not in "iu":
+            raise ValueError("Compact graphs require integer edge keys.")
+
+        number_of_edges = csr_graph.number_of_edges
+        edge_tuples = csr_graph.edge_tuples()
+        maxspeed_kph, highway, highway_names = edge_speed_attributes(graph, edge_tuples)
+        osmid_counts = np.empty(number_of_edges, dtype=np.int64)
+        osmid_values = []
+        geometry_counts = np.empty(number_of_edges, dtype=np.int64)
+        geometries = []
+        nodes = graph.nodes
+        for i, (u, v, key) in enumerate(edge_tuples):
+            data = graph.edges[u, v, key]
+            osmid = data.get("osmid", [])
+            osmid = osmid if isinstance(osmid, list) else [osmid]
+            osmid_counts[i] = len(osmid)
+            osmid_values.extend(osmid)
+
+            if "geometry" in data:
+                coords = shapely.get_coordinates(data["geometry"])
+            else:
+                coords = np.array([
+                    (nodes[u]["x"], nodes[u]["y"]), (nodes[v]["x"], nodes[v]["y"])
+                ])
+            geometry_counts[i] = len(coords)
+            geometries.append(coords)
+
+        arrays = {
+            "nodes": csr_graph.nodes,
+            "node_x": csr_graph.node_x,
+            "node_y": csr_graph.node_y,
+            "offsets": csr_graph.offsets,
+            "targets": csr_graph.targets,
+            "keys": csr_graph.keys,
+            "length": csr_graph.weights,
+            "maxspeed_kph": maxspeed_kph,
+            "highway": highway,
+            "osmid_offsets": _offsets(osmid_counts),
+            "osmid_values": np.array(osmid_values, dtype=np.int64),
+            "geometry_offsets": _offsets(geometry_counts),
+            "geometry_coords": (
+                np.concatenate(geometries) if geometries else np.empty((0, 2))
+            ),
+        }
+        return cls(arrays, highway_names, graph.graph.get("crs"))
+
+    def save(self, directory):
+        """
+        Saves the graph as one .npy file per array and a metadata file.
+        :param directory: folder of the compact graph, created if necessary
+        """
+        os.makedirs(directory, exist_ok=True)
+        for name in ARRAYS:
+            np.save(os.path.join(directory, f"{name}.npy"), np.asarray(getattr(self, name)))
+        metadata = {
+            "format_version": FORMAT_VERSION,
+            "crs": None if self.crs is None else str(self.crs),
+            "highway_names": self.highway_names,
+        }
+        with open(os.path.join(directory, METADATA_FILE), "w", encoding="utf-8") as file:
+            json.dump(metadata, file)
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        """
+        Loads a saved compact graph.
+        :param directory: folder of the compact graph
+        :param mmap: memory-map the arrays instead of reading them. Default True
+        :return CompactGraph: loaded graph
+        :raises ValueError: If the file format version is not supported
+        """
+        with open(os.path.join(directory, METADATA_FILE), encoding="utf-8") as file:
+            metadata = json.load(file)
+        if metadata.get("format_version") != FORMAT_VERSION:
+            raise ValueError(
+                f"Unsupported compact graph format {metadata.get('format_version')}."
+            )
+        arrays = {
+            name: np.load(
+                os.path.join(directory, f"{name}.npy"), mmap_mode="r" if mmap else None
+            )
+            for name in ARRAYS
+        }
+        graph = cls(arrays, metadata["highway_names"], metadata["crs"])
+        graph.directory = directory
+        return graph
+
+    @staticmethod
+    def exists(directory):
+        """
+        :param directory: folder of a compact graph
+        :return bool: whether a compact graph is saved in the folder
+        """
+        return os.path.isfile(os.path.join(directory, METADATA_FILE))
+
+    @property
+    def number_of_nodes(self):
+        """
+        :return int: number of nodes
+        """
+        return len(self.nodes)
+
+    @property
+    def number_of_edges(self):
+        """
+        :return int: number of edges
+        """
+        return len(self.targets)
+
+    def is_projected(self):
+        """
+        :return bool: whether the coordinates are projected
+        """
+        return self.crs is not None and ox.projection.is_projected(self.crs)
+
+    def csr_graph(self, weight="length"):
+        """
+        Returns the CsrGraph with an edge array as weight, sharing the arrays of this graph.
+        :param weight: name of a per edge array, e.g. "length"
+        :return CsrGraph: graph for the centrality calculations, cached per weight
+        :raises ValueError: If the weight is not stored in the compact graph
+        """
+        if weight not in self._csr_graphs:
+            if weight != "length":
+                raise ValueError(f"Weight '{weight}' is not stored in the compact graph.")
+            self._csr_graphs[weight] = CsrGraph(
+                self.nodes, self.offsets, self.targets, self.keys, self.length,
+                node_x=self.node_x, node_y=self.node_y,
+            )
+        return self._csr_graphs[weight]
+
+    def edges_gdf(self, edge_ids=None):
+        """
+        Builds a GeoDataFrame of edges like ox.graph_to_gdfs. Only the osm ids (an integer,
+        or a list for merged edges), highway class, length and geometry are included.
+        :param edge_ids: edge ids to include. Default None includes all edges
+        :return GeoDataFrame: edges indexed by u, v and key
+        """
+        if edge_ids is None:
+            edge_ids = np.arange(self.number_of_edges)
+        edge_ids = np.asarray(edge_ids, dtype=np.int64)
+        sources = np.searchsorted(self.offsets, edge_ids, side="right") - 1
+        index = pd.MultiIndex.from_arrays(
+            [self.nodes[sources], self.nodes[self.targets[edge_ids]], self.keys[edge_ids]],
+            names=["u", "v", "key"],
+        )
+
+        positions, counts = _flat_positions(self.geometry_offsets, edge_ids)
+        geometry = shapely.linestrings(
+            self.geometry_coords[positions],
+            indices=np.repeat(np.arange(len(edge_ids)), counts),
+        ) if len(positions) else np.empty(0, dtype=object)
+
+        positions, counts = _flat_positions(self.osmid_offsets, edge_ids)
+        values = self.osmid_values[positions].tolist()
+        ends = np.cumsum(counts).tolist()
+        osmid = [
+            values[end - 1] if count == 1 else values[end - count:end]
+            for end, count in zip(ends, counts.tolist())
+        ]
+
+        highway_names = np.array(self.highway_names + [None], dtype=object)
+        return gpd.GeoDataFrame(
+            {
+                "osmid": osmid,
+                "highway": highway_names[self.highway[edge_ids]],
+                "length": self.length[edge_ids],
+            },
+            geometry=geometry,
+            index=index,
+            crs=self.crs,
+        )
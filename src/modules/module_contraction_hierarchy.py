@@ -0,0 +1,461 @@
+"""
+Module to answer many point to point shortest path queries on a static graph with a
+contraction hierarchy. The nodes are contracted one by one in the order of their edge
+difference; shortcuts keep the routes between the remaining nodes and remember the node
+they bypass, so the routes of a bidirectional upward search can be unpacked to edges.
+"""
+
+import os
+import json
+import heapq
+import hashlib
+from math import inf
+import numpy as np
+
+# Version of the saved file format
+FORMAT_VERSION = 1
+# Name of the metadata file in a contraction hierarchy folder
+METADATA_FILE = "contraction_hierarchy.json"
+# Arrays of a contraction hierarchy. The upward arcs of every node lead to nodes of higher
+# rank, the forward arcs leave the node and the backward arcs enter it.
+ARRAYS = (
+    "rank",
+    "forward_offsets", "forward_heads", "forward_weights", "forward_middles",
+    "backward_offsets", "backward_tails", "backward_weights", "backward_middles",
+)
+# Maximum number of nodes settled by a witness search. A search which stops early adds a
+# shortcut that may be unnecessary, which only costs query time, never correctness.
+WITNESS_SETTLED_LIMIT = 100
+
+
+def graph_fingerprint(collapsed):
+    """
+    Hashes the collapsed graph a contraction hierarchy is built from, so a saved hierarchy
+    is only used for the graph and weights it belongs to.
+    :param collapsed: CollapsedGraph of a CsrGraph
+    :return str: hexadecimal SHA-256 digest
+    """
+    digest = hashlib.sha256()
+    digest.update(np.int64(collapsed.number_of_nodes).tobytes())
+    for array, dtype in (
+        (collapsed.tails, np.int64), (collapsed.heads, np.int64),
+        (collapsed.weights, np.float64),
+    ):
+        digest.update(np.ascontiguousarray(array, dtype=dtype).tobytes())
+    return digest.hexdigest()
+
+
+def _upward_arrays(number_of_nodes, arcs):
+    """
+    Sorts upward arcs by the node they belong to.
+    :param number_of_nodes: number of nodes
+    :param arcs: tuples of the node, the other end, the weight and the middle node of
+    every arc (-1 for edges of the graph)
+    :return tuple: offsets per node, other ends, weights and middle nodes
+    """
+    arcs = np.array(arcs, dtype=np.float64).reshape(-1, 4)
+    order = np.argsort(arcs[:, 0], kind="stable")
+    arcs = arcs[order]
+    nodes = arcs[:, 0].astype(np.int64)
+    offsets = np.searchsorted(nodes, np.arange(number_of_nodes + 1)).astype(np.int64)
+    return offsets, arcs[:, 1].astype(np.int64), arcs[:, 2], arcs[:, 3].astype(np.int64)
+
+
+class _Contraction:
+    """
+    Remaining graph while the nodes are contracted.
+    """
+    def __init__(self, collapsed):
+        """
+        Initializes the remaining graph with the collapsed edges, self loops are dropped.
+        :param collapsed: CollapsedGraph of a CsrGraph
+        """
+        number_of_nodes = collapsed.number_of_nodes
+        self.outgoing = [{} for _ in range(number_of_nodes)]
+        self.incoming = [{} for _ in range(number_of_nodes)]
+        self.middles = {}
+        self.deleted_neighbours = [0] * number_of_nodes
+        for tail, head, weight in zip(
+            collapsed.tails.tolist(), collapsed.heads.tolist(), collapsed.weights.tolist()
+        ):
+            if tail != head:
+                self.outgoing[tail][head] = weight
+                self.incoming[head][tail] = weight
+
+    def witness_distances(self, source, skipped, limit, targets):
+        """
+        Searches the remaining graph from a node without passing the contracted node,
+        until all targets are settled or the distance limit is reached.
+        :param source: start node
+        :param skipped: node being contracted
+        :param limit: distance up to which the search runs
+        :param targets: nodes whose distances are needed
+        :return dict: distances of the settled and reached nodes
+        """
+        distances = {source: 0.0}
+        heap = [(0.0, source)]
+        remaining = len(targets)
+        settled = 0
+        outgoing = self.outgoing
+        while heap and settled < WITNESS_SETTLED_LIMIT:
+            distance, node = heapq.heappop(heap)
+            if distance > limit:
+                break
+            if distance > distances[node]:
+                continue
+            settled += 1
+            if node in targets:
+                remaining -= 1
+                if remaining == 0:
+                    break
+            for head, weight in outgoing[node].items():
+                new_distance = distance + weight
+                if head != skipped and new_distance < distances.get(head, inf):
+                    distances[head] = new_distance
+                    heapq.heappush(heap, (new_distance, head))
+        return distances
+
+    def shortcuts(self, node):
+        """
+        Finds the shortcuts needed to contract a node: one for every pair of neighbours
+        whose only shortest connection in the remaining graph passes the node.
+        :param node: node to contract
+        :return list: tuples of tail, head and weight of the shortcuts
+        """
+        incoming = self.incoming[node]
+        outgoing = self.outgoing[node]
+        if not incoming or not outgoing:
+            return []
+        longest_out = max(outgoing.values())
+        result = []
+        for tail, weight_in in incoming.items():
+            targets = outgoing.keys() - {tail}
+            if not targets:
+                continue
+            distances = self.witness_distances(tail, node, weight_in + longest_out, targets)
+            for head, weight_out in outgoing.items():
+                weight = weight_in + weight_out
+                if head != tail and distances.get(head, inf) > weight:
+                    result.append((tail, head, weight))
+        return result
+
+    def priority(self, node, shortcuts):
+        """
+        Edge difference of contracting a node plus its number of contracted neighbours,
+        which spreads the contraction evenly over the graph.
+        :param node: node to rate
+        :param shortcuts: shortcuts needed to contract the node
+        :return int: priority, the lowest is contracted first
+        """
+        removed = len(self.incoming[node]) + len(self.outgoing[node])
+        return len(shortcuts) - removed + self.deleted_neighbours[node]
+
+    def contract(self, node, shortcuts):
+        """
+        Contracts a node: adds its shortcuts and removes it from the remaining graph.
+        :param node: node to contract
+        :param shortcuts: shortcuts needed to contract the node
+        :return tuple: forward and backward upward arcs of the node
+        """
+        for tail, head, weight in shortcuts:
+            if weight < self.outgoing[tail].get(head, inf):
+                self.outgoing[tail][head] = weight
+                self.incoming[head][tail] = weight
+                self.middles[tail, head] = node
+
+        forward = [
+            (node, head, weight, self.middles.get((node, head), -1))
+            for head, weight in self.outgoing[node].items()
+        ]
+        backward = [
+            (node, tail, weight, self.middles.get((tail, node), -1))
+            for tail, weight in self.incoming[node].items()
+        ]
+        for head in self.outgoing[node]:
+            del self.incoming[head][node]
+            self.deleted_neighbours[head] += 1
+        for tail in self.incoming[node]:
+            del self.outgoing[tail][node]
+            self.deleted_neighbours[tail] += 1
+        self.outgoing[node] = {}
+        self.incoming[node] = {}
+        return forward, backward
+
+
+class ContractionHierarchy:
+    """
+    Contraction hierarchy of the collapsed graph of a CsrGraph. Queries run a bidirectional
+    Dijkstra search which only follows arcs to nodes of higher rank, and the shortcuts of
+    the route found are unpacked to the nodes of the graph. The route is a shortest route
+    of the graph; if several routes are equally short, it may be a different one than
+    ox.shortest_path returns.
+    """
+    def __init__(self, arrays, fingerprint):
+        """
+        Initializes a ContractionHierarchy from its arrays.
+        :param arrays: dictionary with one array per name in ARRAYS
+        :param fingerprint: graph_fingerprint of the graph the hierarchy was built from
+        """
+        missing = [name for name in ARRAYS if name not in arrays]
+        if missing:
+            raise ValueError(f"Contraction hierarchy arrays missing: {missing}.")
+        for name in ARRAYS:
+            setattr(self, name, np.asarray(arrays[name]))
+        self.fingerprint = fingerprint
+        # Python lists are much faster than array indexing in the search loops
+        self._forward = self._adjacency(
+            self.forward_offsets, self.forward_heads, self.forward_weights
+        )
+        self._backward = self._adjacency(
+            self.backward_offsets, self.backward_tails, self.backward_weights
+        )
+        self._middles = {}
+        for node, others, middles, forward in (
+            (np.repeat(np.arange(self.number_of_nodes), np.diff(self.forward_offsets)),
+             self.forward_heads, self.forward_middles, True),
+            (np.repeat(np.arange(self.number_of_nodes), np.diff(self.backward_offsets)),
+             self.backward_tails, self.backward_middles, False),
+        ):
+            shortcut = middles >= 0
+            tails, heads = (node, others) if forward else (others, node)
+            self._middles.update(zip(
+                zip(tails[shortcut].tolist(), heads[shortcut].tolist()),
+                middles[shortcut].tolist(),
+            ))
+
+    def __getstate__(self):
+        """
+        Pickles only the arrays, the search lists are rebuilt when unpickling.
+        :return dict: arrays and fingerprint
+        """
+        return {
+            "arrays": {name: getattr(self, name) for name in ARRAYS},
+            "fingerprint": self.fingerprint,
+        }
+
+    def __setstate__(self, state):
+        """
+        Restores a pickled contraction hierarchy.
+        :param state: result of __getstate__
+        """
+        self.__init__(state["arrays"], state["fingerprint"])
+
+    @staticmethod
+    def _adjacency(offsets, others, weights):
+        """
+        Converts upward arcs to one list of (other end, weight) tuples per node.
+        :param offsets: offsets of the arcs of every node
+        :param others: other end of every arc
+        :param weights: weight of every arc
+        :return list: arcs of every node
+        """
+        arcs = list(zip(others.tolist(), weights.tolist()))
+        offsets = offsets.tolist()
+        return [arcs[start:end] for start, end in zip(offsets[:-1], offsets[1:])]
+
+    @classmethod
+    def build(cls, csr_graph):
+        """
+        Contracts all nodes of the collapsed graph of a CsrGraph. The node with the lowest
+        priority is contracted next, and the priorities of its neighbours are updated.
+        :param csr_graph: CsrGraph with the routing weight
+        :return ContractionHierarchy: contraction hierarchy of the graph
+        """
+        collapsed = csr_graph.collapsed()
+        number_of_nodes = collapsed.number_of_nodes
+        contraction = _Contraction(collapsed)
+        shortcuts = [contraction.shortcuts(node) for node in range(number_of_nodes)]
+        priorities = [
+            contraction.priority(node, shortcuts[node]) for node in range(number_of_nodes)
+        ]
+        queue = [(priority, node) for node, priority in enumerate(priorities)]
+        heapq.heapify(queue)
+
+        rank = np.full(number_of_nodes, -1, dtype=np.int64)
+        forward_arcs = []
+        backward_arcs = []
+        next_rank = 0
+        while queue:
+            priority, node = heapq.heappop(queue)
+            if rank[node] >= 0 or priority != priorities[node]:
+                continue
+            neighbours = contraction.outgoing[node].keys() | contraction.incoming[node].keys()
+            # The stored shortcuts may rely on a witness path over a node contracted since,
+            # e.g. a parallel path of equal weight, so they are searched again
+            forward, backward = contraction.contract(node, contraction.shortcuts(node))
+            forward_arcs.extend(forward)
+            backward_arcs.extend(backward)
+            shortcuts[node] = None
+            rank[node] = next_rank
+            next_rank += 1
+            # Contracting a node only changes the shortcuts of its neighbours, distances
+            # between the remaining nodes are kept
+            for neighbour in neighbours:
+                shortcuts[neighbour] = contraction.shortcuts(neighbour)
+                priorities[neighbour] = contraction.priority(neighbour, shortcuts[neighbour])
+                heapq.heappush(queue, (priorities[neighbour], neighbour))
+
+        arrays = {"rank": rank}
+        for prefix, other, arcs in (
+            ("forward", "heads", forward_arcs), ("backward", "tails", backward_arcs),
+        ):
+            offsets, others, weights, middles = _upward_arrays(number_of_nodes, arcs)
+            arrays.update({
+                f"{prefix}_offsets": offsets, f"{prefix}_{other}": others,
+                f"{prefix}_weights": weights, f"{prefix}_middles": middles,
+            })
+        return cls(arrays, graph_fingerprint(collapsed))
+
+    def save(self, directory):
+        """
+        Saves the hierarchy as one .npy file per array and a metadata file.
+        :param directory: folder of the contraction hierarchy, created if necessary
+        """
+        os.makedirs(directory, exist_ok=True)
+        for name in ARRAYS:
+            np.save(os.path.join(directory, f"{name}.npy"), getattr(self, name))
+        metadata = {"format_version": FORMAT_VERSION, "fingerprint": self.fingerprint}
+        with open(os.path.join(directory, METADATA_FILE), "w", encoding="utf-8") as file:
+            json.dump(metadata, file)
+
+    @classmethod
+    def load(cls, directory):
+        """
+        Loads a saved contraction hierarchy.
+        :param directory: folder of the contraction hierarchy
+        :return ContractionHierarchy: loaded hierarchy
+        :raises ValueError: If the file format version is not supported
+        """
+        with open(os.path.join(directory, METADATA_FILE), encoding="utf-8") as file:
+            metadata = json.load(file)
+        if metadata.get("format_version") != FORMAT_VERSION:
+            raise ValueError(
+                f"Unsupported contraction hierarchy format {metadata.get('format_version')}."
+            )
+        arrays = {name: np.load(os.path.join(directory, f"{name}.npy")) for name in ARRAYS}
+        return cls(arrays, metadata["fingerprint"])
+
+    @classmethod
+    def load_or_build(cls, directory, csr_graph):
+        """
+        Loads the contraction hierarchy saved in a folder if it belongs to the graph,
+        otherwise builds it and saves it in the folder.
+        :param directory: folder of the contraction hierarchy
+        :param csr_graph: CsrGraph with the routing weight
+        :return tuple: contraction hierarchy and whether it was loaded
+        """
+        if os.path.isfile(os.path.join(directory, METADATA_FILE)):
+            hierarchy = cls.load(directory)
+            if hierarchy.fingerprint == graph_fingerprint(csr_graph.collapsed()):
+                return hierarchy, True
+        hierarchy = cls.build(csr_graph)
+        hierarchy.save(directory)
+        return hierarchy, False
+
+    @property
+    def number_of_nodes(self):
+        """
+        :return int: number of nodes
+        """
+        return len(self.rank)
+
+    @property
+    def number_of_shortcuts(self):
+        """
+        :return int: number of upward arcs which bypass a contracted node
+        """
+        return int((self.forward_middles >= 0).sum() + (self.backward_middles >= 0).sum())
+
+    def route(self, source, target):
+        """
+        Finds a shortest route between two nodes. Its weight is the Dijkstra distance, but
+        of several equally short routes it may return a different one than ox.shortest_path
+        or the shortest path trees of tree_route_loads.
+        :param source: node index of the origin
+        :param target: node index of the destination
+        :return list or None: node indices of the route, None if there is no route
+        """
+        if source == target:
+            return [source]
+        searches = (
+            (self._forward, {source: 0.0}, {source: -1}, [(0.0, source)]),
+            (self._backward, {target: 0.0}, {target: -1}, [(0.0, target)]),
+        )
+        best = inf
+        meeting = -1
+        while True:
+            # Continue the search with the lower queue key, both end once it reaches best
+            active = [search for search in searches if search[3] and search[3][0][0] < best]
+            if not active:
+                break
+            arcs, distances, parents, heap = min(active, key=lambda search: search[3][0][0])
+            other_distances = searches[1][1] if distances is searches[0][1] else searches[0][1]
+            distance, node = heapq.heappop(heap)
+            if distance > distances[node]:
+                continue
+            total = distance + other_distances.get(node, inf)
+            if total < best:
+                best, meeting = total, node
+            for other, weight in arcs[node]:
+                new_distance = distance + weight
+                if new_distance < distances.get(other, inf):
+                    distances[other] = new_distance
+                    parents[other] = node
+                    heapq.heappush(heap, (new_distance, other))
+        if meeting < 0:
+            return None
+
+        upward = [meeting]
+        forward_parents = searches[0][2]
+        while forward_parents[upward[-1]] >= 0:
+            upward.append(forward_parents[upward[-1]])
+        upward.reverse()
+        backward_parents = searches[1][2]
+        while backward_parents[upward[-1]] >= 0:
+            upward.append(backward_parents[upward[-1]])
+
+        route = [source]
+        for tail, head in zip(upward[:-1], upward[1:]):
+            self._unpack(tail, head, route)
+        return route
+
+    def _unpack(self, tail, head, route):
+        """
+        Appends the nodes of an arc after its tail to a route, replacing shortcuts by the
+        arcs they bypass.
+        :param tail: tail node of the arc
+        :param head: head node of the arc
+        :param route: list of node indices ending with the tail
+        """
+        stack = [(tail, head)]
+        while stack:
+            tail, head = stack.pop()
+            middle = self._middles.get((tail, head), -1)
+            if middle < 0:
+                route.append(head)
+            else:
+                stack.append((middle, head))
+                stack.append((tail, middle))
+
+    def route_loads(self, csr_graph, origins, destinations):
+        """
+        Counts how often every edge is used by the routes between origin destination pairs.
+        Each step of a route uses the parallel edge of minimum weight, like ox.shortest_path.
+        :param csr_graph: CsrGraph the hierarchy was built from
+        :param origins: array of origin node indices
+        :param destinations: array of destination node indices
+        :return tuple: edge loads (one integer per edge id) and the number of routed pairs
+        """
+        collapsed = csr_graph.collapsed()
+        loads = np.zeros(csr_graph.number_of_edges, dtype=np.int64)
+        count = 0
+        for origin, destination in zip(
+            np.asarray(origins).tolist(), np.asarray(destinations).tolist()
+        ):
+            route = self.route(origin, destination)
+            if route is None or len(route) < 2:
+                continue
+            # A shortest route passes every edge at most once
+            loads[collapsed.route_edge[collapsed.pair_index(route[:-1], route[1:])]] += 1
+            count += 1
+        return loads, count
@@ -3,20 +3,23 @@ Module to create a Region object and download OpenStreetMap data.
 """
 
 import osmnx as ox
+from .module_compact_graph import CompactGraph
 
 
 class Region:
     """
     Represents a geographic region and provides methods to download OpenStreetMap data.
     """
-    def __init__(self, region, network_type):
+    def __init__(self, region, network_type, cache=None):
         """
         Initializes Region object with the specified region and network type.
         :param region: name or area identifier for region of interest
         :param network_type: type of street network to download
+        :param cache: OsmCache to load the data from and store it in. Default None
         """
         self.area = region
         self.network_type = network_type
+        self.cache = cache
 
     def download_osm(self):
         """
@@ -25,11 +28,42 @@ class Region:
         :exception: Returns None if an error occurs.
         """
         try:
-            print(f"Downloading OpenStreetMap data for {self.area}...")
-            graph = ox.graph_from_place(self.area, network_type=self.network_type)
-            print("Download complete.")
+            graph = self.download_graph()
             _, edges_df = ox.graph_to_gdfs(graph)
             return edges_df, graph
         except Exception as error:
             print(f"Error downloading OpenStreetMap data: {error}")
             return None
+
+    def download_graph(self):
+        """
+        Downloads the OSM network graph, or loads it from the cache if one is set.
+        :return networkx.MultiDiGraph: OSM network graph
+        """
+        if self.cache is not None:
+            print(f"Loading OpenStreetMap data for {self.area} (cache: {self.cache.directory})...")
+            cached = self.cache.contains("graph", region=self.area, network_type=self.network_type)
+            graph = self.cache.graph_from_place(self.area, self.network_type)
+            print("Loaded from the cache." if cached else "Download complete.")
+        else:
+            print(f"Downloading OpenStreetMap data for {self.area}...")
+            graph = ox.graph_from_place(self.area, network_type=self.network_type)
+            print("Download complete.")
+        return graph
+
+    def load_compact_graph(self, graph_file):
+        """
+        Loads the network as a memory-mapped CompactGraph. If the graph file does not
+        exist yet, the OSM data is downloaded and saved as graph file first.
+        :param graph_file: folder of the compact graph
+        :return CompactGraph or None: compact network graph
+        :exception: Returns None if an error occurs.
+        """
+        try:
+            if not CompactGraph.exists(graph_file):
+                CompactGraph.from_graph(self.download_graph()).save(graph_file)
+                print(f"Compact graph saved in {graph_file}.")
+            return CompactGraph.load(graph_file)
+        except Exception as error:
+            print(f"Error loading the compact graph: {error}")
+            return None
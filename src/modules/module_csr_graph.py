@@ -0,0 +1,307 @@
+"""
+Module to compile an osmnx graph into flat CSR (compressed sparse row) arrays.
+"""
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components
+
+
+def _node_array(node_list):
+    """
+    Converts a list of node ids into a one-dimensional NumPy array.
+    :param node_list: node ids in graph order
+    :return np.ndarray: integer array for osm ids, object array otherwise
+    """
+    nodes = np.array(node_list)
+    if nodes.ndim != 1 or nodes.dtype.kind not in "iu":
+        nodes = np.empty(len(node_list), dtype=object)
+        nodes[:] = node_list
+    return nodes
+
+
+class CsrGraph:
+    """
+    Directed multigraph stored as CSR arrays. Edges are sorted by their tail node and
+    the position of an edge in these arrays is used as its edge id.
+    """
+    def __init__(
+        self, nodes, offsets, targets, keys, weights, node_x=None, node_y=None, edge_ranks=None,
+    ):
+        """
+        Initializes a CsrGraph from already compiled arrays.
+        :param nodes: node ids, the position in the array is the node index
+        :param offsets: array of length n + 1 with the first edge id of every node
+        :param targets: node index of the head of every edge
+        :param keys: multigraph key of every edge
+        :param weights: weight of every edge
+        :param node_x: x coordinate of every node. Default None
+        :param node_y: y coordinate of every node. Default None
+        :param edge_ranks: position of every edge in the edge order of the original graph,
+        which networkx follows when it visits the neighbours of a node. Default None uses
+        the order of the heads
+        """
+        self.nodes = nodes
+        self.node_x = node_x
+        self.node_y = node_y
+        self.offsets = offsets
+        self.targets = targets
+        self.keys = keys
+        self.weights = weights
+        self.edge_ranks = edge_ranks
+        self.sources = np.repeat(
+            np.arange(len(nodes), dtype=np.int64), np.diff(offsets)
+        )
+        self._node_index = None
+        self._collapsed = None
+        self._component_labels = {}
+
+    @classmethod
+    def from_graph(cls, graph, weight):
+        """
+        Compiles a NetworkX MultiDiGraph (e.g. from osmnx) into CSR arrays.
+        :param graph: Networkx graph object
+        :param weight: edge attribute used as weight, missing values default to 1
+        :return CsrGraph: compiled graph
+        """
+        node_list = list(graph.nodes)
+        index = {node: i for i, node in enumerate(node_list)}
+        number_of_edges = graph.number_of_edges()
+
+        tails = np.empty(number_of_edges, dtype=np.int64)
+        heads = np.empty(number_of_edges, dtype=np.int64)
+        keys = np.empty(number_of_edges, dtype=object)
+        weights = np.empty(number_of_edges, dtype=np.float64)
+        edges = graph.edges(keys=True, data=weight, default=1)
+        for i, (u, v, key, value) in enumerate(edges):
+            tails[i] = index[u]
+            heads[i] = index[v]
+            keys[i] = key
+            weights[i] = value
+
+        order = np.lexsort((heads, tails))
+        counts = np.bincount(tails, minlength=len(node_list))
+        offsets = np.zeros(len(node_list) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+
+        keys = keys[order]
+        if number_of_edges and all(isinstance(key, (int, np.integer)) for key in keys):
+            keys = keys.astype(np.int64)
+
+        node_x = node_y = None
+        if node_list and all("x" in data and "y" in data for _, data in graph.nodes(data=True)):
+            node_x = np.array([data["x"] for _, data in graph.nodes(data=True)], dtype=float)
+            node_y = np.array([data["y"] for _, data in graph.nodes(data=True)], dtype=float)
+
+        return cls(
+            _node_array(node_list), offsets, heads[order], keys, weights[order],
+            node_x=node_x, node_y=node_y, edge_ranks=order,
+        )
+
+    @property
+    def number_of_nodes(self):
+        """
+        :return int: number of nodes
+        """
+        return len(self.nodes)
+
+    @property
+    def number_of_edges(self):
+        """
+        :return int: number of edges
+        """
+        return len(self.targets)
+
+    def reweighted(self, weights):
+        """
+        Creates a graph sharing the topology arrays of this graph but using other weights.
+        :param weights: array with one weight per edge id
+        :return CsrGraph: graph with the new weights
+        """
+        weights = np.asarray(weights, dtype=np.float64)
+        if weights.shape != self.targets.shape:
+            raise ValueError("Expected one weight per edge.")
+        graph = CsrGraph(
+            self.nodes, self.offsets, self.targets, self.keys, weights,
+            node_x=self.node_x, node_y=self.node_y, edge_ranks=self.edge_ranks,
+        )
+        graph._node_index = self._node_index
+        graph._component_labels = self._component_labels
+        return graph
+
+    def without_edges(self, edge_ids):
+        """
+        Creates a graph without some edges, sharing the nodes of this graph. The remaining
+        edges keep their order, so their edge ids shift down.
+        :param edge_ids: edge ids to remove
+        :return CsrGraph: graph without the edges
+        """
+        keep = np.ones(self.number_of_edges, dtype=bool)
+        keep[np.asarray(edge_ids, dtype=np.int64)] = False
+        offsets = np.zeros(self.number_of_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.sources[keep], minlength=self.number_of_nodes), out=offsets[1:])
+        graph = CsrGraph(
+            self.nodes, offsets, self.targets[keep], self.keys[keep], self.weights[keep],
+            node_x=self.node_x, node_y=self.node_y,
+            edge_ranks=None if self.edge_ranks is None else self.edge_ranks[keep],
+        )
+        graph._node_index = self._node_index
+        return graph
+
+    def node_index(self, node):
+        """
+        Returns the node index of a node id.
+        :param node: node id of the original graph
+        :return int: position of the node in the CSR arrays
+        """
+        if self._node_index is None:
+            self._node_index = {node_id: i for i, node_id in enumerate(self.nodes.tolist())}
+        return self._node_index[node]
+
+    def node_indices(self, nodes):
+        """
+        Returns the node indices of several node ids.
+        :param nodes: iterable of node ids of the original graph
+        :return np.ndarray: positions of the nodes in the CSR arrays
+        """
+        if self._node_index is None:
+            self.node_index(self.nodes[0])
+        return np.fromiter((self._node_index[node] for node in nodes), dtype=np.int64)
+
+    def route_edges(self, route):
+        """
+        Maps a route given as node ids to edge ids. Between parallel edges the first one
+        with the lowest weight is chosen, like ox.utils_graph.route_to_gdf does.
+        :param route: list of node ids
+        :return np.ndarray: edge ids of the route
+        """
+        route = self.node_indices(route)
+        collapsed = self.collapsed()
+        return collapsed.route_edge[collapsed.pair_index(route[:-1], route[1:])]
+
+    def component_labels(self, connection="weak"):
+        """
+        Returns the connected component of every node, computed once per graph.
+        :param connection: "weak" or "strong". Default "weak"
+        :return np.ndarray: component label of every node index
+        """
+        if connection not in self._component_labels:
+            matrix = csr_matrix(
+                (np.ones(self.number_of_edges), self.targets, self.offsets),
+                shape=(self.number_of_nodes, self.number_of_nodes),
+            )
+            # Parallel edges are duplicate entries, which scipy's component search
+            # does not handle
+            matrix.sum_duplicates()
+            _, labels = connected_components(matrix, directed=True, connection=connection)
+            self._component_labels[connection] = labels
+        return self._component_labels[connection]
+
+    def edge_tuples(self):
+        """
+        Maps every edge id back to the edge of the original graph.
+        :return list: (u, v, key) tuples in edge id order
+        """
+        return list(zip(
+            self.nodes[self.sources].tolist(),
+            self.nodes[self.targets].tolist(),
+            self.keys.tolist(),
+        ))
+
+    def collapsed(self):
+        """
+        Returns the simple digraph in which parallel edges are collapsed to their minimum
+        weight, the view shortest path algorithms on multigraphs work with.
+        :return CollapsedGraph: cached collapsed graph
+        """
+        if self._collapsed is None:
+            self._collapsed = CollapsedGraph(self)
+        return self._collapsed
+
+
+class CollapsedGraph:
+    """
+    Simple directed graph of the (u, v) pairs of a CsrGraph, each carrying the minimum
+    weight of its parallel edges.
+    """
+    def __init__(self, csr_graph):
+        """
+        Collapses the parallel edges of a CsrGraph.
+        :param csr_graph: CsrGraph to collapse
+        """
+        sources = csr_graph.sources
+        targets = csr_graph.targets
+        weights = csr_graph.weights
+        number_of_nodes = csr_graph.number_of_nodes
+
+        first = np.ones(len(targets), dtype=bool)
+        first[1:] = (sources[1:] != sources[:-1]) | (targets[1:] != targets[:-1])
+        starts = np.flatnonzero(first)
+
+        self.number_of_nodes = number_of_nodes
+        self.tails = sources[first]
+        self.heads = targets[first]
+        if len(starts):
+            self.weights = np.minimum.reduceat(weights, starts)
+        else:
+            self.weights = np.empty(0, dtype=np.float64)
+        self.offsets = np.searchsorted(
+            self.tails, np.arange(number_of_nodes + 1)
+        ).astype(np.int64)
+
+        # Parallel edges of equal minimum weight share the score of their pair,
+        # exactly like networkx distributes betweenness on multigraphs.
+        self.edge_pair = np.cumsum(first) - 1
+        is_min = weights == self.weights[self.edge_pair]
+        ties = np.bincount(self.edge_pair, weights=is_min, minlength=len(starts))
+        self.edge_share = np.where(is_min, 1.0 / np.maximum(ties, 1)[self.edge_pair], 0.0)
+        min_edges = np.flatnonzero(is_min)
+        _, first_min = np.unique(self.edge_pair[min_edges], return_index=True)
+        self.route_edge = min_edges[first_min]
+        # Pairs are sorted by tail and head, so their combined keys are sorted as well
+        self.pair_keys = self.tails * number_of_nodes + self.heads
+        # Pairs of every tail in the order networkx visits the neighbours
+        if csr_graph.edge_ranks is None or not len(starts):
+            self.neighbour_order = np.arange(len(starts), dtype=np.int64)
+        else:
+            pair_ranks = np.minimum.reduceat(csr_graph.edge_ranks, starts)
+            self.neighbour_order = np.lexsort((pair_ranks, self.tails))
+
+        if (self.weights < 0).any():
+            raise ValueError("Negative edge weights are not supported.")
+        self.has_zero_weights = bool((self.weights == 0).any())
+        self.matrix = csr_matrix(
+            (self.weights, self.heads, self.offsets),
+            shape=(number_of_nodes, number_of_nodes),
+        )
+
+    @property
+    def number_of_pairs(self):
+        """
+        :return int: number of collapsed edges
+        """
+        return len(self.heads)
+
+    def pair_index(self, tails, heads):
+        """
+        Looks up the collapsed edges between several pairs of nodes.
+        :param tails: array of tail node indices
+        :param heads: array of head node indices
+        :return np.ndarray: index of the collapsed edge of every pair
+        :raises KeyError: If a pair of nodes is not connected by an edge
+        """
+        keys = np.asarray(tails) * self.number_of_nodes + np.asarray(heads)
+        positions = np.searchsorted(self.pair_keys, keys)
+        found = positions < len(self.pair_keys)
+        found[found] = self.pair_keys[positions[found]] == keys[found]
+        if not found.all():
+            raise KeyError("Route contains a pair of nodes without an edge.")
+        return positions
+
+    def to_edge_scores(self, pair_scores):
+        """
+        Distributes scores of collapsed pairs onto the edges of the multigraph.
+        :param pair_scores: array with one score per collapsed pair
+        :return np.ndarray: array with one score per edge id
+        """
+        return pair_scores[self.edge_pair] * self.edge_share
@@ -0,0 +1,226 @@
+"""
+Module to rank edges by the impact of their removal on the routes between origin
+destination pairs.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+from .module_brandes import DISTANCE_BATCH_SIZE, CHUNKS_PER_WORKER
+from .module_edge_output import coerce_list_columns, save_edges
+
+# Read-only scenario runner of a worker process, set once by the pool initializer
+_worker_criticality = None
+
+
+def random_od_pairs(number_of_nodes, number, seed=42):
+    """
+    Samples origin destination pairs of distinct nodes uniformly.
+    :param number_of_nodes: number of nodes of the graph
+    :param number: number of pairs
+    :param seed: seed of the sampling. Default 42
+    :return tuple: arrays of origin and destination node indices
+    """
+    if number_of_nodes < 2:
+        raise ValueError("Origin destination pairs require at least two nodes.")
+    rng = np.random.default_rng(seed)
+    origins = rng.integers(number_of_nodes, size=number)
+    # Shifting by 1 to n - 1 never hits the origin itself
+    destinations = (origins + rng.integers(1, number_of_nodes, size=number)) % number_of_nodes
+    return origins, destinations
+
+
+class EdgeCriticality:
+    """
+    Removal scenarios of single edges, evaluated on fixed origin destination pairs. All
+    scenarios share the collapsed graph; a scenario only replaces the weight of the
+    removed edge in a copy of the weight array. Only origins whose shortest path tree
+    uses the removed edge are routed again.
+    """
+    def __init__(self, csr_graph, origins, destinations, edge_ids):
+        """
+        Initializes the scenarios and routes all pairs once on the unchanged graph.
+        :param csr_graph: CsrGraph with the routing weight
+        :param origins: array of origin node indices
+        :param destinations: array of destination node indices
+        :param edge_ids: edge ids of the edges removed in the scenarios
+        """
+        self.collapsed = csr_graph.collapsed()
+        self.edge_ids = np.asarray(edge_ids, dtype=np.int64)
+        self.sources, self.pair_rows = np.unique(
+            np.asarray(origins, dtype=np.int64), return_inverse=True
+        )
+        self.destinations = np.asarray(destinations, dtype=np.int64)
+
+        # Minimum weight of the collapsed edge once the scenario edge is removed
+        pairs = self.collapsed.edge_pair[self.edge_ids]
+        self.pairs = pairs
+        self.removed_weights = np.empty(len(self.edge_ids))
+        for i, (edge_id, pair) in enumerate(zip(self.edge_ids.tolist(), pairs.tolist())):
+            parallel = np.flatnonzero(self.collapsed.edge_pair == pair)
+            remaining = csr_graph.weights[parallel[parallel != edge_id]]
+            self.removed_weights[i] = remaining.min() if len(remaining) else np.inf
+
+        tails = self.collapsed.tails[pairs]
+        heads = self.collapsed.heads[pairs]
+        self.tail_distances = np.empty((len(self.sources), len(pairs)))
+        self.head_distances = np.empty((len(self.sources), len(pairs)))
+        self.pair_distances = np.empty(len(self.destinations))
+        all_rows = np.arange(len(self.sources))
+        for rows, distances in self._distances(self.collapsed.matrix, all_rows):
+            self.tail_distances[rows] = distances[:, tails]
+            self.head_distances[rows] = distances[:, heads]
+            selected = np.isin(self.pair_rows, rows)
+            self.pair_distances[selected] = distances[
+                self.pair_rows[selected] - rows[0], self.destinations[selected]
+            ]
+        reachable = np.isfinite(self.pair_distances)
+        self.total_cost = float(self.pair_distances[reachable].sum())
+        self.reachable_pairs = int(reachable.sum())
+
+    def _distances(self, matrix, rows):
+        """
+        Yields shortest path distances from the sources of some rows, in batches.
+        :param matrix: weight matrix of the collapsed graph
+        :param rows: sorted indices into 'sources'
+        :return generator: (rows of the batch, distances of the batch) tuples
+        """
+        batch = max(1, DISTANCE_BATCH_SIZE // max(self.collapsed.number_of_nodes, 1))
+        for start in range(0, len(rows), batch):
+            chunk = rows[start:start + batch]
+            distances = dijkstra(matrix, directed=True, indices=self.sources[chunk])
+            yield chunk, np.atleast_2d(distances)
+
+    def impacts(self, scenarios):
+        """
+        Evaluates removal scenarios.
+        :param scenarios: indices into 'edge_ids' of the evaluated scenarios
+        :return np.ndarray: array of shape (len(scenarios), 3) with the added cost of the
+        pairs that stay connected, the number of pairs that become unreachable and the
+        number of origins routed again
+        """
+        collapsed = self.collapsed
+        result = np.zeros((len(scenarios), 3))
+        for i, scenario in enumerate(scenarios):
+            pair = self.pairs[scenario]
+            if self.removed_weights[scenario] == collapsed.weights[pair]:
+                # A parallel edge of the same weight takes over
+                continue
+            tail_distances = self.tail_distances[:, scenario]
+            affected = np.flatnonzero(
+                np.isfinite(tail_distances)
+                & (tail_distances + collapsed.weights[pair] == self.head_distances[:, scenario])
+            )
+            if len(affected) == 0:
+                continue
+            weights = collapsed.weights.copy()
+            weights[pair] = self.removed_weights[scenario]
+            matrix = csr_matrix(
+                (weights, collapsed.heads, collapsed.offsets),
+                shape=(collapsed.number_of_nodes, collapsed.number_of_nodes),
+            )
+            added_cost = 0.0
+            unreachable = 0
+            for rows, distances in self._distances(matrix, affected):
+                selected = np.flatnonzero(np.isin(self.pair_rows, rows))
+                positions = np.searchsorted(rows, self.pair_rows[selected])
+                new = distances[positions, self.destinations[selected]]
+                old = self.pair_distances[selected]
+                connected = np.isfinite(old) & np.isfinite(new)
+                added_cost += float((new[connected] - old[connected]).sum())
+                unreachable += int((np.isfinite(old) & np.isinf(new)).sum())
+            result[i] = (added_cost, unreachable, len(affected))
+        return result
+
+    def run(self, workers=1):
+        """
+        Evaluates all removal scenarios, using a pool of worker processes. The scenario
+        runner is transferred once per worker.
+        :param workers: number of worker processes. Default 1
+        :return np.ndarray: impacts of every scenario, see 'impacts'
+        """
+        scenarios = np.arange(len(self.edge_ids))
+        number_of_chunks = min(len(scenarios), workers * CHUNKS_PER_WORKER)
+        if workers <= 1 or number_of_chunks <= 1:
+            return self.impacts(scenarios)
+        chunks = [scenarios[i::number_of_chunks] for i in range(number_of_chunks)]
+        result = np.zeros((len(scenarios), 3))
+        with ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_worker, initargs=(self,)
+        ) as pool:
+            for chunk, impacts in zip(chunks, pool.map(_worker_impacts, chunks)):
+                result[chunk] = impacts
+        return result
+
+
+def _init_worker(criticality):
+    """
+    Stores the shared scenario runner in a worker process.
+    :param criticality: EdgeCriticality
+    """
+    global _worker_criticality
+    _worker_criticality = criticality
+
+
+def _worker_impacts(scenarios):
+    """
+    Evaluates a chunk of scenarios inside a worker process.
+    :param scenarios: indices of the scenarios
+    :return np.ndarray: impacts of the scenarios
+    """
+    return _worker_criticality.impacts(scenarios)
+
+
+def edge_criticality(centrality_gdf, csr_graph, top_k, origins, destinations, workers=1):
+    """
+    Removes each of the top_k most central edges of a centrality result in turn and
+    measures the impact on the routes between the origin destination pairs.
+    :param centrality_gdf: GeoDataFrame with a 'centrality' column, indexed by u, v and key
+    :param csr_graph: CsrGraph with the routing weight of the centrality
+    :param top_k: number of most central edges to evaluate
+    :param origins: array of origin node indices
+    :param destinations: array of destination node indices
+    :param workers: number of worker processes. Default 1
+    :return GeoDataFrame: one row per removed edge, ranked by centrality, with the added
+    cost ('delta_cost', in units of the weight), the added cost relative to the total cost
+    of all connected pairs ('relative_delta_cost'), the number of pairs without a route
+    after the removal ('unreachable_pairs') and the number of origins routed again
+    """
+    top_edges = centrality_gdf.sort_values("centrality", ascending=False, kind="stable")
+    top_edges = top_edges.iloc[:top_k]
+    edge_ids = {edge: i for i, edge in enumerate(csr_graph.edge_tuples())}
+    criticality = EdgeCriticality(
+        csr_graph, origins, destinations, [edge_ids[edge] for edge in top_edges.index]
+    )
+    impacts = criticality.run(workers)
+    relative_delta_cost = np.zeros(len(top_edges))
+    if criticality.total_cost > 0:
+        relative_delta_cost = impacts[:, 0] / criticality.total_cost
+
+    result = pd.DataFrame(
+        {
+            "rank": np.arange(1, len(top_edges) + 1),
+            "centrality": top_edges["centrality"].to_numpy(),
+            "delta_cost": impacts[:, 0],
+            "relative_delta_cost": relative_delta_cost,
+            "unreachable_pairs": impacts[:, 1].astype(np.int64),
+            "recomputed_origins": impacts[:, 2].astype(np.int64),
+        },
+        index=top_edges.index,
+    )
+    columns = [column for column in ("osmid", "geometry") if column in top_edges.columns]
+    result = result.join(top_edges[columns])
+    return gpd.GeoDataFrame(result, geometry="geometry", crs=centrality_gdf.crs)
+
+
+def save_edge_criticality(criticality_gdf, output_file):
+    """
+    Writes the criticality of all scenarios into one file, a GeoPackage, GeoParquet or
+    Arrow file by its extension.
+    :param criticality_gdf: result of edge_criticality
+    :param output_file: path of the output file
+    """
+    save_edges(coerce_list_columns(criticality_gdf), output_file)
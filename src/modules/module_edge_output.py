@@ -0,0 +1,90 @@
+"""
+Module to write edge results into GeoPackage, GeoParquet or Arrow files.
+"""
+
+import os
+
+# Number of edges written to a GeoPackage per chunk
+GPKG_CHUNK_SIZE = 100000
+# Output formats by file extension
+OUTPUT_FORMATS = {
+    ".gpkg": "gpkg", ".parquet": "parquet", ".arrow": "arrow", ".feather": "arrow",
+}
+
+
+def coerce_list_columns(df):
+    """
+    Converts columns with list or tuple values (e.g. several osm ids of a simplified edge)
+    into string columns, which all output formats support. A compiled scan of pandas
+    infers the type of the values of every object column, and only columns of mixed types
+    are searched for lists. Columns with lists, such as ids and lists of ids, are converted
+    as a whole with Series.astype(str), since GeoPackage writers drop the values of a
+    column which do not match its inferred type; other columns, e.g. of integers and
+    floats, are kept. Missing values are kept. Lists are not kept for the columnar formats
+    either, because pyarrow can not store columns mixing lists and single values.
+    :param df: DataFrame, changed in place
+    :return DataFrame: the same DataFrame
+    """
+    # pandas is not loaded before the command-line arguments are checked
+    from pandas.api.types import infer_dtype
+
+    geometry = getattr(df, "_geometry_column_name", None)
+    for column in df.columns:
+        if column == geometry or df[column].dtype != object:
+            continue
+        if not infer_dtype(df[column], skipna=True).startswith("mixed"):
+            continue
+        if df[column].map(type).isin((list, tuple)).any():
+            df[column] = df[column].astype(str).where(df[column].notna(), None)
+    return df
+
+
+def output_format(output_file):
+    """
+    Returns the format of an output file from its extension.
+    :param output_file: path of the output file
+    :return str: "gpkg", "parquet" or "arrow"
+    :raises ValueError: If the extension is not supported
+    """
+    extension = os.path.splitext(output_file)[1].lower()
+    if extension not in OUTPUT_FORMATS:
+        raise ValueError(
+            f"Unsupported output file '{output_file}'. Use one of {tuple(OUTPUT_FORMATS)}."
+        )
+    return OUTPUT_FORMATS[extension]
+
+
+def write_gpkg(gdf, output_file, chunk_size=GPKG_CHUNK_SIZE):
+    """
+    Writes a GeoDataFrame into a GeoPackage in chunks of rows, appending to the layer
+    after the first chunk. The GeoDataFrame is held in memory as a whole; the chunks
+    only limit the size of the single writes.
+    :param gdf: GeoDataFrame without list columns
+    :param output_file: path of the GeoPackage, replaced if it exists
+    :param chunk_size: number of rows per chunk. Default GPKG_CHUNK_SIZE
+    """
+    if os.path.exists(output_file):
+        os.remove(output_file)
+    for start in range(0, max(len(gdf), 1), chunk_size):
+        gdf.iloc[start:start + chunk_size].to_file(
+            output_file, driver="GPKG", mode="w" if start == 0 else "a"
+        )
+
+
+def save_edges(gdf, output_file, chunk_size=GPKG_CHUNK_SIZE):
+    """
+    Writes edge results in the format of the file extension: a GeoPackage written in
+    chunks ('.gpkg'), GeoParquet ('.parquet') or Arrow IPC ('.arrow', '.feather').
+    GeoParquet and Arrow require the pyarrow package.
+    :param gdf: GeoDataFrame without list columns
+    :param output_file: path of the output file
+    :param chunk_size: number of rows per GeoPackage chunk. Default GPKG_CHUNK_SIZE
+    :raises ValueError: If the extension is not supported
+    """
+    file_format = output_format(output_file)
+    if file_format == "parquet":
+        gdf.to_parquet(output_file)
+    elif file_format == "arrow":
+        gdf.to_feather(output_file)
+    else:
+        write_gpkg(gdf, output_file, chunk_size)
@@ -0,0 +1,223 @@
+"""
+Module to draw edge values on a map. The edges are drawn from coordinate arrays instead of
+one artist per geometry: as one LineCollection of polylines, or rasterized into a
+canvas where every pixel takes the maximum or the sum of the edges crossing it. The
+geometries are simplified to the pixel size of the shown extent first, so the drawing
+time depends on the image rather than on every vertex of the network.
+"""
+
+import numpy as np
+import shapely
+from .module_options import RENDERERS, DEFAULT_RENDERER, RASTER_AGGREGATIONS
+
+# Colour map of the edge values
+COLOR_MAP = "magma_r"
+# Number of edges rasterized at a time
+RASTER_CHUNK_SIZE = 100000
+
+
+def map_aspect(crs, bounds):
+    """
+    Returns the aspect of a map like GeoDataFrame.plot: unprojected coordinates are
+    stretched by 1 / cos(latitude) at the middle of the map.
+    :param crs: coordinate reference system of the coordinates, None for projected ones
+    :param bounds: (xmin, ymin, xmax, ymax) of the map
+    :return float: height of a y unit divided by the width of an x unit
+    """
+    if crs is not None and crs.is_geographic:
+        return 1 / np.cos(np.radians((bounds[1] + bounds[3]) / 2))
+    return 1.0
+
+
+def _simplified_coordinates(geometries, tolerance):
+    """
+    Returns the vertices of the parts of line geometries, after removing the vertices
+    which move the lines by less than the tolerance.
+    :param geometries: array of LineString or MultiLineString geometries
+    :param tolerance: simplification tolerance in coordinate units, 0 keeps all vertices
+    :return tuple: array of vertices, the part of every vertex and the geometry of every part
+    """
+    parts, part_of = shapely.get_parts(np.asarray(geometries, dtype=object), return_index=True)
+    if tolerance > 0:
+        parts = shapely.simplify(parts, tolerance, preserve_topology=False)
+    coordinates, vertex_of = shapely.get_coordinates(parts, return_index=True)
+    return coordinates, vertex_of, part_of
+
+
+def edge_lines(geometries, tolerance=0.0):
+    """
+    Splits line geometries into simplified polylines, one per part of a geometry.
+    :param geometries: array of LineString or MultiLineString geometries
+    :param tolerance: simplification tolerance in coordinate units. Default 0 keeps all
+    vertices
+    :return tuple: list of vertex arrays and the position of the geometry of every line
+    """
+    coordinates, vertex_of, part_of = _simplified_coordinates(geometries, tolerance)
+    starts = np.flatnonzero(np.diff(vertex_of, prepend=-1))
+    if not len(starts):
+        return [], np.empty(0, dtype=np.int64)
+    return np.split(coordinates, starts[1:]), part_of[vertex_of[starts]]
+
+
+def edge_segments(geometries, tolerance=0.0):
+    """
+    Splits line geometries into simplified straight segments.
+    :param geometries: array of LineString or MultiLineString geometries
+    :param tolerance: simplification tolerance in coordinate units. Default 0 keeps all
+    vertices
+    :return tuple: array of segments of shape (n, 2, 2) and the position of the geometry
+    of every segment
+    """
+    coordinates, vertex_of, part_of = _simplified_coordinates(geometries, tolerance)
+    starts = np.flatnonzero(vertex_of[1:] == vertex_of[:-1])
+    segments = np.stack((coordinates[starts], coordinates[starts + 1]), axis=1)
+    return segments, part_of[vertex_of[starts]]
+
+
+def rasterize_edges(
+    geometries, values, bounds, width, height, aggregation="max",
+    chunk_size=RASTER_CHUNK_SIZE,
+):
+    """
+    Rasterizes edges into a canvas. Every segment is sampled at least once per pixel it
+    crosses, and every edge counts once per pixel.
+    :param geometries: array of line geometries of the edges
+    :param values: value of every edge
+    :param bounds: (xmin, ymin, xmax, ymax) covered by the canvas
+    :param width: number of pixel columns
+    :param height: number of pixel rows
+    :param aggregation: "max" or "sum" of the values of the edges crossing a pixel.
+    Default "max"
+    :param chunk_size: number of edges rasterized at a time. Default RASTER_CHUNK_SIZE
+    :return np.ndarray: canvas of shape (height, width) with the first row at ymax, NaN
+    where no edge crosses a pixel
+    :raises ValueError: If the aggregation is unknown
+    """
+    if aggregation not in RASTER_AGGREGATIONS:
+        raise ValueError(
+            f"Invalid aggregation '{aggregation}'. Use one of {RASTER_AGGREGATIONS}."
+        )
+    xmin, ymin, xmax, ymax = bounds
+    pixel = np.array([(xmax - xmin) / width, (ymax - ymin) / height])
+    number_of_pixels = width * height
+    canvas = np.full(number_of_pixels, np.nan if aggregation == "max" else 0.0)
+    covered = np.zeros(number_of_pixels, dtype=bool)
+    values = np.asarray(values, dtype=float)
+    for start in range(0, len(values), chunk_size):
+        segments, edge_of = edge_segments(
+            geometries[start:start + chunk_size], pixel.min() / 2
+        )
+        edge_of += start
+        # Vertices in pixel units, with rows counted downwards from ymax
+        ends = (segments - [xmin, ymax]) / (pixel * [1, -1])
+        steps = np.ceil(np.abs(ends[:, 1] - ends[:, 0]).max(axis=1)).astype(np.int64) + 1
+        segment_of = np.repeat(np.arange(len(segments)), steps)
+        first = np.repeat(np.cumsum(steps) - steps, steps)
+        fraction = (np.arange(len(segment_of)) - first) / np.maximum(steps - 1, 1)[segment_of]
+        points = ends[segment_of, 0] + fraction[:, None] * (
+            ends[segment_of, 1] - ends[segment_of, 0]
+        )
+        columns, rows = np.floor(points).astype(np.int64).T
+        inside = (columns >= 0) & (columns < width) & (rows >= 0) & (rows < height)
+        # Each edge counts once per pixel, however many of its samples fall into it
+        keys = np.unique(
+            edge_of[segment_of[inside]] * number_of_pixels
+            + rows[inside] * width + columns[inside]
+        )
+        pixels = keys % number_of_pixels
+        pixel_values = values[keys // number_of_pixels]
+        covered[pixels] = True
+        if aggregation == "max":
+            np.fmax.at(canvas, pixels, pixel_values)
+        else:
+            canvas += np.bincount(pixels, weights=pixel_values, minlength=number_of_pixels)
+    canvas[~covered] = np.nan
+    return canvas.reshape(height, width)
+
+
+def plot_edges(
+    edges_gdf, column="centrality", title=None, output_path=None,
+    renderer=DEFAULT_RENDERER, aggregation="max", bounds=None,
+):
+    """
+    Plots the values of edges on a map with a colour bar. The "lines" renderer draws the
+    edges in the order of their values, so the highest values are on top, "raster" draws
+    an image of the edges and "geopandas" uses GeoDataFrame.plot. A saved figure is closed.
+    :param edges_gdf: GeoDataFrame of the edges
+    :param column: column of the edge values. Default "centrality"
+    :param title: title of the map. Default None
+    :param output_path: path of the image file. Default None keeps the figure open
+    :param renderer: "geopandas", "lines" or "raster". Default "geopandas"
+    :param aggregation: "max" or "sum" of the edges crossing a pixel of the raster
+    renderer. Default "max"
+    :param bounds: (xmin, ymin, xmax, ymax) of the shown extent, the edges are simplified
+    to its pixel size. Default None shows all edges
+    :return matplotlib.axes.Axes: axes of the map
+    :raises ValueError: If the renderer or the aggregation is unknown
+    """
+    # matplotlib is only loaded for plots
+    import matplotlib.pyplot as plt
+    from matplotlib.collections import LineCollection
+
+    if renderer not in RENDERERS:
+        raise ValueError(f"Invalid renderer '{renderer}'. Use one of {RENDERERS}.")
+    if aggregation not in RASTER_AGGREGATIONS:
+        raise ValueError(
+            f"Invalid aggregation '{aggregation}'. Use one of {RASTER_AGGREGATIONS}."
+        )
+    # GeoDataFrame.plot fails without edges, they get the empty map of the other renderers
+    if renderer == "geopandas" and len(edges_gdf):
+        ax = edges_gdf.plot(column=column, cmap=COLOR_MAP, legend=True)
+    else:
+        values = edges_gdf[column].to_numpy(dtype=float)
+        geometries = edges_gdf.geometry.to_numpy()
+        if bounds is None:
+            bounds = edges_gdf.total_bounds
+        xmin, ymin, xmax, ymax = bounds
+        shown = np.isfinite(values) & ~shapely.is_empty(geometries)
+        if len(values):
+            edge_bounds = shapely.bounds(geometries)
+            shown &= (edge_bounds[:, 0] <= xmax) & (edge_bounds[:, 2] >= xmin)
+            shown &= (edge_bounds[:, 1] <= ymax) & (edge_bounds[:, 3] >= ymin)
+        values, geometries = values[shown], geometries[shown]
+        order = np.argsort(values, kind="stable")
+        values, geometries = values[order], geometries[order]
+
+        fig, ax = plt.subplots()
+        if len(values):
+            aspect = map_aspect(edges_gdf.crs, bounds)
+            ax.set_aspect(aspect)
+            # Size of the axes in pixels and of a pixel in coordinate units
+            axes_extent = ax.get_window_extent()
+            x_range = max(xmax - xmin, np.finfo(float).eps)
+            y_range = max(ymax - ymin, np.finfo(float).eps)
+            pixel_size = max(x_range / axes_extent.width, y_range * aspect / axes_extent.height)
+            if renderer == "lines":
+                # Pixels are smaller in y units if the map is stretched
+                lines, edge_of = edge_lines(geometries, pixel_size / 2 / aspect)
+                mappable = LineCollection(lines, array=values[edge_of], cmap=COLOR_MAP)
+                mappable.set_clim(values.min(), values.max())
+                ax.add_collection(mappable)
+                ax.set_xlim(xmin, xmin + x_range)
+                ax.set_ylim(ymin, ymin + y_range)
+            else:
+                extent = (xmin, xmin + x_range, ymin, ymin + y_range)
+                width = max(int(np.ceil(x_range / pixel_size)), 1)
+                height = max(int(np.ceil(y_range * aspect / pixel_size)), 1)
+                canvas = rasterize_edges(
+                    geometries, values, extent[::2] + extent[1::2], width, height, aggregation
+                )
+                mappable = ax.imshow(
+                    np.ma.masked_invalid(canvas), cmap=COLOR_MAP, extent=extent, aspect=aspect,
+                    interpolation="nearest",
+                )
+            fig.colorbar(mappable, ax=ax)
+    ax.set_xlabel("Longitude")
+    ax.set_ylabel("Latitude")
+    ax.yaxis.set_major_formatter("{:.2f}".format)
+    if title is not None:
+        ax.set_title(title)
+    if output_path:
+        ax.figure.savefig(output_path, bbox_inches="tight")
+        plt.close(ax.figure)
+    return ax
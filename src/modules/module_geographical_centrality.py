@@ -3,46 +3,215 @@ Module to calculate geographically adapted betweenness centrality
 """
 
 import os
+import json
+import tempfile
 import numpy as np
 import osmnx as ox
 import geopandas as gpd
 import pandas as pd
-from shapely.geometry import Point
-import matplotlib.pyplot as plt
+from .module_polygon_sampler import PolygonSampler
+from .module_population_sampler import PopulationSampler
+from .module_csr_graph import CsrGraph
+from .module_compact_graph import CompactGraph
+from .module_speed_profiles import SpeedEngine, DEFAULT_SPEED_PROFILE, write_travel_time
+from .module_node_locator import NodeLocator
+from .module_reachability import ReachabilityIndex
+from .module_route_trees import tree_route_loads
+from .module_random_routes import RandomRoutes, sample_od_pairs
+from .module_contraction_hierarchy import ContractionHierarchy, graph_fingerprint
+from .module_partitioned_graph import PartitionedGraph, partitioned_edge_loads
+from .module_edge_output import coerce_list_columns, save_edges
+from .module_edge_plot import plot_edges
+from .module_instrumentation import stage
+from .module_options import (
+    ROUTING_MODES, SAMPLING_STRATEGIES, DEFAULT_POPULATION_RASTER, DEFAULT_RENDERER,
+)
+
+
+def read_zone_demand(zones_file, demand_file, zone_id):
+    """
+    Reads zone polygons and a zone to zone demand matrix.
+    :param zones_file: file of the zone polygons, e.g. a GeoPackage
+    :param demand_file: CSV file of the demand matrix, with origin zones in the rows and
+    destination zones in the columns, the first column holding the origin zone ids
+    :param zone_id: column of the zone ids in the zones file
+    :return tuple: zones GeoDataFrame and demand DataFrame, both indexed by the zone ids
+    as strings
+    """
+    zones = gpd.read_file(zones_file).set_index(zone_id)
+    zones.index = zones.index.astype(str)
+    demand = pd.read_csv(demand_file, index_col=0)
+    demand.index = demand.index.astype(str)
+    demand.columns = demand.columns.astype(str)
+    return zones, demand
 
 
 class GeographicalCentrality:
     """
     Class to calculate geographically adapted betweenness centrality
     """
-    def __init__(self, study_area, weight, graph, edges_df, number_of_routes):
+    def __init__(
+        self, study_area, weight, graph, edges_df, number_of_routes,
+        largest_component_only=False, routing="shortest_path", destinations_per_origin=1,
+        speed_profile=DEFAULT_SPEED_PROFILE, sampling="uniform",
+        population_raster=DEFAULT_POPULATION_RASTER, seed=None, workers=1, adaptive=False,
+        tolerance=0.01, time_budget=None, max_routes=None, top_n=100, tile_size=None,
+    ):
         """
         Initialize GeographicalCentrality instance.
         :param study_area: representing the study area
         :param weight: The weight used in routing calculations
-        :param graph: The road network graph
-        :param edges_df: DataFrame containing edge information
+        :param graph: The road network graph, a Networkx graph or a CompactGraph ("tree"
+        and "ch" routing only)
+        :param edges_df: DataFrame containing edge information, None to build it from the graph
         :param number_of_routes: The number of random routes to generate
+        :param largest_component_only: snap route ends only to nodes of the largest
+        strongly connected component. Default False
+        :param routing: "shortest_path" solves every route with ox.shortest_path, "tree"
+        solves all routes of an origin with one shortest path tree, "ch" solves every route
+        with a contraction hierarchy of the graph. Default "shortest_path"
+        :param destinations_per_origin: number of destinations sampled per origin. Default 1
+        :param speed_profile: name of the speed profile of the "travel_time" weight.
+        Default "free_flow"
+        :param sampling: "uniform" samples route ends uniformly in the study area,
+        "population" weights them by the population raster. Default "uniform"
+        :param population_raster: path of the population raster. Default the GHS_POP raster
+        of the data folder
+        :param seed: seed of the random routes, the same seed gives the same routes for any
+        number of workers. Default None draws the seed from the global NumPy random state
+        :param workers: number of processes generating the random routes. Default 1
+        :param adaptive: add batches of number_of_routes random routes until the edge loads
+        are stable, the time budget is used up or max_routes is reached. Default False
+        :param tolerance: accepted change of the rank correlation of the edge loads and of
+        the top_n edges per batch in adaptive mode. Default 0.01
+        :param time_budget: maximum routing time in seconds in adaptive mode. Default None
+        :param max_routes: maximum number of routes in adaptive mode. Default None
+        :param top_n: number of most used edges compared between batches. Default 100
+        :param tile_size: route tile by tile on a partition of the graph into square tiles
+        of this side length in the units of the node coordinates (degrees for unprojected
+        graphs), for graphs too large for the memory. Requires a CompactGraph loaded from
+        a folder. Default None routes on the whole graph
         """
+        if routing not in ROUTING_MODES:
+            raise ValueError(f"Invalid routing '{routing}'. Use one of {ROUTING_MODES}.")
+        if sampling not in SAMPLING_STRATEGIES:
+            raise ValueError(
+                f"Invalid sampling '{sampling}'. Use one of {SAMPLING_STRATEGIES}."
+            )
+        if destinations_per_origin < 1:
+            raise ValueError("The number of destinations per origin must be at least 1.")
+        if workers < 1:
+            raise ValueError("The number of workers must be at least 1.")
+        if not 0 <= tolerance < 1:
+            raise ValueError("The tolerance must be at least 0 and below 1.")
+        if tile_size is not None and not tile_size > 0:
+            raise ValueError("The tile size must be positive.")
         self.study_area = study_area
         self.weight = weight
         self.graph = graph
         self.edges_df = edges_df
         self.number_of_routes = number_of_routes
+        self.largest_component_only = largest_component_only
+        self.routing = routing
+        self.destinations_per_origin = destinations_per_origin
+        self.speed_profile = SpeedEngine.get_profile(speed_profile).name
+        self.sampling = sampling
+        self.population_raster = population_raster
+        self.seed = seed
+        self.workers = workers
+        self.adaptive = adaptive
+        self.tolerance = tolerance
+        self.time_budget = time_budget
+        self.max_routes = max_routes
+        self.top_n = top_n
+        self.tile_size = tile_size
+        self.convergence = None
         self.poly_study_area = None
+        self.polygon_sampler = None
+        self.population_sampler = None
+        self.population_polygon = None
+        self.graph_cache = {}
         self.routes_gdf = None
+        self.edge_loads = None
+        self.unassigned_demand = None
         self.graph_with_travel_time = None
         self.centrality_geographical_gdf = None
 
     def create_study_area_polygon(self):
         """
-        Create a study area polygon based on the specified location.
+        Create a study area polygon based on the specified location. The polygon is taken
+        from the cache of the study area if it has one.
         :return GeoDataFrame: representation of the polygon.
         """
         location_string = self.study_area.area
-        self.poly_study_area = ox.geocode_to_gdf(location_string)
+        if getattr(self.study_area, "cache", None) is not None:
+            self.poly_study_area = self.study_area.cache.geocode_to_gdf(location_string)
+        else:
+            self.poly_study_area = ox.geocode_to_gdf(location_string)
         return self.poly_study_area
 
+    def get_polygon_sampler(self):
+        """
+        Returns the point sampler of the study area polygon, which is built once per polygon.
+        :return PolygonSampler: sampler for the current study area polygon
+        Note: The study area polygon must be set using the 'create_study_area_polygon' method
+        before calling this function.
+        """
+        polygon = self.poly_study_area.geometry.values[0]
+        if self.polygon_sampler is None or self.polygon_sampler.polygon is not polygon:
+            self.polygon_sampler = PolygonSampler(polygon)
+        return self.polygon_sampler
+
+    def get_population_sampler(self):
+        """
+        Returns the population weighted point sampler of the study area polygon. Only the
+        raster window of the polygon is read, and the prepared sampler is stored in the
+        cache of the study area if it has one.
+        :return PopulationSampler: sampler for the current study area polygon
+        Note: The study area polygon must be set using the 'create_study_area_polygon' method
+        before calling this function.
+        """
+        polygon = self.poly_study_area.geometry.values[0]
+        if self.population_sampler is None or self.population_polygon is not polygon:
+            crs = self.poly_study_area.crs or "EPSG:4326"
+            cache = getattr(self.study_area, "cache", None)
+            if cache is None:
+                sampler = PopulationSampler.from_raster(self.population_raster, polygon, crs)
+            else:
+                raster = os.path.abspath(self.population_raster)
+                sampler = cache.get_or_create(
+                    "population",
+                    lambda: PopulationSampler.from_raster(raster, polygon, crs),
+                    region=self.study_area.area, raster=raster,
+                    raster_mtime=os.path.getmtime(raster),
+                )
+            self.population_sampler = sampler
+            self.population_polygon = polygon
+        return self.population_sampler
+
+    def get_point_sampler(self):
+        """
+        Returns the point sampler of the sampling strategy.
+        :return PolygonSampler or PopulationSampler: sampler for the current study area
+        Note: The study area polygon must be set using the 'create_study_area_polygon' method
+        before calling this function.
+        """
+        if self.sampling == "population":
+            return self.get_population_sampler()
+        return self.get_polygon_sampler()
+
+    def random_coordinates_in_polygon(self, number, rng=np.random):
+        """
+        Generate random coordinates within the study area polygon, distributed according
+        to the sampling strategy.
+        :param number: The number of random points to generate
+        :param rng: numpy random Generator or the np.random module. Default np.random
+        :returns tuple: arrays of x and y coordinates
+        Note: The study area polygon must be set using the 'create_study_area_polygon' method
+        before calling this function.
+        """
+        return self.get_point_sampler().sample(number, rng)
+
     def random_points_in_polygon(self, number):
         """
         Generate random points within the study area polygon.
@@ -51,148 +220,485 @@ class GeographicalCentrality:
         Note: The study area polygon must be set using the 'create_study_area_polygon' method
         before calling this function.
         """
-        polygon = self.poly_study_area.geometry.values[0]
-        minx, miny, maxx, maxy = polygon.bounds
-        x = np.random.uniform(minx, maxx, number)
-        y = np.random.uniform(miny, maxy, number)
-        points = [Point(xy) for xy in zip(x, y)]
-        gdf_points = gpd.GeoDataFrame(geometry=points, crs="EPSG:4326")
-        spatial_join = gpd.tools.sjoin(
-            gdf_points, self.poly_study_area, predicate="within", how="left"
+        x, y = self.random_coordinates_in_polygon(number)
+        pts_in_poly = gpd.GeoDataFrame(
+            geometry=gpd.points_from_xy(x, y), crs="EPSG:4326"
         )
-        pts_in_poly = gdf_points[spatial_join.index_right == 0.0]
-        while len(pts_in_poly) < number:
-            additional_points = number - len(pts_in_poly)
-            x_loop = np.random.uniform(minx, maxx, size=additional_points)
-            y_loop = np.random.uniform(miny, maxy, size=additional_points)
-            add_points = [Point(xy) for xy in zip(x_loop, y_loop)]
-            additional_gdf = gpd.GeoDataFrame(geometry=add_points, crs="EPSG:4326")
-            spatial_join_loop = gpd.tools.sjoin(
-                additional_gdf, self.poly_study_area, predicate="within", how="left"
-            )
-            pts_loop = additional_gdf[spatial_join_loop.index_right == 0.0]
-            pts_in_poly = pd.concat([pts_in_poly, pts_loop], ignore_index=True)
-        pts_in_poly["x"] = pts_in_poly["geometry"].x
-        pts_in_poly["y"] = pts_in_poly["geometry"].y
+        pts_in_poly["x"] = x
+        pts_in_poly["y"] = y
         return pts_in_poly
 
     def get_graph_travel_time(self):
         """
-        Calculate travel times on graph edges based on specified road speeds.
-        :returns graph_with_travel_time: Networkx graph with edge travel times.
+        Calculate travel times on graph edges for the speed profile. The travel times are
+        kept as arrays by the speed engine of the graph, the graph itself is not modified.
+        In partitioned mode they are only calculated when the partition is built.
+        :returns graph_with_travel_time: the graph, to be routed with the "travel_time" weight.
         Note: The graph must be set using the 'graph' attribute before calling this function.
         """
-        hwy_speeds = {
-            "motorway": 100,
-            "motorway_link": 60,
-            "motorroad": 90,
-            "trunk": 85,
-            "trunk_link": 60,
-            "primary": 65,
-            "primary_link": 50,
-            "secondary": 60,
-            "secondary_link": 50,
-            "tertiary": 50,
-            "tertiary_link": 40,
-            "unclassified": 30,
-            "residential": 30,
-            "living_street": 10,
-            "service": 20,
-            "road": 20,
-            "track": 15,
-        }
-        graph_with_speeds = ox.add_edge_speeds(self.graph, hwy_speeds)
-        if graph_with_speeds is None:
-            raise ValueError("Failed to add edge speeds to the graph.")
-        graph_travel_time = ox.add_edge_travel_times(graph_with_speeds)
-        self.graph_with_travel_time = graph_travel_time
+        if self.tile_size is None:
+            with stage("travel_time", profile=self.speed_profile):
+                self.get_speed_engine(self.graph).travel_time(self.speed_profile)
+        self.graph_with_travel_time = self.graph
         return self.graph_with_travel_time
 
+    def cached_for_graph(self, name, graph_version, build):
+        """
+        Returns a structure derived from a graph version, which is built only once per
+        graph version.
+        :param name: name of the structure
+        :param graph_version: The network graph version
+        :param build: function creating the structure from the graph version
+        :return: cached structure
+        """
+        key = (name, id(graph_version))
+        cached = self.graph_cache.get(key)
+        if cached is None or cached[0] is not graph_version:
+            cached = (graph_version, build(graph_version))
+            self.graph_cache[key] = cached
+        return cached[1]
+
+    def get_speed_engine(self, graph_version):
+        """
+        Returns the speed engine of a graph version, which is created once per graph version.
+        :param graph_version: The network graph version
+        :return SpeedEngine: travel times of the speed profiles
+        """
+        return self.cached_for_graph(
+            "speed_engine", graph_version,
+            lambda graph: (
+                SpeedEngine.from_compact_graph(graph) if isinstance(graph, CompactGraph)
+                else SpeedEngine.from_graph(graph)
+            ),
+        )
+
+    def get_csr_graph(self, graph_version):
+        """
+        Returns the graph version compiled to CSR arrays with the routing weight. The
+        "travel_time" weight uses the travel times of the speed profile.
+        :param graph_version: The network graph version
+        :return CsrGraph: compiled graph
+        """
+        if self.weight == "travel_time":
+            return self.get_speed_engine(graph_version).csr_graph_for(self.speed_profile)
+        if isinstance(graph_version, CompactGraph):
+            return graph_version.csr_graph(self.weight)
+        return self.cached_for_graph(
+            f"csr_{self.weight}", graph_version,
+            lambda graph: CsrGraph.from_graph(graph, self.weight),
+        )
+
+    def get_reachability_index(self, graph_version):
+        """
+        Returns the strongly connected component index of a graph version.
+        :param graph_version: The network graph version
+        :return ReachabilityIndex: reachability index
+        """
+        csr_graph = self.get_csr_graph(graph_version)
+        return self.cached_for_graph(
+            "reachability", graph_version, lambda graph: ReachabilityIndex(csr_graph)
+        )
+
+    def get_node_locator(self, graph_version):
+        """
+        Returns the nearest node search structure of a graph version.
+        :param graph_version: The network graph version
+        :return NodeLocator: k-d tree on the node coordinates, restricted to the largest
+        strongly connected component if 'largest_component_only' is set
+        """
+        csr_graph = self.get_csr_graph(graph_version)
+        node_indices = None
+        if self.largest_component_only:
+            node_indices = self.get_reachability_index(graph_version).largest_component_nodes()
+        return self.cached_for_graph(
+            f"node_locator_{self.largest_component_only}", graph_version,
+            lambda graph: NodeLocator(
+                csr_graph.node_x, csr_graph.node_y,
+                projected=(
+                    graph.is_projected() if isinstance(graph, CompactGraph)
+                    else ox.projection.is_projected(graph.graph["crs"])
+                ),
+                node_indices=node_indices,
+            ),
+        )
+
+    def get_contraction_hierarchy(self, graph_version):
+        """
+        Returns the contraction hierarchy of a graph version and the routing weight. It is
+        saved next to the graph: in the folder of a loaded CompactGraph, otherwise in the
+        cache of the study area if it has one, and built again only if the graph or its
+        weights changed.
+        :param graph_version: The network graph version
+        :return ContractionHierarchy: contraction hierarchy of the CSR graph
+        """
+        csr_graph = self.get_csr_graph(graph_version)
+        name = self.weight
+        if self.weight == "travel_time":
+            name = f"travel_time_{self.speed_profile}"
+
+        def build(graph):
+            directory = getattr(graph, "directory", None)
+            cache = getattr(self.study_area, "cache", None)
+            with stage("contraction_hierarchy", weight=name) as counts:
+                if isinstance(graph, CompactGraph) and directory is not None:
+                    hierarchy, loaded = ContractionHierarchy.load_or_build(
+                        os.path.join(directory, "contraction_hierarchy", name), csr_graph
+                    )
+                elif cache is not None:
+                    params = {
+                        "region": self.study_area.area, "weight": name,
+                        "graph": graph_fingerprint(csr_graph.collapsed()),
+                    }
+                    loaded = os.path.exists(cache.path("contraction_hierarchy", **params))
+                    if loaded or not cache.offline:
+                        hierarchy = cache.get_or_create(
+                            "contraction_hierarchy",
+                            lambda: ContractionHierarchy.build(csr_graph), **params,
+                        )
+                    else:
+                        # Derived data is built offline as well, it is just not stored
+                        hierarchy = ContractionHierarchy.build(csr_graph)
+                else:
+                    hierarchy, loaded = ContractionHierarchy.build(csr_graph), False
+                counts.update(loaded=loaded, shortcuts=hierarchy.number_of_shortcuts)
+            return hierarchy
+
+        return self.cached_for_graph(f"contraction_hierarchy_{name}", graph_version, build)
+
+    def get_partitioned_graph(self, graph_version):
+        """
+        Returns the partition of a compact graph into tiles of 'tile_size' for the routing
+        weight. It is saved in the folder of the compact graph and built on first use.
+        :param graph_version: The network graph version, a CompactGraph loaded from a folder
+        :return PartitionedGraph: partition of the graph
+        :raises ValueError: If the graph is not a CompactGraph loaded from a folder
+        """
+        if getattr(graph_version, "directory", None) is None:
+            raise ValueError("Partitioned routing requires a compact graph loaded from a folder.")
+        name = self.weight
+        if self.weight == "travel_time":
+            name = f"travel_time_{self.speed_profile}"
+
+        def build(graph):
+            directory = os.path.join(graph.directory, "partition")
+            os.makedirs(directory, exist_ok=True)
+            with tempfile.TemporaryDirectory(dir=directory) as temporary_directory:
+                # Travel times are written in chunks to a file, as the graph may not fit
+                # into the memory
+                weights = graph.length
+                if self.weight == "travel_time":
+                    weights = write_travel_time(
+                        graph, os.path.join(temporary_directory, f"{name}.npy"),
+                        self.speed_profile,
+                    )
+                with stage("partition", weight=name, tile_size=self.tile_size) as counts:
+                    partition, loaded = PartitionedGraph.load_or_build(
+                        os.path.join(directory, f"{name}_{self.tile_size:g}"),
+                        graph, weights, self.tile_size,
+                    )
+                    counts.update(
+                        loaded=loaded, tiles=partition.number_of_tiles,
+                        boundary_nodes=len(partition.overlay_nodes),
+                    )
+            return partition
+
+        return self.cached_for_graph(f"partition_{name}", graph_version, build)
+
+    def generate_partitioned_routes(self, graph_version):
+        """
+        Generate random routes tile by tile on the partition of the graph, so only the
+        overlay graph and one tile at a time are held in memory. The edge loads are kept in
+        a temporary file.
+        :param graph_version: The network graph version, a CompactGraph loaded from a folder
+        :returns routes_gdf: GeoDataFrame of the edges used by the routes, with the number
+        of routes using them in the 'count' column.
+        Note: The study area polygon and the number of routes must be set before calling
+        this function.
+        """
+        partition = self.get_partitioned_graph(graph_version)
+        seed = self.seed
+        if seed is None:
+            seed = int(np.random.randint(2 ** 63 - 1, dtype=np.int64))
+        with stage("routing", routing="partitioned") as counts:
+            self.edge_loads, rounds, rejected = partitioned_edge_loads(
+                partition, self.get_point_sampler(), self.number_of_routes,
+                self.destinations_per_origin, seed,
+            )
+            counts.update(
+                routes=self.number_of_routes, sampling_rounds=rounds, rejected_pairs=rejected,
+            )
+
+        with stage("edge_loads_to_gdf", edges=int(np.count_nonzero(self.edge_loads))):
+            self.routes_gdf = self.edge_loads_to_gdf(graph_version)
+        return self.routes_gdf
+
+    def sample_od_nodes(self, graph_version, number, rng=np.random):
+        """
+        Sample origin and destination nodes for random routes in one batch. All points are
+        sampled and snapped to their nearest nodes at once; pairs with identical nodes or
+        without a route (checked on the strongly connected components) are rejected and
+        resampled. Every origin is paired with 'destinations_per_origin' destinations.
+        :param graph_version: The network graph version
+        :param number: The number of origin destination pairs
+        :param rng: numpy random Generator or the np.random module. Default np.random
+        :returns tuple: arrays of origin and destination node indices of the CSR graph
+        Note: The study area polygon must be set before calling this function.
+        """
+        with stage("od_sampling", pairs=number) as counts:
+            origins, destinations, rounds, rejected = sample_od_pairs(
+                self.get_point_sampler(), self.get_node_locator(graph_version),
+                self.get_reachability_index(graph_version), number,
+                self.destinations_per_origin, rng,
+            )
+            counts.update(rounds=rounds, rejected_pairs=rejected)
+        return origins, destinations
+
     def generate_random_routes(self, graph_version):
         """
-        Generate random routes on the specified graph.
+        Generate random routes on the specified graph and count how often every edge is used.
+        Origin destination pairs are sampled in batches and only pairs connected by a route
+        are kept. The counts are accumulated in 'edge_loads', one integer per edge id of the
+        CSR graph, so memory does not grow with the number of routes. In "tree" routing the
+        routes of all pairs sharing an origin are taken from one shortest path tree, in "ch"
+        routing every route is a query of the contraction hierarchy of the graph. The
+        routes are generated in blocks with random streams derived from 'seed', on 'workers'
+        processes sharing the graph. In adaptive mode batches of 'number_of_routes' routes
+        are added until the loads are stable, and 'convergence' describes the result.
         :param graph_version: The network graph version
-        :returns routes_gdf: GeoDataFrame containing random routes.
+        :returns routes_gdf: GeoDataFrame of the edges used by the routes, with the number
+        of routes using them in the 'count' column.
         Note: The study area polygon, graph, and the number of routes must be set before calling this function.
         """
-        all_sample_points = []
-        count = 0
+        if self.tile_size is not None:
+            return self.generate_partitioned_routes(graph_version)
+        if isinstance(graph_version, CompactGraph) and self.routing == "shortest_path":
+            raise ValueError("Routes on a compact graph require 'tree' or 'ch' routing.")
+        weight = self.weight
+        if weight == "travel_time" and self.routing == "shortest_path":
+            weight = self.get_speed_engine(graph_version).weight_function(self.speed_profile)
+        random_routes = RandomRoutes(
+            self.get_csr_graph(graph_version), self.get_point_sampler(),
+            self.get_node_locator(graph_version), self.get_reachability_index(graph_version),
+            per_origin=self.destinations_per_origin, routing=self.routing,
+            graph=graph_version if self.routing == "shortest_path" else None, weight=weight,
+            hierarchy=(
+                self.get_contraction_hierarchy(graph_version) if self.routing == "ch" else None
+            ),
+        )
 
-        while count < self.number_of_routes:
-            sample_points = self.random_points_in_polygon(2)
-            nodes = [
-                ox.nearest_nodes(graph_version, x, y)
-                for x, y in zip(sample_points["x"], sample_points["y"])
+        seed = self.seed
+        if seed is None:
+            seed = int(np.random.randint(2 ** 63 - 1, dtype=np.int64))
+        with stage("routing", routing=self.routing, workers=self.workers) as counts:
+            if self.adaptive:
+                self.edge_loads, self.convergence = random_routes.adaptive_edge_loads(
+                    self.number_of_routes, tolerance=self.tolerance,
+                    time_budget=self.time_budget, max_routes=self.max_routes,
+                    top_n=self.top_n, seed=seed, workers=self.workers,
+                )
+                counts.update(
+                    routes=self.convergence["routes"], batches=self.convergence["batches"],
+                    converged=self.convergence["converged"],
+                )
+                print(
+                    f"Generated {self.convergence['routes']} routes in "
+                    f"{self.convergence['batches']} batches, stopped by "
+                    f"{self.convergence['stop_reason']}."
+                )
+            else:
+                self.edge_loads, blocks, rounds, rejected = random_routes.edge_loads(
+                    self.number_of_routes, seed=seed, workers=self.workers
+                )
+                counts.update(
+                    routes=self.number_of_routes, blocks=blocks, sampling_rounds=rounds,
+                    rejected_pairs=rejected,
+                )
+
+        with stage("edge_loads_to_gdf", edges=int(np.count_nonzero(self.edge_loads))):
+            self.routes_gdf = self.edge_loads_to_gdf(graph_version)
+        return self.routes_gdf
+
+    def zone_nodes(self, graph_version, zones, points_per_zone=1):
+        """
+        Snap every zone to graph nodes in one batch, either its centroid or points sampled
+        uniformly in the zone.
+        :param graph_version: The network graph version
+        :param zones: GeoDataFrame of zone polygons
+        :param points_per_zone: 1 snaps the centroid, more samples this number of points.
+        Default 1
+        :returns np.ndarray: node indices of the CSR graph, of shape (zones, points_per_zone)
+        """
+        if points_per_zone < 1:
+            raise ValueError("The number of points per zone must be at least 1.")
+        if isinstance(graph_version, CompactGraph):
+            crs = graph_version.crs
+        else:
+            crs = graph_version.graph["crs"]
+        zones = zones.to_crs(crs)
+        if points_per_zone == 1:
+            if zones.crs.is_geographic:
+                # Centroids are computed in a local metric projection
+                centroids = zones.to_crs(zones.estimate_utm_crs()).centroid.to_crs(crs)
+            else:
+                centroids = zones.centroid
+            x, y = centroids.x.to_numpy(), centroids.y.to_numpy()
+        else:
+            points = [
+                PolygonSampler(polygon).sample(points_per_zone)
+                for polygon in zones.geometry.values
             ]
-            origin_node, destination_node = nodes
-            random_route = ox.shortest_path(
-                graph_version, origin_node, destination_node, weight=self.weight
-            )
+            x = np.concatenate([point_x for point_x, _ in points])
+            y = np.concatenate([point_y for _, point_y in points])
+        nodes = self.get_node_locator(graph_version).nearest(x, y)
+        return nodes.reshape(len(zones), points_per_zone)
 
-            while origin_node == destination_node or random_route is None:
-                sample_points = self.random_points_in_polygon(2)
-                nodes = [
-                    ox.nearest_nodes(graph_version, x, y)
-                    for x, y in zip(sample_points["x"], sample_points["y"])
-                ]
-                origin_node, destination_node = nodes
-                random_route = ox.shortest_path(
-                    graph_version, origin_node, destination_node, weight=self.weight
-                )
+    def generate_demand_loads(self, graph_version, zones, demand, points_per_zone=1):
+        """
+        Assign a zone to zone demand matrix to the graph and sum the demand routed over
+        every edge. The zones are snapped to nodes in one batch and one shortest path tree
+        is computed per origin node. With several points per zone, the demand of a pair of
+        zones is split evenly between all pairs of their points. Demand between points
+        snapped to the same node or without a route is not assigned and summed up in
+        'unassigned_demand'.
+        :param graph_version: The network graph version
+        :param zones: GeoDataFrame of zone polygons
+        :param demand: demand from the row zone to the column zone, a DataFrame indexed by
+        the zone index in both directions or an array in the order of 'zones'
+        :param points_per_zone: 1 snaps the zone centroids, more samples this number of
+        points per zone. Default 1
+        :returns routes_gdf: GeoDataFrame of the edges used by the demand, with the demand
+        routed over them in the 'count' column.
+        """
+        if isinstance(demand, pd.DataFrame):
+            known = demand.index.isin(zones.index).all() and demand.columns.isin(zones.index).all()
+            if not known:
+                raise ValueError("The demand matrix contains zones which are not in 'zones'.")
+            demand = demand.reindex(index=zones.index, columns=zones.index, fill_value=0)
+        demand = np.asarray(demand, dtype=np.float64)
+        if demand.shape != (len(zones), len(zones)):
+            raise ValueError("The demand matrix must have one row and column per zone.")
+        if (demand < 0).any():
+            raise ValueError("Negative demand is not supported.")
 
-            if random_route is None:
-                raise ValueError("Failed to generate a valid random route.")
-            one_route_gdf = ox.utils_graph.route_to_gdf(
-                graph_version, random_route, weight=self.weight
+        nodes = self.zone_nodes(graph_version, zones, points_per_zone)
+        origin_zones, destination_zones = np.nonzero(demand)
+        shape = (len(origin_zones), points_per_zone, points_per_zone)
+        origins = np.broadcast_to(nodes[origin_zones][:, :, None], shape).ravel()
+        destinations = np.broadcast_to(nodes[destination_zones][:, None, :], shape).ravel()
+        pair_demand = np.repeat(
+            demand[origin_zones, destination_zones] / points_per_zone ** 2,
+            points_per_zone ** 2,
+        )
+
+        csr_graph = self.get_csr_graph(graph_version)
+        with stage("demand_routing", zones=len(zones), pairs=len(origins)) as counts:
+            self.edge_loads, routed = tree_route_loads(
+                csr_graph, origins, destinations, demand=pair_demand
             )
-            all_sample_points.append(one_route_gdf)
-            count += 1
+            counts["unrouted_pairs"] = int((~routed).sum())
+        self.unassigned_demand = float(pair_demand[~routed].sum())
+        if self.unassigned_demand > 0:
+            print(f"Demand of {self.unassigned_demand:g} could not be assigned to a route.")
+        with stage("edge_loads_to_gdf", edges=int(np.count_nonzero(self.edge_loads))):
+            self.routes_gdf = self.edge_loads_to_gdf(graph_version)
+        return self.routes_gdf
 
-        routes_gdf = pd.concat(all_sample_points)
-        self.routes_gdf = routes_gdf
-        return routes_gdf
+    def edge_loads_to_gdf(self, graph_version):
+        """
+        Join the edge attributes and geometries to the edges with a load, once after all
+        routes are counted.
+        :param graph_version: The network graph version
+        :returns GeoDataFrame: edges with a load, indexed by u, v and key
+        Note: The 'edge_loads' must be set before calling this function.
+        """
+        if self.tile_size is not None:
+            # The edges are looked up by id, without compiling the whole graph
+            used = np.flatnonzero(self.edge_loads)
+            edges_df = graph_version.edges_gdf(used)
+            edges_df.insert(0, "count", np.asarray(self.edge_loads[used]))
+            return edges_df
+        csr_graph = self.get_csr_graph(graph_version)
+        used = np.flatnonzero(self.edge_loads)
+        index = pd.MultiIndex.from_arrays(
+            [
+                csr_graph.nodes[csr_graph.sources[used]],
+                csr_graph.nodes[csr_graph.targets[used]],
+                csr_graph.keys[used],
+            ],
+            names=["u", "v", "key"],
+        )
+        loads_df = pd.DataFrame({"count": self.edge_loads[used]}, index=index)
+        if self.edges_df is not None:
+            edges_df = self.edges_df
+        elif isinstance(graph_version, CompactGraph):
+            edges_df = graph_version.edges_gdf(used)
+        else:
+            edges_df = ox.graph_to_gdfs(graph_version, nodes=False)
+        return gpd.GeoDataFrame(loads_df.join(edges_df), crs=edges_df.crs)
 
     def analyze_centrality(self):
         """
         Analyze centrality of the edges using the generated routes.
-        Note: The 'routes_gdf' and 'edges_df' must be set before calling this function.
+        Note: The 'routes_gdf' must be set before calling this function.
         """
         if self.routes_gdf is not None:
-            centrality_geo = pd.DataFrame(
-                self.routes_gdf["osmid"].groupby(["u", "v", "key"]).count()
-            )
-            centrality_geo.columns = ["centrality"]
-            centrality_geo_join_edge_df = centrality_geo.join(
-                self.edges_df[["osmid", "geometry"]]
+            with stage("analyze_centrality", edges=len(self.routes_gdf)):
+                centrality_geo_join_edge_df = pd.DataFrame(
+                    self.routes_gdf[["count", "osmid", "geometry"]]
+                ).rename(columns={"count": "centrality"})
+                coerce_list_columns(centrality_geo_join_edge_df)
+                centrality_geo_gdf = gpd.GeoDataFrame(centrality_geo_join_edge_df, crs=4326)
+                self.centrality_geographical_gdf = centrality_geo_gdf
+
+    def plot_centrality(
+        self, output_folder=None, image_name=None, renderer=DEFAULT_RENDERER, aggregation="max",
+    ):
+        """
+        Plot the centrality on a map.
+        :param output_folder: Output folder path to save the image. Default None
+        :param image_name: Name of the output image file. Default None
+        :param renderer: "geopandas", "lines" or "raster", see 'plot_edges'. Default "geopandas"
+        :param aggregation: "max" or "sum" of the edges in a pixel of the raster renderer.
+        Default "max"
+        Note: The 'centrality_geographical_gdf' must be available before calling this function.
+        """
+        with stage("plot", edges=len(self.centrality_geographical_gdf)):
+            plot_edges(
+                self.centrality_geographical_gdf,
+                title=f"Geographical Centrality {self.weight} routes={self.number_of_routes}",
+                output_path=os.path.join(output_folder, image_name) if output_folder else None,
+                renderer=renderer, aggregation=aggregation,
             )
-            for col in centrality_geo_join_edge_df.columns:
-                if centrality_geo_join_edge_df[col].apply(type).eq(list).any():
-                    centrality_geo_join_edge_df[col] = centrality_geo_join_edge_df[
-                        col
-                    ].apply(lambda x: str(x) if isinstance(x, list) else x)
-            centrality_geo_gdf = gpd.GeoDataFrame(centrality_geo_join_edge_df, crs=4326)
-            self.centrality_geographical_gdf = centrality_geo_gdf
 
-    def save_data_in_file(self, output_folder=None, output_file=None, image_name=None):
+    def save_data_in_file(
+        self, output_folder=None, output_file=None, image_name=None, plot=True,
+        renderer=DEFAULT_RENDERER, aggregation="max",
+    ):
         """
         Save centrality data to files.
         :param output_folder: Output folder path to save the image
-        :param output_file: Output file path to save the GeoDataFrame
+        :param output_file: Output file path to save the GeoDataFrame, a GeoPackage,
+        GeoParquet or Arrow file by its extension
         :param image_name: Name of the output image file
+        :param plot: plot the centrality on a map. Default True
+        :param renderer: "geopandas", "lines" or "raster" map. Default "geopandas"
+        :param aggregation: "max" or "sum" of the edges in a pixel of the raster renderer.
+        Default "max"
         Note: The 'centrality_geographical_gdf' must be available before calling this function.
+        The convergence of adaptive route generation is written next to the output file, as
+        "<output file name>_convergence.json".
         """
-        plot = self.centrality_geographical_gdf.plot(
-            column="centrality", cmap="magma_r", legend=True
-        )
-        plot.set_xlabel("Longitude")
-        plot.set_ylabel("Latitude")
-        lat_formatter = "{:.2f}".format
-        plot.yaxis.set_major_formatter(lat_formatter)
-        plt.title(f"Geographical Centrality {self.weight} routes={self.number_of_routes}")
-        if output_folder:
-            output_image_path = os.path.join(output_folder, image_name)
-            plt.savefig(output_image_path, bbox_inches="tight")
+        if plot:
+            self.plot_centrality(
+                output_folder=output_folder, image_name=image_name, renderer=renderer,
+                aggregation=aggregation,
+            )
         if output_file:
-            self.centrality_geographical_gdf.to_file(output_file, driver="GPKG")
+            with stage("save_output", edges=len(self.centrality_geographical_gdf)):
+                save_edges(self.centrality_geographical_gdf, output_file)
+            if self.convergence is not None:
+                convergence_file = f"{os.path.splitext(output_file)[0]}_convergence.json"
+                with open(convergence_file, "w", encoding="utf-8") as file:
+                    json.dump(self.convergence, file, indent=2)
         else:
             print("Storage of data failed.")
@@ -0,0 +1,146 @@
+"""
+Module to record the wall time, CPU time, peak memory and item counts of the stages of a
+run. Recording is off by default; 'stage' then costs a single check.
+"""
+
+import os
+import sys
+import json
+import time
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timezone
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - not available on Windows
+    resource = None
+
+# File name of the report in the output folder
+REPORT_FILE = "run_report.json"
+
+# Profiler of the current run, None while recording is off
+_profiler = None
+
+
+def peak_rss_mb():
+    """
+    Returns the peak resident set size of the process so far.
+    :return float: peak memory in MiB, None if the platform does not provide it
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return peak / 1024 ** 2 if sys.platform == "darwin" else peak / 1024
+
+
+class RunProfiler:
+    """
+    Collects one record per stage of a run. Stages can be nested; a record is named by the
+    path of its enclosing stages, e.g. "geographical/routing".
+    """
+    def __init__(self, **metadata):
+        """
+        Initializes the profiler.
+        :param metadata: parameters of the run stored in the report
+        """
+        self.metadata = metadata
+        self.records = []
+        self.started = datetime.now(timezone.utc).isoformat()
+        self._start = time.perf_counter()
+        self._path = []
+
+    @contextmanager
+    def stage(self, name, **counts):
+        """
+        Records a stage. The yielded dictionary holds the item counts of the stage and can
+        be extended within the stage.
+        :param name: name of the stage
+        :param counts: item counts known before the stage, e.g. nodes=...
+        :return generator: context manager yielding the counts of the stage
+        """
+        self._path.append(name)
+        record = {"stage": "/".join(self._path), "counts": dict(counts)}
+        peak_before = peak_rss_mb()
+        times_before = os.times()
+        cpu_before = time.process_time()
+        wall_before = time.perf_counter()
+        try:
+            yield record["counts"]
+        finally:
+            times_after = os.times()
+            peak_after = peak_rss_mb()
+            record["wall_seconds"] = time.perf_counter() - wall_before
+            record["cpu_seconds"] = time.process_time() - cpu_before
+            # Worker processes are only accounted once they have been waited for
+            record["children_cpu_seconds"] = (
+                times_after.children_user + times_after.children_system
+                - times_before.children_user - times_before.children_system
+            )
+            record["peak_rss_mb"] = peak_after
+            record["peak_rss_increase_mb"] = (
+                None if peak_after is None else peak_after - peak_before
+            )
+            self.records.append(record)
+            self._path.pop()
+
+    def report(self):
+        """
+        Returns the report of all recorded stages, in the order they finished.
+        :return dict: metadata of the run and the stage records
+        """
+        return {
+            "started": self.started,
+            "wall_seconds": time.perf_counter() - self._start,
+            "peak_rss_mb": peak_rss_mb(),
+            "metadata": self.metadata,
+            "stages": self.records,
+        }
+
+    def write_report(self, output_folder, file_name=REPORT_FILE):
+        """
+        Writes the report as JSON file into the output folder.
+        :param output_folder: folder of the run
+        :param file_name: name of the report file. Default "run_report.json"
+        :return str: path of the report
+        """
+        path = os.path.join(output_folder, file_name)
+        with open(path, "w", encoding="utf-8") as report_file:
+            json.dump(self.report(), report_file, indent=2, default=str)
+        return path
+
+
+def enable_profiling(**metadata):
+    """
+    Starts recording the stages of a run.
+    :param metadata: parameters of the run stored in the report
+    :return RunProfiler: profiler of the run
+    """
+    global _profiler
+    _profiler = RunProfiler(**metadata)
+    return _profiler
+
+
+def disable_profiling():
+    """
+    Stops recording stages.
+    :return RunProfiler: profiler of the finished run, None if recording was off
+    """
+    global _profiler
+    profiler, _profiler = _profiler, None
+    return profiler
+
+
+def stage(name, **counts):
+    """
+    Records a stage if profiling is enabled, e.g.
+        with stage("routing", routes=number) as counts:
+            counts["retries"] = retries
+    :param name: name of the stage
+    :param counts: item counts known before the stage
+    :return: context manager yielding the counts of the stage, which are discarded if
+    profiling is disabled
+    """
+    if _profiler is None:
+        return nullcontext(counts)
+    return _profiler.stage(name, **counts)
@@ -3,112 +3,261 @@ Module to calculate and explore edge betweenness centrality using Networkx.
 """
 
 import os
+import numpy as np
 import networkx as nx
-import osmnx as ox
 import pandas as pd
 import geopandas as gpd
-import matplotlib.pyplot as plt
+from .module_csr_graph import CsrGraph
+from .module_compact_graph import CompactGraph
+from .module_speed_profiles import SpeedEngine, DEFAULT_SPEED_PROFILE
+from .module_brandes import (
+    edge_betweenness, approximate_edge_betweenness, update_edge_betweenness,
+)
+from .module_edge_output import coerce_list_columns, save_edges
+from .module_edge_plot import plot_edges
+from .module_instrumentation import stage
+from .module_options import BACKENDS, DEFAULT_RENDERER
 
 
 class NetworkxCentrality:
     """
     Class to calculate and explore edge betweenness centrality using NetworkX.
     """
-    def __init__(self, weight):
+    def __init__(
+        self, weight, backend="networkx", workers=1, pivots=None, adaptive=False,
+        top_n=100, seed=42,
+    ):
         """
         Initializes a NetworkxCentrality object with the specified weight.
         :param weight: used in centrality calculations
+        :param backend: "networkx" or "csr" (compiled arrays, same values). Default "networkx"
+        :param workers: number of processes for the csr backend. Default 1
+        :param pivots: number of sampled source nodes for approximate centrality (csr
+        backend). Default None calculates the exact centrality
+        :param adaptive: add batches of pivots until the top_n edges are stable. Default False
+        :param top_n: number of top edges checked in adaptive mode. Default 100
+        :param seed: seed of the pivot sampling. Default 42
         """
+        if backend not in BACKENDS:
+            raise ValueError(f"Invalid backend '{backend}'. Use one of {BACKENDS}.")
+        if workers < 1:
+            raise ValueError("The number of workers must be at least 1.")
+        if workers > 1 and backend != "csr":
+            raise ValueError("Parallel centrality calculation requires the 'csr' backend.")
+        if pivots is not None and backend != "csr":
+            raise ValueError("Approximate centrality calculation requires the 'csr' backend.")
+        if adaptive and pivots is None:
+            raise ValueError("Adaptive sampling requires the number of pivots per batch.")
         self.weight = weight
+        self.backend = backend
+        self.workers = workers
+        self.pivots = pivots
+        self.adaptive = adaptive
+        self.top_n = top_n
+        self.seed = seed
+        self.estimate = None
+        self.speed_engine = None
+        self.speed_engine_graph = None
+        self.scenario_graph = None
         self.centrality_short_gdf = None
         self.centrality_fast_gdf = None
 
-    def get_centrality_short(self, graph, edges_df, output_file=None):
+    def edge_betweenness_centrality(self, graph, weight, csr_graph=None):
         """
-        Calculates edge betweenness centrality using the shortest routes and returns a DataFrame.
-        :param graph: Networkx graph object
-        :param edges_df: DataFrame containing edge information
-        :param output_file: path to save GeoDataFrame. Default None
-        :return pd.DataFrame: DataFrame containing edge betweenness centrality values
+        Calculates edge betweenness centrality with the selected backend. Approximate
+        centrality adds the 95 % confidence interval as 'centrality_low' and
+        'centrality_high' columns.
+        :param graph: Networkx graph object or CompactGraph (csr backend only)
+        :param weight: edge attribute or Networkx weight function used as weight
+        :param csr_graph: CsrGraph with the weights for the csr backend. Default None
+        compiles it from the graph
+        :return pd.DataFrame: centrality values indexed by u, v and key
         """
-        betweenness_centrality = nx.edge_betweenness_centrality(
-            graph, weight=self.weight
+        if isinstance(graph, CompactGraph) and self.backend != "csr":
+            raise ValueError("Centrality on a compact graph requires the 'csr' backend.")
+        if self.backend == "networkx":
+            betweenness_centrality = nx.edge_betweenness_centrality(graph, weight=weight)
+            centrality_df = pd.DataFrame(
+                index=betweenness_centrality.keys(),
+                data=betweenness_centrality.values()
+            )
+            centrality_df.reset_index(inplace=True)
+            centrality_df.columns = ["u", "v", "key", "centrality"]
+            return centrality_df.set_index(["u", "v", "key"])
+
+        if csr_graph is None and isinstance(graph, CompactGraph):
+            csr_graph = graph.csr_graph(weight)
+        elif csr_graph is None:
+            csr_graph = CsrGraph.from_graph(graph, weight)
+        index = pd.MultiIndex.from_tuples(csr_graph.edge_tuples(), names=["u", "v", "key"])
+        if self.pivots is None:
+            scores = edge_betweenness(csr_graph, workers=self.workers)
+            return pd.DataFrame({"centrality": scores}, index=index)
+
+        self.estimate = approximate_edge_betweenness(
+            csr_graph,
+            pivots=self.pivots,
+            seed=self.seed,
+            workers=self.workers,
+            adaptive=self.adaptive,
+            top_n=self.top_n,
         )
-        centrality_short_df = pd.DataFrame(
-            index=betweenness_centrality.keys(),
-            data=betweenness_centrality.values()
+        print(
+            f"Centrality estimated from {self.estimate.pivots} of "
+            f"{csr_graph.number_of_nodes} nodes."
+        )
+        return pd.DataFrame(
+            {
+                "centrality": self.estimate.centrality,
+                "centrality_low": self.estimate.low,
+                "centrality_high": self.estimate.high,
+            },
+            index=index,
         )
-        centrality_short_df.reset_index(inplace=True)
-        centrality_short_df.columns = ["u", "v", "key", "centrality"]
-        centrality_short_df = centrality_short_df.set_index(["u", "v", "key"])
-        centrality_short_df = centrality_short_df.join(edges_df[["osmid", "geometry"]])
-
-        for col in centrality_short_df.columns:
-            if centrality_short_df[col].apply(type).eq(list).any():
-                centrality_short_df[col] = centrality_short_df[col].apply(
-                    lambda x: str(x) if isinstance(x, list) else x
-                )
 
-        self.centrality_short_gdf = gpd.GeoDataFrame(centrality_short_df, crs=4326)
+    def get_csr_graph(self, graph, speed_profile=DEFAULT_SPEED_PROFILE):
+        """
+        Returns the graph compiled to CSR arrays with the weight of this centrality.
+        :param graph: Networkx graph object, CompactGraph or CsrGraph
+        :param speed_profile: speed profile of the "travel_time" weight. Default "free_flow"
+        :return CsrGraph: compiled graph, the graph itself if it is a CsrGraph
+        """
+        if isinstance(graph, CsrGraph):
+            return graph
+        if self.weight == "travel_time":
+            return self.get_speed_engine(graph).csr_graph_for(speed_profile)
+        if isinstance(graph, CompactGraph):
+            return graph.csr_graph(self.weight)
+        return CsrGraph.from_graph(graph, self.weight)
 
-        if output_file:
-            self.centrality_short_gdf.to_file(output_file, driver="GPKG")
+    def update_centrality(
+        self, graph, centrality_df, changes, speed_profile=DEFAULT_SPEED_PROFILE
+    ):
+        """
+        Updates exact edge betweenness centrality after road closures or weight changes,
+        recomputing only the source trees whose shortest path DAG is affected. The result
+        equals a full recomputation on the changed graph, whose compiled form is stored in
+        'scenario_graph' and can be passed as graph to chain further changes.
+        :param graph: Networkx graph object, CompactGraph or CsrGraph the centrality was
+        calculated on
+        :param centrality_df: DataFrame with the exact 'centrality' column, indexed by u,
+        v and key
+        :param changes: dictionary of (u, v, key) to the new weight, None closes the edge
+        :param speed_profile: speed profile of the "travel_time" weight. Default "free_flow"
+        :return pd.DataFrame: centrality values of the changed graph indexed by u, v and key
+        :raises ValueError: If the centrality was estimated from pivots
+        :raises KeyError: If a changed edge is not part of the graph
+        """
+        if "centrality_low" in centrality_df.columns:
+            raise ValueError("Only exact centrality values can be updated.")
+        csr_graph = self.get_csr_graph(graph, speed_profile)
 
-        return centrality_short_df
+        edge_ids = {edge: i for i, edge in enumerate(csr_graph.edge_tuples())}
+        scores = centrality_df["centrality"].reindex(list(edge_ids)).to_numpy()
+        if np.isnan(scores).any():
+            raise ValueError("The centrality values do not match the edges of the graph.")
+        edge_changes = {
+            edge_ids[edge]: np.inf if weight is None else weight
+            for edge, weight in changes.items()
+        }
+        self.scenario_graph, scores, recomputed = update_edge_betweenness(
+            csr_graph, scores, edge_changes, workers=self.workers
+        )
+        print(
+            f"Recomputed {recomputed} of {csr_graph.number_of_nodes} source trees."
+        )
+        index = pd.MultiIndex.from_tuples(
+            self.scenario_graph.edge_tuples(), names=["u", "v", "key"]
+        )
+        return pd.DataFrame({"centrality": scores}, index=index)
 
-    def get_centrality_fast(self, graph, edges_df, output_file=None):
+    def join_edge_data(self, centrality_df, graph, edges_df):
         """
-        Calculates edge betweenness centrality using the fastest routes. Returns DataFrame.
-        :param graph: Networkx graph object
-        :param edges_df: DataFrame containing edge information.
-        :param output_file: path to save GeoDataFrame. Default None
+        Joins the osm ids and geometries of the edges to centrality values and converts
+        list values for the output.
+        :param centrality_df: DataFrame with centrality values indexed by u, v and key
+        :param graph: Networkx graph object or CompactGraph
+        :param edges_df: DataFrame containing edge information, built from the CompactGraph
+        if None
+        :return pd.DataFrame: centrality values with 'osmid' and 'geometry' columns
+        """
+        if edges_df is None and isinstance(graph, CompactGraph):
+            edges_df = graph.edges_gdf()
+        centrality_df = centrality_df.join(edges_df[["osmid", "geometry"]])
+        return coerce_list_columns(centrality_df)
+
+    def get_centrality_short(self, graph, edges_df, output_file=None):
+        """
+        Calculates edge betweenness centrality using the shortest routes and returns a DataFrame.
+        :param graph: Networkx graph object or CompactGraph
+        :param edges_df: DataFrame containing edge information, built from the CompactGraph
+        if None
+        :param output_file: path to save GeoDataFrame, a GeoPackage, GeoParquet or Arrow
+        file by its extension. Default None
         :return pd.DataFrame: DataFrame containing edge betweenness centrality values
         """
-        hwy_speeds = {
-            "motorway": 100,
-            "motorway_link": 60,
-            "motorroad": 90,
-            "trunk": 85,
-            "trunk_link": 60,
-            "primary": 65,
-            "primary_link": 50,
-            "secondary": 60,
-            "secondary_link": 50,
-            "tertiary": 50,
-            "tertiary_link": 40,
-            "unclassified": 30,
-            "residential": 30,
-            "living_street": 10,
-            "service": 20,
-            "road": 20,
-            "track": 15,
-        }
+        with stage("betweenness", backend=self.backend) as counts:
+            centrality_short_df = self.edge_betweenness_centrality(graph, self.weight)
+            counts["edges"] = len(centrality_short_df)
+        with stage("join_edge_data", edges=len(centrality_short_df)):
+            centrality_short_df = self.join_edge_data(centrality_short_df, graph, edges_df)
+            self.centrality_short_gdf = gpd.GeoDataFrame(centrality_short_df, crs=4326)
 
-        graph_with_speeds = ox.add_edge_speeds(graph, hwy_speeds)
-        graph_travel_time = ox.add_edge_travel_times(graph_with_speeds)
+        if output_file:
+            with stage("save_output", edges=len(centrality_short_df)):
+                save_edges(self.centrality_short_gdf, output_file)
 
-        betweenness_centrality_time = nx.edge_betweenness_centrality(
-            graph_travel_time, weight="travel_time"
-        )
-        centrality_fast_df = pd.DataFrame(
-            index=betweenness_centrality_time.keys(),
-            data=betweenness_centrality_time.values(),
-        )
-        centrality_fast_df.reset_index(inplace=True)
-        centrality_fast_df.columns = ["u", "v", "key", "centrality"]
-        centrality_fast_df = centrality_fast_df.set_index(["u", "v", "key"])
-        centrality_fast_df = centrality_fast_df.join(edges_df[["osmid", "geometry"]])
-
-        for col in centrality_fast_df.columns:
-            if centrality_fast_df[col].apply(type).eq(list).any():
-                centrality_fast_df[col] = centrality_fast_df[col].apply(
-                    lambda x: str(x) if isinstance(x, list) else x
-                )
+        return centrality_short_df
 
-        self.centrality_fast_gdf = gpd.GeoDataFrame(centrality_fast_df, crs=4326)
+    def get_speed_engine(self, graph):
+        """
+        Returns the speed engine of a graph, which is created once per graph.
+        :param graph: Networkx graph object or CompactGraph
+        :return SpeedEngine: travel times of the speed profiles
+        """
+        if self.speed_engine is None or self.speed_engine_graph is not graph:
+            if isinstance(graph, CompactGraph):
+                self.speed_engine = SpeedEngine.from_compact_graph(graph)
+            else:
+                self.speed_engine = SpeedEngine.from_graph(graph)
+            self.speed_engine_graph = graph
+        return self.speed_engine
+
+    def get_centrality_fast(
+        self, graph, edges_df, output_file=None, speed_profile=DEFAULT_SPEED_PROFILE
+    ):
+        """
+        Calculates edge betweenness centrality using the fastest routes. Returns DataFrame.
+        The travel times of the speed profile are calculated as arrays, the graph is not
+        modified.
+        :param graph: Networkx graph object or CompactGraph
+        :param edges_df: DataFrame containing edge information, built from the CompactGraph
+        if None
+        :param output_file: path to save GeoDataFrame, a GeoPackage, GeoParquet or Arrow
+        file by its extension. Default None
+        :param speed_profile: name of the speed profile. Default "free_flow"
+        :return pd.DataFrame: DataFrame containing edge betweenness centrality values
+        """
+        with stage("travel_time", profile=speed_profile):
+            speed_engine = self.get_speed_engine(graph)
+            csr_graph = None
+            if self.backend == "networkx":
+                weight = speed_engine.weight_function(speed_profile)
+            else:
+                weight = "travel_time"
+                csr_graph = speed_engine.csr_graph_for(speed_profile)
+        with stage("betweenness", backend=self.backend) as counts:
+            centrality_fast_df = self.edge_betweenness_centrality(
+                graph, weight, csr_graph=csr_graph
+            )
+            counts["edges"] = len(centrality_fast_df)
+        with stage("join_edge_data", edges=len(centrality_fast_df)):
+            centrality_fast_df = self.join_edge_data(centrality_fast_df, graph, edges_df)
+            self.centrality_fast_gdf = gpd.GeoDataFrame(centrality_fast_df, crs=4326)
 
         if output_file:
-            self.centrality_fast_gdf.to_file(output_file, driver="GPKG")
+            with stage("save_output", edges=len(centrality_fast_df)):
+                save_edges(self.centrality_fast_gdf, output_file)
 
         return centrality_fast_df
 
@@ -118,6 +267,8 @@ class NetworkxCentrality:
         weight,
         output_folder=None,
         image_name="Centrality_Plot.png",
+        renderer=DEFAULT_RENDERER,
+        aggregation="max",
     ):
         """
         Plots the edge betweenness centrality on a map.
@@ -125,47 +276,61 @@ class NetworkxCentrality:
         :param weight: used in centrality calculations
         :param output_folder: path to save plot. Default is None
         :param image_name: of plot. Default is "Centrality_Plot.png"
+        :param renderer: "geopandas", "lines" or "raster", see 'plot_edges'. Default "geopandas"
+        :param aggregation: "max" or "sum" of the edges in a pixel of the raster renderer.
+        Default "max"
         """
         title = (
             f"Betweenness centrality using the {'shortest' if weight == 'length' else 'fastest'} routes"
         )
         if centrality_gdf is not None:
-            plot = centrality_gdf.plot(column="centrality", cmap="magma_r", legend=True)
-
-            plot.set_xlabel("Longitude")
-            plot.set_ylabel("Latitude")
-
-            lat_formatter = "{:.2f}".format
-            plot.yaxis.set_major_formatter(lat_formatter)
-
-            plt.title(title)
-
-            if output_folder:
-                output_image_path = os.path.join(output_folder, image_name)
-                plt.savefig(output_image_path, bbox_inches="tight")
+            with stage("plot", edges=len(centrality_gdf)):
+                plot_edges(
+                    centrality_gdf, title=title,
+                    output_path=os.path.join(output_folder, image_name) if output_folder else None,
+                    renderer=renderer, aggregation=aggregation,
+                )
         else:
             print(f"Centrality data not available. Run {title.lower()} first.")
 
-    def explore_centrality_short(self, output_folder=None):
+    def explore_centrality_short(
+        self, output_folder=None, renderer=DEFAULT_RENDERER, aggregation="max",
+    ):
         """
         Plots the edge betweenness centrality using the shortest routes on a map.
         :param output_folder: path to save plot. Default is None
+        :param renderer: "geopandas", "lines" or "raster" map. Default "geopandas"
+        :param aggregation: "max" or "sum" of the edges in a pixel of the raster renderer.
+        Default "max"
         """
         self.explore_centrality(
             centrality_gdf=self.centrality_short_gdf,
             weight=self.weight,
             output_folder=output_folder,
             image_name="Centrality_Plot_ShortestRoutes.png",
+            renderer=renderer,
+            aggregation=aggregation,
         )
 
-    def explore_centrality_fast(self, output_folder=None):
+    def explore_centrality_fast(
+        self, output_folder=None, speed_profile=DEFAULT_SPEED_PROFILE,
+        renderer=DEFAULT_RENDERER, aggregation="max",
+    ):
         """
         Plots the edge betweenness centrality using the fastest routes on a map.
         :param output_folder: path to save plot. Default is None
+        :param speed_profile: name of the speed profile, added to the image name unless it
+        is the default profile. Default "free_flow"
+        :param renderer: "geopandas", "lines" or "raster" map. Default "geopandas"
+        :param aggregation: "max" or "sum" of the edges in a pixel of the raster renderer.
+        Default "max"
         """
+        suffix = "" if speed_profile == DEFAULT_SPEED_PROFILE else f"_{speed_profile}"
         self.explore_centrality(
             centrality_gdf=self.centrality_fast_gdf,
             weight=self.weight,
             output_folder=output_folder,
-            image_name="Centrality_Plot_FastestRoutes.png",
+            image_name=f"Centrality_Plot_FastestRoutes{suffix}.png",
+            renderer=renderer,
+            aggregation=aggregation,
         )
@@ -0,0 +1,60 @@
+"""
+Module to snap many coordinates to their nearest graph nodes at once.
+"""
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+
+def _unit_sphere(x, y):
+    """
+    Converts longitude and latitude in degrees to points on the unit sphere.
+    :param x: longitudes
+    :param y: latitudes
+    :return np.ndarray: array of shape (n, 3)
+    """
+    lon = np.radians(np.asarray(x, dtype=float))
+    lat = np.radians(np.asarray(y, dtype=float))
+    return np.column_stack(
+        (np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat))
+    )
+
+
+class NodeLocator:
+    """
+    Nearest node search on a k-d tree which is built once per graph. For unprojected graphs
+    the tree is built on the unit sphere, where the chord distance orders nodes the same
+    way as the haversine distance used by ox.nearest_nodes.
+    """
+    def __init__(self, node_x, node_y, projected=False, node_indices=None):
+        """
+        Initializes the k-d tree with the node coordinates.
+        :param node_x: x coordinate (longitude) of every node
+        :param node_y: y coordinate (latitude) of every node
+        :param projected: whether the coordinates are projected. Default False
+        :param node_indices: restrict the search to these node indices. Default None
+        """
+        self.projected = projected
+        self.node_indices = node_indices
+        if node_indices is not None:
+            node_x, node_y = node_x[node_indices], node_y[node_indices]
+        if projected:
+            self.tree = cKDTree(np.column_stack((node_x, node_y)))
+        else:
+            self.tree = cKDTree(_unit_sphere(node_x, node_y))
+
+    def nearest(self, x, y):
+        """
+        Finds the nearest node of every coordinate.
+        :param x: array of x coordinates (longitudes)
+        :param y: array of y coordinates (latitudes)
+        :return np.ndarray: node index of the nearest node of every coordinate
+        """
+        if self.projected:
+            points = np.column_stack((x, y))
+        else:
+            points = _unit_sphere(x, y)
+        _, positions = self.tree.query(points, k=1)
+        if self.node_indices is not None:
+            return self.node_indices[positions]
+        return positions
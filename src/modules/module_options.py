@@ -0,0 +1,28 @@
+"""
+Module with the choices and defaults of the command-line options. It imports no third
+party libraries, so the arguments are validated before NumPy, osmnx or matplotlib are loaded.
+"""
+
+import os
+
+# Centrality modules and routing weights of a run
+MODULE_TYPES = ("networkx", "geographical")
+WEIGHTS = ("length", "travel_time")
+# Implementations of the networkx betweenness centrality
+BACKENDS = ("networkx", "csr")
+# Ways to solve the routes of the geographical centrality
+ROUTING_MODES = ("shortest_path", "tree", "ch")
+# Ways to draw edge values on a map, the first is the default
+RENDERERS = ("geopandas", "lines", "raster")
+DEFAULT_RENDERER = RENDERERS[0]
+# Values of the edges crossing a pixel of the raster renderer
+RASTER_AGGREGATIONS = ("max", "sum")
+# Available distributions of the route ends in the study area
+SAMPLING_STRATEGIES = ("uniform", "population")
+# Names of the speed profiles of module_speed_profiles, the first is the default
+SPEED_PROFILE_NAMES = ("free_flow", "rush_hour", "truck")
+DEFAULT_SPEED_PROFILE = SPEED_PROFILE_NAMES[0]
+# Population raster of the population sampling in the data folder
+DEFAULT_POPULATION_RASTER = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "GHS_POP_100m_2020.tif"
+)
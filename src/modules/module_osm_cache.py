@@ -0,0 +1,145 @@
+"""
+Module to cache downloaded OpenStreetMap graphs and geocoded study areas on disk.
+"""
+
+import os
+import json
+import pickle
+import hashlib
+import tempfile
+
+# Default cache folder, can be changed with the NETWORK_ANALYSIS_CACHE environment variable
+DEFAULT_CACHE_DIRECTORY = os.environ.get(
+    "NETWORK_ANALYSIS_CACHE",
+    os.path.join(os.path.expanduser("~"), ".cache", "network_analysis"),
+)
+# Default upper bound for the total size of the cache in bytes
+DEFAULT_MAX_BYTES = 5 * 1024 ** 3
+CACHE_SUFFIX = ".pickle"
+
+
+class CacheMissError(LookupError):
+    """
+    Raised in offline mode if requested data is not in the cache.
+    """
+
+
+class OsmCache:
+    """
+    Content-keyed on-disk cache for OSM data. Entries are keyed by their kind, parameters
+    and the osmnx version, and evicted least recently used first once the cache exceeds
+    its size limit. In offline mode the network is never used.
+    """
+    def __init__(self, directory=None, max_bytes=DEFAULT_MAX_BYTES, offline=False):
+        """
+        Initializes the cache and creates its folder.
+        :param directory: cache folder. Default None uses DEFAULT_CACHE_DIRECTORY
+        :param max_bytes: upper bound for the total size of the cache. Default 5 GiB
+        :param offline: never download, raise CacheMissError instead. Default False
+        """
+        self.directory = directory or DEFAULT_CACHE_DIRECTORY
+        self.max_bytes = max_bytes
+        self.offline = offline
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path(self, kind, **params):
+        """
+        Returns the file of a cache entry.
+        :param kind: kind of the cached data, e.g. "graph"
+        :param params: parameters the data was created with
+        :return str: path of the cache file
+        """
+        # osmnx is loaded on first use, so the cache can be set up before it is needed
+        import osmnx as ox
+
+        description = json.dumps(
+            {"kind": kind, "osmnx": ox.__version__, **params}, sort_keys=True
+        )
+        key = hashlib.sha256(description.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{kind}_{key}{CACHE_SUFFIX}")
+
+    def contains(self, kind, **params):
+        """
+        :param kind: kind of the cached data, e.g. "graph"
+        :param params: parameters the data was created with
+        :return bool: whether the data is in the cache
+        """
+        return os.path.exists(self.path(kind, **params))
+
+    def get_or_create(self, kind, create, **params):
+        """
+        Returns cached data or creates, stores and returns it.
+        :param kind: kind of the cached data, e.g. "graph"
+        :param create: function without arguments creating the data
+        :param params: parameters the data is created with
+        :return: cached or created data
+        :raises CacheMissError: If the data is not cached in offline mode
+        """
+        path = self.path(kind, **params)
+        if os.path.exists(path):
+            # The modification time marks the last use for the eviction
+            os.utime(path)
+            with open(path, "rb") as cache_file:
+                return pickle.load(cache_file)
+        if self.offline:
+            raise CacheMissError(f"No cached {kind} for {params} in {self.directory}.")
+
+        data = create()
+        file_descriptor, temporary_path = tempfile.mkstemp(dir=self.directory)
+        try:
+            with os.fdopen(file_descriptor, "wb") as cache_file:
+                pickle.dump(data, cache_file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temporary_path, path)
+        except BaseException:
+            # A partly written entry, e.g. of a full disk, must not stay in the cache
+            os.remove(temporary_path)
+            raise
+        self.evict(keep=path)
+        return data
+
+    def evict(self, keep=None):
+        """
+        Deletes least recently used entries until the cache is within its size limit.
+        :param keep: path of an entry which is never deleted. Default None
+        """
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(CACHE_SUFFIX):
+                status = os.stat(os.path.join(self.directory, name))
+                entries.append((status.st_mtime, status.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            path = os.path.join(self.directory, name)
+            if path != keep:
+                os.remove(path)
+                total -= size
+
+    def graph_from_place(self, region, network_type):
+        """
+        Cached version of ox.graph_from_place.
+        :param region: name or area identifier for region of interest
+        :param network_type: type of street network
+        :return networkx.MultiDiGraph: street network
+        """
+        import osmnx as ox
+
+        return self.get_or_create(
+            "graph",
+            lambda: ox.graph_from_place(region, network_type=network_type),
+            region=region,
+            network_type=network_type,
+        )
+
+    def geocode_to_gdf(self, region):
+        """
+        Cached version of ox.geocode_to_gdf.
+        :param region: name or area identifier for region of interest
+        :return GeoDataFrame: polygon of the region
+        """
+        import osmnx as ox
+
+        return self.get_or_create(
+            "polygon", lambda: ox.geocode_to_gdf(region), region=region
+        )
@@ -3,6 +3,49 @@ Module to handle the creation of output folders based on analysis parameters.
 """
 
 import os
+from .module_options import DEFAULT_SPEED_PROFILE
+
+
+def output_folder_name(region, module_type, weight, number_of_routes):
+    """
+    Returns the name of the output folder of a run.
+    :param region: region for which the analysis is performed
+    :param module_type: type of module used for analysis ('networkx' or 'geographical')
+    :param weight: weight parameter used in the analysis ('length' or 'travel_time')
+    :param number_of_routes: number of routes only for geographical
+    :return str: name of the output folder
+    """
+    region_cleaned = region.replace(",", "_")
+    if number_of_routes is not None:
+        return f"Output_{region_cleaned}_{module_type}_{weight}_{number_of_routes}_routes"
+    return f"Output_{region_cleaned}_{module_type}_{weight}"
+
+
+def profile_suffix(speed_profile):
+    """
+    Returns the suffix of output file names for a speed profile.
+    :param speed_profile: name of the speed profile
+    :return str: empty for the default profile, "_<profile>" otherwise
+    """
+    return "" if speed_profile == DEFAULT_SPEED_PROFILE else f"_{speed_profile}"
+
+
+def centrality_file_name(
+    module_type, weight, number_of_routes, extension, speed_profile=DEFAULT_SPEED_PROFILE
+):
+    """
+    Returns the name of the centrality output file of a run.
+    :param module_type: type of module used for analysis ('networkx' or 'geographical')
+    :param weight: weight parameter used in the analysis ('length' or 'travel_time')
+    :param number_of_routes: number of routes only for geographical
+    :param extension: extension of the output format, e.g. ".gpkg"
+    :param speed_profile: speed profile of the travel_time weight. Default "free_flow"
+    :return str: name of the output file
+    """
+    suffix = profile_suffix(speed_profile) if weight == "travel_time" else ""
+    if module_type == "networkx":
+        return f"Networkx_centrality_{weight}{suffix}{extension}"
+    return f"Geographical_centrality_{weight}_routes_{number_of_routes}{suffix}{extension}"
 
 
 def create_output_folder(selected_output_folder, region, module_type, weight, number_of_routes):
@@ -20,16 +63,10 @@ def create_output_folder(selected_output_folder, region, module_type, weight, nu
         print("Selected output folder is empty.")
         return None
 
-    region_cleaned = region.replace(",", "_")
-
-    if number_of_routes is not None:
-        output_folder_name = (
-            f"Output_{region_cleaned}_{module_type}_{weight}_{number_of_routes}_routes"
-        )
-    else:
-        output_folder_name = f"Output_{region_cleaned}_{module_type}_{weight}"
-
-    full_output_path = os.path.join(selected_output_folder, output_folder_name)
+    full_output_path = os.path.join(
+        selected_output_folder,
+        output_folder_name(region, module_type, weight, number_of_routes),
+    )
 
     if not os.path.exists(full_output_path):
         os.makedirs(full_output_path)
@@ -0,0 +1,656 @@
+"""
+Module to route on street networks too large for the memory, e.g. of a whole country. The
+network is split into square tiles of node coordinates which are saved one file per tile.
+Every tile stores the distances between its boundary nodes (the ends of the edges between
+tiles); together with the edges between tiles they form the overlay graph, the only part
+kept in memory. Routes are found on the overlay and their parts inside the tiles are
+unpacked tile by tile, so the memory of the tiles is bounded by the tile size.
+"""
+
+import os
+import json
+import hashlib
+import tempfile
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+from .module_csr_graph import CsrGraph
+from .module_node_locator import NodeLocator
+from .module_route_trees import tree_route_loads
+from .module_brandes import DISTANCE_BATCH_SIZE
+
+# Version of the saved file format
+FORMAT_VERSION = 1
+# Name of the metadata file in a partition folder
+METADATA_FILE = "partition.json"
+# Number of nodes or edges read from the memory-mapped graph at once while partitioning
+CHUNK_SIZE = 2 ** 20
+# Number of origin destination pairs routed together; every tile a batch touches is loaded
+# once per routing phase
+ROUTE_BATCH_SIZE = 10000
+# Arrays of a tile: global node indices and coordinates, the CSR adjacency of the edges
+# inside the tile with their weights and global edge ids
+TILE_ARRAYS = ("nodes", "node_x", "node_y", "offsets", "targets", "weights", "edge_ids")
+# Arrays of the overlay graph: partition index of the boundary nodes, and per overlay edge
+# its ends, weight and kind (edge id of an edge between tiles, -1 - tile for the distance
+# between two boundary nodes inside a tile)
+OVERLAY_ARRAYS = ("nodes", "tails", "heads", "weights", "kinds")
+
+
+def _bucket_order(bucket_of, number_of_items, number_of_buckets, path, chunk_size=CHUNK_SIZE):
+    """
+    Sorts items by bucket without holding all of them in memory. The items are read in
+    chunks twice, once to count the buckets and once to write the item ids to their
+    position in a memory-mapped file. Items keep their order within a bucket.
+    :param bucket_of: function (start, end) returning the bucket of the items start to end
+    :param number_of_items: number of items
+    :param number_of_buckets: number of buckets
+    :param path: .npy file of the sorted item ids
+    :param chunk_size: number of items per chunk. Default CHUNK_SIZE
+    :return tuple: offsets of the buckets and the memory-mapped item ids sorted by bucket
+    """
+    counts = np.zeros(number_of_buckets, dtype=np.int64)
+    for start in range(0, number_of_items, chunk_size):
+        buckets = bucket_of(start, min(start + chunk_size, number_of_items))
+        counts += np.bincount(buckets, minlength=number_of_buckets)
+    offsets = np.zeros(number_of_buckets + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+
+    order = np.lib.format.open_memmap(
+        path, mode="w+", dtype=np.int64, shape=(max(number_of_items, 1),)
+    )[:number_of_items]
+    cursor = offsets[:-1].copy()
+    for start in range(0, number_of_items, chunk_size):
+        buckets = bucket_of(start, min(start + chunk_size, number_of_items))
+        chunk_order = np.argsort(buckets, kind="stable")
+        sorted_buckets = buckets[chunk_order]
+        rank = np.arange(len(sorted_buckets)) - np.searchsorted(sorted_buckets, sorted_buckets)
+        order[cursor[sorted_buckets] + rank] = start + chunk_order
+        cursor += np.bincount(buckets, minlength=number_of_buckets)
+    return offsets, order
+
+
+def partition_fingerprint(compact_graph, weights, chunk_size=CHUNK_SIZE):
+    """
+    Hashes the node coordinates, edges and weights a partition is built from, so a saved
+    partition is only used for the graph and weights it belongs to. The arrays are read in
+    chunks, so they may be memory-mapped.
+    :param compact_graph: CompactGraph, loaded memory-mapped
+    :param weights: weight of every edge id, may be memory-mapped
+    :param chunk_size: number of nodes or edges read at once. Default CHUNK_SIZE
+    :return str: hexadecimal SHA-256 digest
+    """
+    digest = hashlib.sha256()
+    digest.update(np.array(
+        [compact_graph.number_of_nodes, compact_graph.number_of_edges], dtype=np.int64
+    ).tobytes())
+    for array, dtype in (
+        (compact_graph.node_x, np.float64), (compact_graph.node_y, np.float64),
+        (compact_graph.offsets, np.int64), (compact_graph.targets, np.int64),
+        (weights, np.float64),
+    ):
+        for start in range(0, len(array), chunk_size):
+            digest.update(
+                np.ascontiguousarray(array[start:start + chunk_size], dtype=dtype).tobytes()
+            )
+    return digest.hexdigest()
+
+
+def _edge_sources(offsets, edge_ids):
+    """
+    :param offsets: CSR offsets of the graph
+    :param edge_ids: array of edge ids
+    :return np.ndarray: node index of the tail of every edge
+    """
+    return np.searchsorted(offsets, edge_ids, side="right") - 1
+
+
+def _distances(matrix, indices):
+    """
+    Runs Dijkstra from several nodes in batches of at most DISTANCE_BATCH_SIZE values.
+    :param matrix: sparse adjacency matrix
+    :param indices: array of start nodes
+    :return np.ndarray: distance of every node from every start node
+    """
+    number_of_nodes = matrix.shape[0]
+    batch = max(1, DISTANCE_BATCH_SIZE // max(number_of_nodes, 1))
+    rows = [
+        np.atleast_2d(dijkstra(matrix, directed=True, indices=indices[start:start + batch]))
+        for start in range(0, len(indices), batch)
+    ]
+    return np.vstack(rows) if rows else np.empty((0, number_of_nodes))
+
+
+class Tile:
+    """
+    Nodes of one tile and the edges between them.
+    """
+    def __init__(self, arrays):
+        """
+        Initializes a Tile from its arrays.
+        :param arrays: dictionary with one array per name in TILE_ARRAYS
+        """
+        for name in TILE_ARRAYS:
+            setattr(self, name, arrays[name])
+        self.csr_graph = CsrGraph(
+            self.nodes, self.offsets, self.targets, self.edge_ids, self.weights,
+            node_x=self.node_x, node_y=self.node_y,
+        )
+
+    @property
+    def matrix(self):
+        """
+        :return csr_matrix: adjacency matrix with the minimum weight of parallel edges
+        """
+        return self.csr_graph.collapsed().matrix
+
+
+class PartitionedGraph:
+    """
+    Street network split into square tiles, saved in a folder with one file per tile and
+    the overlay graph. The nodes are numbered tile by tile; this partition index is used
+    for all nodes of the routes.
+    """
+    def __init__(self, directory):
+        """
+        Opens a saved partition. Only the overlay graph is read into memory.
+        :param directory: folder of the partition
+        :raises ValueError: If the file format version is not supported
+        """
+        with open(os.path.join(directory, METADATA_FILE), encoding="utf-8") as file:
+            metadata = json.load(file)
+        if metadata.get("format_version") != FORMAT_VERSION:
+            raise ValueError(
+                f"Unsupported partition format {metadata.get('format_version')}."
+            )
+        self.directory = directory
+        self.metadata = metadata
+        self.node_offsets = np.load(os.path.join(directory, "node_offsets.npy"))
+        with np.load(os.path.join(directory, "overlay.npz")) as overlay:
+            for name in OVERLAY_ARRAYS:
+                setattr(self, f"overlay_{name}", overlay[name])
+        # Overlay edges are sorted by tail and head, so their combined keys are as well
+        self.overlay_keys = self.overlay_tails * len(self.overlay_nodes) + self.overlay_heads
+        # Boundary nodes are numbered in tile order, so every tile has a range of them
+        self.overlay_offsets = np.searchsorted(self.overlay_nodes, self.node_offsets)
+
+    @classmethod
+    def build(
+        cls, compact_graph, weights, directory, tile_size, chunk_size=CHUNK_SIZE,
+        fingerprint=None,
+    ):
+        """
+        Splits a graph into tiles of 'tile_size' by 'tile_size' coordinate units. The
+        memory-mapped arrays of the graph are read in chunks and sorted by tile on disk,
+        then the tiles are saved and their boundary distances computed one at a time.
+        :param compact_graph: CompactGraph, loaded memory-mapped
+        :param weights: weight of every edge id, may be memory-mapped
+        :param directory: folder of the partition, created if necessary
+        :param tile_size: side length of the tiles in the units of the node coordinates
+        (degrees for unprojected graphs)
+        :param chunk_size: number of nodes or edges read at once. Default CHUNK_SIZE
+        :param fingerprint: partition_fingerprint of the graph and weights. Default None
+        computes it
+        :return PartitionedGraph: opened partition
+        :raises ValueError: If the tile size is not positive or the graph has no nodes
+        """
+        if not tile_size > 0:
+            raise ValueError("The tile size must be positive.")
+        number_of_nodes = compact_graph.number_of_nodes
+        number_of_edges = compact_graph.number_of_edges
+        if number_of_nodes == 0:
+            raise ValueError("The graph has no nodes.")
+        node_x, node_y = compact_graph.node_x, compact_graph.node_y
+        offsets, targets = compact_graph.offsets, compact_graph.targets
+
+        chunks = range(0, number_of_nodes, chunk_size)
+        x_min = min(float(node_x[start:start + chunk_size].min()) for start in chunks)
+        y_min = min(float(node_y[start:start + chunk_size].min()) for start in chunks)
+        x_max = max(float(node_x[start:start + chunk_size].max()) for start in chunks)
+        y_max = max(float(node_y[start:start + chunk_size].max()) for start in chunks)
+        columns = int((x_max - x_min) // tile_size) + 1
+        rows = int((y_max - y_min) // tile_size) + 1
+        metadata = {
+            "format_version": FORMAT_VERSION,
+            "tile_size": tile_size,
+            "x_min": x_min,
+            "y_min": y_min,
+            "columns": columns,
+            "rows": rows,
+            "number_of_nodes": number_of_nodes,
+            "number_of_edges": number_of_edges,
+            "projected": compact_graph.is_projected(),
+            "fingerprint": fingerprint or partition_fingerprint(
+                compact_graph, weights, chunk_size
+            ),
+        }
+        number_of_tiles = columns * rows
+        os.makedirs(directory, exist_ok=True)
+
+        with tempfile.TemporaryDirectory(dir=directory) as temporary_directory:
+            def node_tiles(start, end):
+                return cls._grid_tiles(metadata, node_x[start:end], node_y[start:end])
+
+            node_offsets, node_order = _bucket_order(
+                node_tiles, number_of_nodes, number_of_tiles,
+                os.path.join(directory, "node_order.npy"), chunk_size,
+            )
+            node_tile = np.lib.format.open_memmap(
+                os.path.join(temporary_directory, "node_tile.npy"), mode="w+",
+                dtype=np.int64, shape=(number_of_nodes,),
+            )
+            node_local = np.lib.format.open_memmap(
+                os.path.join(temporary_directory, "node_local.npy"), mode="w+",
+                dtype=np.int64, shape=(number_of_nodes,),
+            )
+            for start in chunks:
+                positions = np.arange(start, min(start + chunk_size, number_of_nodes))
+                tiles = np.searchsorted(node_offsets, positions, side="right") - 1
+                node_tile[node_order[positions]] = tiles
+                node_local[node_order[positions]] = positions - node_offsets[tiles]
+
+            # Edges inside a tile go to the bucket of their tile, all others to the last
+            def edge_buckets(start, end):
+                tails = node_tile[_edge_sources(offsets, np.arange(start, end))]
+                heads = node_tile[targets[start:end]]
+                return np.where(tails == heads, tails, number_of_tiles)
+
+            edge_offsets, edge_order = _bucket_order(
+                edge_buckets, number_of_edges, number_of_tiles + 1,
+                os.path.join(temporary_directory, "edge_order.npy"), chunk_size,
+            )
+
+            cut_edges = np.array(edge_order[edge_offsets[-2]:], dtype=np.int64)
+            cut_tails = _edge_sources(offsets, cut_edges)
+            cut_heads = np.asarray(targets[cut_edges], dtype=np.int64)
+            boundary = np.unique(np.concatenate((cut_tails, cut_heads)))
+            # Partition index of the boundary nodes, sorted, so tiles keep ranges of them
+            boundary_partition = np.sort(
+                node_offsets[node_tile[boundary]] + node_local[boundary]
+            )
+            overlay_offsets = np.searchsorted(boundary_partition, node_offsets)
+
+            def overlay_index(nodes):
+                return np.searchsorted(
+                    boundary_partition, node_offsets[node_tile[nodes]] + node_local[nodes]
+                )
+
+            overlay_edges = [(
+                overlay_index(cut_tails), overlay_index(cut_heads),
+                np.asarray(weights[cut_edges], dtype=np.float64), cut_edges,
+            )]
+            for tile in np.flatnonzero(np.diff(node_offsets)).tolist():
+                nodes = np.array(node_order[node_offsets[tile]:node_offsets[tile + 1]])
+                edges = np.array(edge_order[edge_offsets[tile]:edge_offsets[tile + 1]])
+                tails = np.asarray(node_local[_edge_sources(offsets, edges)])
+                arrays = {
+                    "nodes": nodes,
+                    "node_x": np.asarray(node_x[nodes]),
+                    "node_y": np.asarray(node_y[nodes]),
+                    "offsets": np.searchsorted(tails, np.arange(len(nodes) + 1)),
+                    "targets": np.asarray(node_local[targets[edges]]),
+                    "weights": np.asarray(weights[edges], dtype=np.float64),
+                    "edge_ids": edges,
+                }
+                np.savez(os.path.join(directory, f"tile_{tile}.npz"), **arrays)
+
+                first, last = overlay_offsets[tile], overlay_offsets[tile + 1]
+                if last - first < 2:
+                    continue
+                local = boundary_partition[first:last] - node_offsets[tile]
+                distances = _distances(Tile(arrays).matrix, local)[:, local]
+                tail_positions, head_positions = np.nonzero(
+                    np.isfinite(distances) & ~np.eye(len(local), dtype=bool)
+                )
+                overlay_edges.append((
+                    first + tail_positions, first + head_positions,
+                    distances[tail_positions, head_positions],
+                    np.full(len(tail_positions), -1 - tile, dtype=np.int64),
+                ))
+            del node_tile, node_local, edge_order
+
+        tails, heads, overlay_weights, kinds = (
+            np.concatenate(parts) for parts in zip(*overlay_edges)
+        )
+        # Keep the lightest of parallel overlay edges, the lowest edge id among equals
+        order = np.lexsort((kinds, overlay_weights, heads, tails))
+        tails, heads = tails[order], heads[order]
+        first = np.ones(len(tails), dtype=bool)
+        first[1:] = (tails[1:] != tails[:-1]) | (heads[1:] != heads[:-1])
+        np.savez(
+            os.path.join(directory, "overlay.npz"), nodes=boundary_partition,
+            tails=tails[first], heads=heads[first],
+            weights=overlay_weights[order][first], kinds=kinds[order][first],
+        )
+        np.save(os.path.join(directory, "node_offsets.npy"), node_offsets)
+        with open(os.path.join(directory, METADATA_FILE), "w", encoding="utf-8") as file:
+            json.dump(metadata, file)
+        return cls(directory)
+
+    @classmethod
+    def load_or_build(cls, directory, compact_graph, weights, tile_size):
+        """
+        Opens the partition saved in a folder if it belongs to the graph, weights and tile
+        size, otherwise builds it in the folder.
+        :param directory: folder of the partition
+        :param compact_graph: CompactGraph, loaded memory-mapped
+        :param weights: weight of every edge id, may be memory-mapped
+        :param tile_size: side length of the tiles in the units of the node coordinates
+        :return tuple: partition and whether it was loaded
+        """
+        fingerprint = partition_fingerprint(compact_graph, weights)
+        if os.path.isfile(os.path.join(directory, METADATA_FILE)):
+            partition = cls(directory)
+            metadata = partition.metadata
+            if (
+                metadata["tile_size"] == tile_size
+                and metadata.get("fingerprint") == fingerprint
+            ):
+                return partition, True
+        partition = cls.build(
+            compact_graph, weights, directory, tile_size, fingerprint=fingerprint
+        )
+        return partition, False
+
+    @staticmethod
+    def _grid_tiles(metadata, x, y):
+        """
+        :param metadata: metadata of the partition
+        :param x: array of x coordinates
+        :param y: array of y coordinates
+        :return np.ndarray: tile of every coordinate, coordinates outside the grid get the
+        nearest tile at its border
+        """
+        size = metadata["tile_size"]
+        columns = np.clip(
+            np.floor((np.asarray(x) - metadata["x_min"]) / size), 0, metadata["columns"] - 1
+        )
+        rows = np.clip(
+            np.floor((np.asarray(y) - metadata["y_min"]) / size), 0, metadata["rows"] - 1
+        )
+        return (rows * metadata["columns"] + columns).astype(np.int64)
+
+    @property
+    def number_of_tiles(self):
+        """
+        :return int: number of tiles of the grid, including empty ones
+        """
+        return len(self.node_offsets) - 1
+
+    @property
+    def number_of_edges(self):
+        """
+        :return int: number of edges of the graph
+        """
+        return self.metadata["number_of_edges"]
+
+    def load_tile(self, tile):
+        """
+        Reads one tile from its file.
+        :param tile: tile number
+        :return Tile: nodes and edges of the tile
+        """
+        with np.load(os.path.join(self.directory, f"tile_{tile}.npz")) as arrays:
+            return Tile({name: arrays[name] for name in TILE_ARRAYS})
+
+    def node_indices(self, partition_indices):
+        """
+        :param partition_indices: array of partition indices
+        :return np.ndarray: node index of the graph of every partition index
+        """
+        node_order = np.load(os.path.join(self.directory, "node_order.npy"), mmap_mode="r")
+        return np.asarray(node_order[np.asarray(partition_indices, dtype=np.int64)])
+
+    def tiles_of(self, partition_indices):
+        """
+        :param partition_indices: array of partition indices
+        :return np.ndarray: tile of every node
+        """
+        return np.searchsorted(self.node_offsets, partition_indices, side="right") - 1
+
+    def nearest(self, x, y):
+        """
+        Finds the nearest node of every coordinate among the nodes of its tile, so only
+        these tiles are read. Near tile borders a node of the neighbouring tile may be
+        slightly closer.
+        :param x: array of x coordinates (longitudes)
+        :param y: array of y coordinates (latitudes)
+        :return np.ndarray: partition index of the nearest node, -1 for coordinates in a
+        tile without nodes
+        """
+        x, y = np.asarray(x), np.asarray(y)
+        tiles = self._grid_tiles(self.metadata, x, y)
+        nearest = np.full(len(x), -1, dtype=np.int64)
+        for tile in np.unique(tiles).tolist():
+            if self.node_offsets[tile] == self.node_offsets[tile + 1]:
+                continue
+            points = np.flatnonzero(tiles == tile)
+            data = self.load_tile(tile)
+            locator = NodeLocator(
+                data.node_x, data.node_y, projected=self.metadata["projected"]
+            )
+            nearest[points] = self.node_offsets[tile] + locator.nearest(x[points], y[points])
+        return nearest
+
+    def _tile_distances(self, nodes, reverse=False):
+        """
+        Computes the distances inside their tiles from (or with 'reverse' to) nodes, to
+        all nodes of the tile. Each tile is read once.
+        :param nodes: array of distinct partition indices
+        :param reverse: distances to the nodes instead of from them. Default False
+        :return dict: partition index of every node to its distances, one per node of its
+        tile in local order
+        """
+        result = {}
+        tiles = self.tiles_of(nodes)
+        for tile in np.unique(tiles).tolist():
+            selected = nodes[tiles == tile]
+            matrix = self.load_tile(tile).matrix
+            if reverse:
+                matrix = matrix.transpose().tocsr()
+            distances = _distances(matrix, selected - self.node_offsets[tile])
+            result.update(zip(selected.tolist(), distances))
+        return result
+
+    def route_loads(self, origins, destinations, loads):
+        """
+        Routes origin destination pairs and adds how often every edge is used to 'loads'.
+        The routes inside the tile of a pair and the routes over the overlay graph are
+        compared; overlay routes are unpacked into edges between tiles and parts inside
+        tiles, which are counted tile by tile with one shortest path tree per distinct
+        start node.
+        :param origins: array of origin partition indices
+        :param destinations: array of destination partition indices
+        :param loads: integer array with one load per edge id, may be memory-mapped
+        :return np.ndarray: boolean array marking the pairs that are connected by a route
+        """
+        origins = np.asarray(origins, dtype=np.int64)
+        destinations = np.asarray(destinations, dtype=np.int64)
+        routed = np.zeros(len(origins), dtype=bool)
+        for start in range(0, len(origins), ROUTE_BATCH_SIZE):
+            batch = slice(start, start + ROUTE_BATCH_SIZE)
+            # Parts inside tiles as tuples of tile, local start and local end
+            segments = []
+            routed[batch] = self._route_batch(
+                origins[batch], destinations[batch], loads, segments
+            )
+            if not segments:
+                continue
+            tiles, tails, heads = (np.array(part) for part in zip(*segments))
+            for tile in np.unique(tiles).tolist():
+                selected = tiles == tile
+                data = self.load_tile(tile)
+                tile_loads, _ = tree_route_loads(
+                    data.csr_graph, tails[selected], heads[selected]
+                )
+                used = np.flatnonzero(tile_loads)
+                loads[data.edge_ids[used]] += tile_loads[used]
+        return routed
+
+    def _route_batch(self, origins, destinations, loads, segments):
+        """
+        Finds the routes of a batch of pairs. Edges between tiles are added to 'loads'
+        at once, the parts inside tiles are appended to 'segments'.
+        :param origins: array of origin partition indices
+        :param destinations: array of destination partition indices
+        :param loads: integer array with one load per edge id
+        :param segments: list of tuples of tile, local start and local end
+        :return np.ndarray: boolean array marking the pairs that are connected by a route
+        """
+        sources = np.unique(origins)
+        from_origin = self._tile_distances(sources)
+        to_destination = self._tile_distances(np.unique(destinations), reverse=True)
+        origin_tiles = self.tiles_of(origins)
+        destination_tiles = self.tiles_of(destinations)
+        node_offsets = self.node_offsets
+        overlay_offsets = self.overlay_offsets
+        overlay_nodes = self.overlay_nodes
+        number_of_overlay_nodes = len(overlay_nodes)
+
+        routed = np.zeros(len(origins), dtype=bool)
+        pair_source = np.searchsorted(sources, origins)
+        batch = max(1, DISTANCE_BATCH_SIZE // max(number_of_overlay_nodes + 1, 1))
+        for first in range(0, len(sources), batch):
+            chunk = sources[first:first + batch]
+            distances, predecessors = self._overlay_search(chunk, from_origin)
+            for pair in np.flatnonzero(
+                (pair_source >= first) & (pair_source < first + len(chunk))
+            ).tolist():
+                origin, destination = int(origins[pair]), int(destinations[pair])
+                if origin == destination:
+                    continue
+                origin_tile = int(origin_tiles[pair])
+                destination_tile = int(destination_tiles[pair])
+                origin_local = origin - node_offsets[origin_tile]
+                destination_local = destination - node_offsets[destination_tile]
+
+                best = np.inf
+                if origin_tile == destination_tile:
+                    best = from_origin[origin][destination_local]
+                row = pair_source[pair] - first
+                exits = np.arange(
+                    overlay_offsets[destination_tile], overlay_offsets[destination_tile + 1]
+                )
+                exit_position = -1
+                if len(exits):
+                    via_overlay = distances[row, exits] + to_destination[destination][
+                        overlay_nodes[exits] - node_offsets[destination_tile]
+                    ]
+                    position = int(np.argmin(via_overlay))
+                    if via_overlay[position] < best:
+                        best, exit_position = via_overlay[position], position
+                if not np.isfinite(best):
+                    continue
+                routed[pair] = True
+                if exit_position < 0:
+                    segments.append((origin_tile, origin_local, destination_local))
+                    continue
+
+                exit_node = int(exits[exit_position])
+                segments.append((
+                    destination_tile, overlay_nodes[exit_node] - node_offsets[destination_tile],
+                    destination_local,
+                ))
+                path = [exit_node]
+                while predecessors[row, path[-1]] < number_of_overlay_nodes:
+                    path.append(int(predecessors[row, path[-1]]))
+                entry = path[-1]
+                segments.append((
+                    origin_tile, origin_local, overlay_nodes[entry] - node_offsets[origin_tile],
+                ))
+                path.reverse()
+                self._unpack_overlay(path, loads, segments)
+        return routed
+
+    def _overlay_search(self, sources, from_origin):
+        """
+        Runs Dijkstra on the overlay graph from several origins. Every origin is added as
+        an extra node connected to the boundary nodes of its tile by its distances to them
+        inside the tile.
+        :param sources: array of distinct origin partition indices
+        :param from_origin: distances inside their tiles from the origins
+        :return tuple: distances and predecessors of the overlay nodes and the extra nodes
+        """
+        number_of_overlay_nodes = len(self.overlay_nodes)
+        tails, heads, weights = [self.overlay_tails], [self.overlay_heads], [
+            self.overlay_weights
+        ]
+        for position, (source, tile) in enumerate(
+            zip(sources.tolist(), self.tiles_of(sources).tolist())
+        ):
+            boundary = np.arange(self.overlay_offsets[tile], self.overlay_offsets[tile + 1])
+            distances = from_origin[source][
+                self.overlay_nodes[boundary] - self.node_offsets[tile]
+            ]
+            reached = np.isfinite(distances)
+            tails.append(np.full(int(reached.sum()), number_of_overlay_nodes + position))
+            heads.append(boundary[reached])
+            weights.append(distances[reached])
+        size = number_of_overlay_nodes + len(sources)
+        matrix = csr_matrix(
+            (np.concatenate(weights), (np.concatenate(tails), np.concatenate(heads))),
+            shape=(size, size),
+        )
+        distances, predecessors = dijkstra(
+            matrix, directed=True, indices=number_of_overlay_nodes + np.arange(len(sources)),
+            return_predecessors=True,
+        )
+        return np.atleast_2d(distances), np.atleast_2d(predecessors)
+
+    def _unpack_overlay(self, path, loads, segments):
+        """
+        Adds the edges between tiles of an overlay route to 'loads' and its distances
+        inside tiles to 'segments'.
+        :param path: overlay node indices of the route
+        :param loads: integer array with one load per edge id
+        :param segments: list of tuples of tile, local start and local end
+        """
+        if len(path) < 2:
+            return
+        number_of_overlay_nodes = len(self.overlay_nodes)
+        path = np.asarray(path)
+        keys = path[:-1] * number_of_overlay_nodes + path[1:]
+        kinds = self.overlay_kinds[np.searchsorted(self.overlay_keys, keys)]
+        cut = kinds >= 0
+        loads[kinds[cut]] += 1
+        tiles = -1 - kinds[~cut]
+        starts = self.node_offsets[tiles]
+        segments.extend(zip(
+            tiles.tolist(), (self.overlay_nodes[path[:-1][~cut]] - starts).tolist(),
+            (self.overlay_nodes[path[1:][~cut]] - starts).tolist(),
+        ))
+
+
+def partitioned_edge_loads(partition, sampler, number_of_routes, per_origin=1, seed=None):
+    """
+    Generates random routes on a partitioned graph and sums their edge loads. Route ends
+    are sampled and snapped in batches of at most ROUTE_BATCH_SIZE pairs; pairs snapped to
+    the same node or without a route are rejected and resampled. The loads are kept in a
+    temporary file, so their memory does not grow with the number of edges either.
+    :param partition: PartitionedGraph
+    :param sampler: point sampler of the study area with a method sample(number, rng)
+    :param number_of_routes: number of routes
+    :param per_origin: number of destinations per origin. Default 1
+    :param seed: seed of the random routes. Default None uses fresh entropy
+    :return tuple: memory-mapped edge loads (one integer per edge id), number of sampling
+    rounds and rejected pairs
+    """
+    rng = np.random.default_rng(seed)
+    loads = np.memmap(
+        tempfile.TemporaryFile(), dtype=np.int64, mode="w+",
+        shape=(max(partition.number_of_edges, 1),),
+    )[:partition.number_of_edges]
+    count = rounds = rejected = 0
+    while count < number_of_routes:
+        rounds += 1
+        missing = min(number_of_routes - count, ROUTE_BATCH_SIZE)
+        number_of_origins = -(-missing // per_origin)
+        x, y = sampler.sample(number_of_origins * (per_origin + 1), rng)
+        nodes = partition.nearest(x, y)
+        origins = np.repeat(nodes[:number_of_origins], per_origin)[:missing]
+        destinations = nodes[number_of_origins:][:missing]
+        valid = (origins >= 0) & (destinations >= 0)
+        routed = int(partition.route_loads(origins[valid], destinations[valid], loads).sum())
+        count += routed
+        rejected += missing - routed
+    return loads, rounds, rejected
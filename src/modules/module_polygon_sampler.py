@@ -0,0 +1,83 @@
+"""
+Module to sample uniformly distributed random points in a polygon.
+"""
+
+import numpy as np
+import shapely
+
+# Approximate number of grid cells covering the bounding box of the polygon
+GRID_CELLS = 4096
+
+
+class PolygonSampler:
+    """
+    Uniform point sampler for a (multi)polygon, built once per study area. The bounding box
+    is divided into a grid and only cells intersecting the polygon are kept. Points are
+    drawn uniformly from the kept cells; points in cells completely inside the polygon are
+    accepted directly, points in boundary cells are tested against the prepared polygon.
+    """
+    def __init__(self, polygon, grid_cells=GRID_CELLS):
+        """
+        Initializes the sampler for a polygon.
+        :param polygon: shapely Polygon or MultiPolygon
+        :param grid_cells: approximate number of grid cells. Default GRID_CELLS
+        """
+        if polygon.is_empty or polygon.area == 0:
+            raise ValueError("Cannot sample points in an empty polygon.")
+        self.polygon = polygon
+        shapely.prepare(self.polygon)
+
+        minx, miny, maxx, maxy = polygon.bounds
+        width, height = maxx - minx, maxy - miny
+        columns = max(1, int(np.ceil(np.sqrt(grid_cells * width / height))))
+        rows = max(1, int(np.ceil(grid_cells / columns)))
+        self.cell_width = width / columns
+        self.cell_height = height / rows
+
+        cell_x, cell_y = np.meshgrid(
+            minx + np.arange(columns) * self.cell_width,
+            miny + np.arange(rows) * self.cell_height,
+        )
+        cell_x, cell_y = cell_x.ravel(), cell_y.ravel()
+        cells = shapely.box(
+            cell_x, cell_y, cell_x + self.cell_width, cell_y + self.cell_height
+        )
+        kept = shapely.intersects(self.polygon, cells)
+        self.cell_x = cell_x[kept]
+        self.cell_y = cell_y[kept]
+        self.cell_inside = shapely.contains(self.polygon, cells[kept])
+
+    @property
+    def acceptance_ratio(self):
+        """
+        :return float: expected share of drawn points that lie inside the polygon
+        """
+        return self.polygon.area / (len(self.cell_x) * self.cell_width * self.cell_height)
+
+    def sample(self, number, rng=np.random):
+        """
+        Draws uniformly distributed random points in the polygon.
+        :param number: number of points
+        :param rng: numpy random Generator or the np.random module. Default np.random
+        :return tuple: arrays of x and y coordinates
+        """
+        x = np.empty(number)
+        y = np.empty(number)
+        pending = np.arange(number)
+        while len(pending):
+            # Oversample by the expected rejection rate to finish in few rounds
+            draws = int(np.ceil(len(pending) / self.acceptance_ratio)) + 16
+            cells = (rng.random(draws) * len(self.cell_x)).astype(np.int64)
+            draw_x = self.cell_x[cells] + rng.random(draws) * self.cell_width
+            draw_y = self.cell_y[cells] + rng.random(draws) * self.cell_height
+
+            accepted = self.cell_inside[cells]
+            boundary = np.flatnonzero(~accepted)
+            accepted[boundary] = shapely.contains_xy(
+                self.polygon, draw_x[boundary], draw_y[boundary]
+            )
+            accepted = np.flatnonzero(accepted)[:len(pending)]
+            x[pending[:len(accepted)]] = draw_x[accepted]
+            y[pending[:len(accepted)]] = draw_y[accepted]
+            pending = pending[len(accepted):]
+        return x, y
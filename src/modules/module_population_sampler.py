@@ -0,0 +1,151 @@
+"""
+Module to sample points weighted by the population of a raster (e.g. GHS_POP).
+"""
+
+import numpy as np
+from pyproj import CRS, Transformer
+from shapely.ops import transform as transform_geometry
+
+try:
+    import rasterio
+    from rasterio.features import geometry_mask, geometry_window
+except ImportError:  # pragma: no cover - optional dependency
+    rasterio = None
+
+
+class AliasTable:
+    """
+    Walker's alias table (Vose's construction) to draw indices with given weights in
+    constant time per draw.
+    """
+    def __init__(self, weights):
+        """
+        Builds the alias table in linear time.
+        :param weights: non-negative weight of every index, at least one positive
+        :raises ValueError: If no weight is positive or a weight is negative
+        """
+        weights = np.asarray(weights, dtype=np.float64)
+        if len(weights) == 0 or (weights < 0).any() or not weights.sum() > 0:
+            raise ValueError("Alias tables require non-negative weights with a positive sum.")
+        number = len(weights)
+        probability = (weights * (number / weights.sum())).tolist()
+        alias = list(range(number))
+        small = [i for i, p in enumerate(probability) if p < 1.0]
+        large = [i for i, p in enumerate(probability) if p >= 1.0]
+        while small and large:
+            less = small.pop()
+            more = large[-1]
+            alias[less] = more
+            probability[more] += probability[less] - 1.0
+            if probability[more] < 1.0:
+                small.append(large.pop())
+        # Remaining entries are 1 up to rounding errors
+        for i in small + large:
+            probability[i] = 1.0
+        self.probability = np.array(probability)
+        self.alias = np.array(alias, dtype=np.int64)
+
+    def __len__(self):
+        """
+        :return int: number of indices
+        """
+        return len(self.alias)
+
+    def sample(self, number, rng=np.random):
+        """
+        Draws indices with probabilities proportional to their weights.
+        :param number: number of draws
+        :param rng: numpy random Generator or the np.random module. Default np.random
+        :return np.ndarray: drawn indices
+        """
+        indices = (rng.random(number) * len(self.alias)).astype(np.int64)
+        keep = rng.random(number) < self.probability[indices]
+        return np.where(keep, indices, self.alias[indices])
+
+
+class PopulationSampler:
+    """
+    Samples points in the populated raster cells of a study area, weighted by the
+    population of the cells. A cell is chosen from an alias table and the point is placed
+    uniformly within the cell.
+    """
+    def __init__(self, cell_x, cell_y, population, cell_width, cell_height, crs):
+        """
+        Initializes the sampler from the populated cells.
+        :param cell_x: x coordinate of the center of every cell in the raster CRS
+        :param cell_y: y coordinate of the center of every cell in the raster CRS
+        :param population: population of every cell
+        :param cell_width: width of the cells in the raster CRS
+        :param cell_height: height of the cells in the raster CRS
+        :param crs: CRS of the raster, as WKT or EPSG string
+        """
+        self.cell_x = np.asarray(cell_x, dtype=np.float64)
+        self.cell_y = np.asarray(cell_y, dtype=np.float64)
+        self.population = np.asarray(population, dtype=np.float64)
+        self.cell_width = cell_width
+        self.cell_height = cell_height
+        self.crs = crs
+        self.table = AliasTable(self.population)
+        self._transformer = None
+
+    @classmethod
+    def from_raster(cls, raster_path, polygon, polygon_crs="EPSG:4326"):
+        """
+        Reads only the raster window covering the polygon and keeps the populated cells
+        whose center lies in the polygon.
+        :param raster_path: path of a single band population raster
+        :param polygon: shapely polygon of the study area
+        :param polygon_crs: CRS of the polygon. Default "EPSG:4326"
+        :return PopulationSampler: sampler of the study area
+        :raises ImportError: If rasterio is not installed
+        :raises ValueError: If the study area contains no population
+        """
+        if rasterio is None:
+            raise ImportError("Population sampling requires the rasterio package.")
+        with rasterio.open(raster_path) as raster:
+            if raster.transform.b != 0 or raster.transform.d != 0:
+                raise ValueError("Rotated population rasters are not supported.")
+            raster_crs = raster.crs.to_wkt()
+            if not CRS.from_user_input(polygon_crs).equals(CRS.from_wkt(raster_crs)):
+                to_raster = Transformer.from_crs(polygon_crs, raster_crs, always_xy=True)
+                polygon = transform_geometry(to_raster.transform, polygon)
+            window = geometry_window(raster, [polygon])
+            population = raster.read(1, window=window, masked=True).filled(0)
+            window_transform = raster.window_transform(window)
+
+        inside = geometry_mask(
+            [polygon], out_shape=population.shape, transform=window_transform, invert=True
+        )
+        rows, columns = np.nonzero(inside & (population > 0))
+        if len(rows) == 0:
+            raise ValueError("The study area contains no population.")
+        cell_x = window_transform.c + (columns + 0.5) * window_transform.a
+        cell_y = window_transform.f + (rows + 0.5) * window_transform.e
+        return cls(
+            cell_x, cell_y, population[rows, columns],
+            abs(window_transform.a), abs(window_transform.e), raster_crs,
+        )
+
+    def sample(self, number, rng=np.random):
+        """
+        Samples points weighted by population.
+        :param number: number of points
+        :param rng: numpy random Generator or the np.random module. Default np.random
+        :return tuple: arrays of longitudes and latitudes (EPSG:4326)
+        """
+        cells = self.table.sample(number, rng)
+        x = self.cell_x[cells] + (rng.random(number) - 0.5) * self.cell_width
+        y = self.cell_y[cells] + (rng.random(number) - 0.5) * self.cell_height
+        if self._transformer is None:
+            self._transformer = Transformer.from_crs(self.crs, "EPSG:4326", always_xy=True)
+        longitude, latitude = self._transformer.transform(x, y)
+        return np.asarray(longitude), np.asarray(latitude)
+
+    def __getstate__(self):
+        """
+        Pickles the sampler without its coordinate transformer, e.g. for the disk cache.
+        :return dict: state of the sampler
+        """
+        state = self.__dict__.copy()
+        state["_transformer"] = None
+        return state
@@ -0,0 +1,392 @@
+"""
+Module to generate the edge loads of random routes. The route ends are sampled in blocks
+with their own random streams derived from one seed and the routes are solved in chunks of
+origins, so a run is reproducible and can be spread over worker processes.
+"""
+
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+import numpy as np
+import networkx as nx
+import osmnx as ox
+from scipy.stats import spearmanr
+from .module_route_trees import tree_route_loads
+from .module_brandes import CHUNKS_PER_WORKER
+
+# Number of routes per sampling block. Every block draws from its own random stream, so the
+# routes depend on the seed and the block size but not on the number of workers.
+ROUTE_BLOCK_SIZE = 1000
+
+# Number of consecutive stable batches which end the adaptive route generation
+ADAPTIVE_PATIENCE = 2
+
+# Shared random route generator of a worker process
+_worker_routes = None
+
+
+def sample_od_pairs(sampler, locator, reachability, number, per_origin=1, rng=np.random):
+    """
+    Samples origin and destination nodes in batches. All points of a batch are sampled and
+    snapped to their nearest nodes at once; pairs with identical nodes or without a route
+    (checked on the strongly connected components) are rejected and resampled. Every origin
+    is paired with 'per_origin' destinations.
+    :param sampler: point sampler of the study area with a method sample(number, rng)
+    :param locator: NodeLocator of the graph
+    :param reachability: ReachabilityIndex of the graph
+    :param number: number of origin destination pairs
+    :param per_origin: number of destinations per origin. Default 1
+    :param rng: numpy random Generator or the np.random module. Default np.random
+    :return tuple: arrays of origin and destination node indices, number of sampling rounds
+    and number of rejected pairs
+    """
+    origins = [np.zeros(0, dtype=np.int64)]
+    destinations = [np.zeros(0, dtype=np.int64)]
+    missing = number
+    rounds = rejected = 0
+    while missing > 0:
+        rounds += 1
+        number_of_origins = -(-missing // per_origin)
+        x, y = sampler.sample(number_of_origins * (per_origin + 1), rng)
+        nodes = locator.nearest(x, y)
+        origin_nodes = np.repeat(nodes[:number_of_origins], per_origin)
+        destination_nodes = nodes[number_of_origins:]
+        valid = origin_nodes != destination_nodes
+        valid[valid] = reachability.reachable(origin_nodes[valid], destination_nodes[valid])
+        rejected += int((~valid).sum())
+        origin_nodes = origin_nodes[valid][:missing]
+        destination_nodes = destination_nodes[valid][:missing]
+        origins.append(origin_nodes)
+        destinations.append(destination_nodes)
+        missing -= len(origin_nodes)
+    return np.concatenate(origins), np.concatenate(destinations), rounds, rejected
+
+
+def load_stability(previous_loads, loads, top_n=100):
+    """
+    Compares the edge loads before and after a batch of routes.
+    :param previous_loads: edge loads before the batch
+    :param loads: edge loads after the batch
+    :param top_n: number of most used edges compared. Default 100
+    :return tuple: Spearman rank correlation of the loads of all edges used before or after
+    the batch, and the share of the top_n edges after the batch which were among the top_n
+    edges before
+    """
+    used = np.flatnonzero((previous_loads > 0) | (loads > 0))
+    if len(used) < 2:
+        return 0.0, 0.0
+    correlation = spearmanr(previous_loads[used], loads[used])[0]
+    top = min(top_n, len(used))
+    previous_top = set(np.argsort(-previous_loads, kind="stable")[:top].tolist())
+    current_top = set(np.argsort(-loads, kind="stable")[:top].tolist())
+    overlap = len(previous_top & current_top) / top
+    return (0.0 if np.isnan(correlation) else float(correlation)), overlap
+
+
+def route_blocks(number_of_routes, seed_sequence, block_size=ROUTE_BLOCK_SIZE):
+    """
+    Splits routes into sampling blocks, each with an independent random stream spawned from
+    the seed sequence of the run. Spawning again continues with new streams.
+    :param number_of_routes: number of routes
+    :param seed_sequence: np.random.SeedSequence of the run
+    :param block_size: maximum number of routes per block. Default ROUTE_BLOCK_SIZE
+    :return list: tuples of the number of routes and the SeedSequence of every block
+    """
+    numbers = [
+        min(block_size, number_of_routes - start)
+        for start in range(0, number_of_routes, block_size)
+    ]
+    return list(zip(numbers, seed_sequence.spawn(len(numbers))))
+
+
+class RandomRoutes:
+    """
+    Read-only inputs of the random routes on one graph version. They are transferred to
+    every worker process once, which then receives sampling blocks and chunks of pairs.
+    """
+    def __init__(
+        self, csr_graph, sampler, locator, reachability, per_origin=1, routing="tree",
+        graph=None, weight=None, hierarchy=None,
+    ):
+        """
+        Initializes the route generator.
+        :param csr_graph: CsrGraph with the routing weight
+        :param sampler: point sampler of the study area with a method sample(number, rng)
+        :param locator: NodeLocator of the graph
+        :param reachability: ReachabilityIndex of the graph
+        :param per_origin: number of destinations per origin. Default 1
+        :param routing: "tree" routes with one shortest path tree per origin,
+        "shortest_path" every route with ox.shortest_path, "ch" every route with the
+        contraction hierarchy. Default "tree"
+        :param graph: Networkx graph of "shortest_path" routing. Default None
+        :param weight: edge attribute or weight function of "shortest_path" routing.
+        Default None
+        :param hierarchy: ContractionHierarchy of the CSR graph of "ch" routing. Default None
+        """
+        self.csr_graph = csr_graph
+        self.sampler = sampler
+        self.locator = locator
+        self.reachability = reachability
+        self.per_origin = per_origin
+        self.routing = routing
+        self.graph = graph
+        self.weight = weight
+        self.hierarchy = hierarchy
+
+    def sample_block(self, block):
+        """
+        Samples the origin destination pairs of one block from its random stream.
+        :param block: tuple of the number of pairs and the SeedSequence of the block
+        :return tuple: origin and destination node indices, sampling rounds, rejected pairs
+        """
+        number, seed_sequence = block
+        return sample_od_pairs(
+            self.sampler, self.locator, self.reachability, number, self.per_origin,
+            np.random.default_rng(seed_sequence),
+        )
+
+    def route_loads(self, pairs):
+        """
+        Routes origin destination pairs and counts how often every edge is used.
+        :param pairs: tuple of origin and destination node indices
+        :return tuple: edge loads (one integer per edge id) and the number of routed pairs
+        """
+        origins, destinations = pairs
+        if self.routing == "tree":
+            loads, routed = tree_route_loads(self.csr_graph, origins, destinations)
+            return loads, int(routed.sum())
+        if self.routing == "ch":
+            return self.hierarchy.route_loads(self.csr_graph, origins, destinations)
+        loads = np.zeros(self.csr_graph.number_of_edges, dtype=np.int64)
+        count = 0
+        nodes = self.csr_graph.nodes
+        for origin_node, destination_node in zip(
+            nodes[origins].tolist(), nodes[destinations].tolist()
+        ):
+            if callable(self.weight):
+                # ox.shortest_path only checks edge attributes, not weight functions
+                try:
+                    route = nx.shortest_path(
+                        self.graph, origin_node, destination_node, weight=self.weight,
+                        method="dijkstra",
+                    )
+                except nx.NetworkXNoPath:
+                    continue
+            else:
+                route = ox.shortest_path(
+                    self.graph, origin_node, destination_node, weight=self.weight
+                )
+                if route is None:
+                    continue
+            # A shortest route passes every edge at most once
+            loads[self.csr_graph.route_edges(route)] += 1
+            count += 1
+        return loads, count
+
+    def route_chunks(self, origins, destinations, number_of_chunks):
+        """
+        Splits pairs into chunks for the workers. In "tree" routing all pairs of an origin
+        stay in one chunk, so every shortest path tree is computed once.
+        :param origins: array of origin node indices
+        :param destinations: array of destination node indices
+        :param number_of_chunks: number of chunks
+        :return list: tuples of origin and destination node indices
+        """
+        if number_of_chunks <= 1:
+            return [(origins, destinations)]
+        if self.routing == "tree":
+            sources, pair_sources = np.unique(origins, return_inverse=True)
+            chunk_of_pair = pair_sources * number_of_chunks // max(len(sources), 1)
+        else:
+            chunk_of_pair = np.arange(len(origins)) % number_of_chunks
+        return [
+            (origins[chunk_of_pair == chunk], destinations[chunk_of_pair == chunk])
+            for chunk in range(number_of_chunks)
+        ]
+
+    def worker_pool(self, workers):
+        """
+        Creates a pool of worker processes which hold this route generator. The generator
+        is sent to every worker once, when the worker starts.
+        :param workers: number of worker processes
+        :return ProcessPoolExecutor or None: pool, None if 'workers' is not above 1
+        """
+        if workers <= 1:
+            return None
+        return ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_worker, initargs=(self,)
+        )
+
+    def edge_loads(
+        self, number_of_routes, seed=None, workers=1, block_size=ROUTE_BLOCK_SIZE, pool=None,
+    ):
+        """
+        Generates the random routes and sums their edge loads. The pairs are sampled block
+        by block and routed in chunks, on a pool of worker processes if 'workers' is above 1.
+        Pairs without a route are replaced from new blocks. The loads only depend on the
+        seed, the number of routes and the block size, not on the number of workers.
+        :param number_of_routes: number of routes
+        :param seed: seed or np.random.SeedSequence of the run. Default None uses fresh
+        entropy
+        :param workers: number of worker processes. Default 1
+        :param block_size: maximum number of routes per sampling block. Default
+        ROUTE_BLOCK_SIZE
+        :param pool: pool from 'worker_pool' to route on. Default None creates a pool of
+        'workers' processes for this call
+        :return tuple: edge loads (one integer per edge id), number of sampling blocks,
+        sampling rounds and rejected pairs
+        """
+        seed_sequence = seed
+        if not isinstance(seed, np.random.SeedSequence):
+            seed_sequence = np.random.SeedSequence(seed)
+        loads = np.zeros(self.csr_graph.number_of_edges, dtype=np.int64)
+        count = number_of_blocks = rounds = rejected = 0
+        context = nullcontext()
+        if pool is None and workers > 1 and number_of_routes > 0:
+            pool = self.worker_pool(workers)
+            context = pool or context
+        with context:
+            while count < number_of_routes:
+                blocks = route_blocks(number_of_routes - count, seed_sequence, block_size)
+                number_of_blocks += len(blocks)
+                if pool is None:
+                    samples = list(map(self.sample_block, blocks))
+                    chunks = self.route_chunks(*self._join_samples(samples), 1)
+                    results = map(self.route_loads, chunks)
+                else:
+                    samples = list(pool.map(_worker_sample_block, blocks))
+                    chunks = self.route_chunks(
+                        *self._join_samples(samples), workers * CHUNKS_PER_WORKER
+                    )
+                    results = pool.map(_worker_route_loads, chunks)
+                for chunk_loads, routed in results:
+                    loads += chunk_loads
+                    count += routed
+                rounds += sum(sample[2] for sample in samples)
+                rejected += sum(sample[3] for sample in samples)
+        return loads, number_of_blocks, rounds, rejected
+
+    def adaptive_edge_loads(
+        self, batch_size, tolerance=0.01, time_budget=None, max_routes=None, top_n=100,
+        seed=None, workers=1, patience=ADAPTIVE_PATIENCE,
+    ):
+        """
+        Adds batches of random routes until the edge loads are stable, the time budget is
+        used up or max_routes are reached; the last batch is cut to the remaining routes. The
+        worker processes are started once for all batches. A batch is stable if the rank
+        correlation of the edge loads before and after it is at least 1 - tolerance and at
+        most a share of 'tolerance' of the top_n edges changed; 'patience' stable batches in
+        a row end the generation. Every batch draws from its own random streams, so the
+        result only depends on the seed and the number of batches.
+        :param batch_size: number of routes per batch
+        :param tolerance: accepted change of the rank correlation and the top_n edges per
+        batch. Default 0.01
+        :param time_budget: maximum run time in seconds, checked after every batch.
+        Default None
+        :param max_routes: maximum total number of routes. Default None
+        :param top_n: number of most used edges compared between batches. Default 100
+        :param seed: seed of the run. Default None uses fresh entropy
+        :param workers: number of worker processes. Default 1
+        :param patience: number of stable batches in a row required. Default 2
+        :return tuple: edge loads (one integer per edge id) and a dictionary describing the
+        convergence: routes, batches, converged, stop_reason ("tolerance", "time_budget" or
+        "max_routes"), the last rank_correlation and top_overlap and the history of batches
+        :raises ValueError: If a parameter is out of range or a tolerance of 0 is given
+        without a time budget or max_routes, as the generation might never end
+        """
+        if batch_size < 1:
+            raise ValueError("The batch size must be at least 1.")
+        if not 0 <= tolerance < 1:
+            raise ValueError("The tolerance must be at least 0 and below 1.")
+        if max_routes is not None and max_routes < 1:
+            raise ValueError("The maximum number of routes must be at least 1.")
+        if tolerance == 0 and time_budget is None and max_routes is None:
+            raise ValueError("A tolerance of 0 requires a time budget or max_routes.")
+        start = time.perf_counter()
+        seed_sequence = np.random.SeedSequence(seed)
+        loads = np.zeros(self.csr_graph.number_of_edges, dtype=np.int64)
+        history = []
+        stable_batches = 0
+        routes = 0
+        pool = self.worker_pool(workers)
+        with pool or nullcontext():
+            while True:
+                size = batch_size
+                if max_routes is not None:
+                    size = min(size, max_routes - routes)
+                batch_loads = self.edge_loads(
+                    size, seed=seed_sequence.spawn(1)[0], workers=workers, pool=pool
+                )[0]
+                previous_loads, loads = loads, loads + batch_loads
+                routes += size
+                record = {
+                    "routes": routes,
+                    "seconds": time.perf_counter() - start,
+                    "rank_correlation": None,
+                    "top_overlap": None,
+                }
+                if history:
+                    correlation, overlap = load_stability(previous_loads, loads, top_n)
+                    record.update(rank_correlation=correlation, top_overlap=overlap)
+                    stable = correlation >= 1 - tolerance and overlap >= 1 - tolerance
+                    stable_batches = stable_batches + 1 if stable else 0
+                history.append(record)
+
+                stop_reason = None
+                if stable_batches >= patience:
+                    stop_reason = "tolerance"
+                elif time_budget is not None and record["seconds"] >= time_budget:
+                    stop_reason = "time_budget"
+                elif max_routes is not None and routes >= max_routes:
+                    stop_reason = "max_routes"
+                if stop_reason is not None:
+                    break
+        return loads, {
+            "routes": history[-1]["routes"],
+            "batches": len(history),
+            "converged": stop_reason == "tolerance",
+            "stop_reason": stop_reason,
+            "tolerance": tolerance,
+            "top_n": top_n,
+            "rank_correlation": history[-1]["rank_correlation"],
+            "top_overlap": history[-1]["top_overlap"],
+            "history": history,
+        }
+
+    @staticmethod
+    def _join_samples(samples):
+        """
+        Joins the pairs of sampling blocks in block order.
+        :param samples: results of 'sample_block'
+        :return tuple: origin and destination node indices of all blocks
+        """
+        origins = np.concatenate([sample[0] for sample in samples])
+        destinations = np.concatenate([sample[1] for sample in samples])
+        return origins, destinations
+
+
+def _init_worker(random_routes):
+    """
+    Stores the shared route generator in a worker process.
+    :param random_routes: RandomRoutes
+    """
+    global _worker_routes
+    _worker_routes = random_routes
+
+
+def _worker_sample_block(block):
+    """
+    Samples the pairs of one block inside a worker process.
+    :param block: tuple of the number of pairs and the SeedSequence of the block
+    :return tuple: origin and destination node indices, sampling rounds, rejected pairs
+    """
+    return _worker_routes.sample_block(block)
+
+
+def _worker_route_loads(pairs):
+    """
+    Routes a chunk of pairs inside a worker process.
+    :param pairs: tuple of origin and destination node indices
+    :return tuple: edge loads and the number of routed pairs
+    """
+    return _worker_routes.route_loads(pairs)
@@ -0,0 +1,70 @@
+"""
+Module to answer reachability queries between graph nodes with strongly connected components.
+"""
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import breadth_first_order
+
+
+class ReachabilityIndex:
+    """
+    Reachability index of a directed graph. Nodes of the same strongly connected component
+    reach each other; for other pairs the condensation DAG of the components is searched
+    once per origin component and the result is cached.
+    """
+    def __init__(self, csr_graph):
+        """
+        Initializes the index from the strongly connected components of a CsrGraph.
+        :param csr_graph: CsrGraph
+        """
+        self.labels = csr_graph.component_labels("strong")
+        number_of_components = int(self.labels.max()) + 1 if len(self.labels) else 0
+        self.component_sizes = np.bincount(self.labels, minlength=number_of_components)
+        self.largest_component = int(self.component_sizes.argmax()) if len(self.labels) else 0
+
+        tails = self.labels[csr_graph.sources]
+        heads = self.labels[csr_graph.targets]
+        between = tails != heads
+        self.condensation = csr_matrix(
+            (np.ones(int(between.sum()), dtype=np.int8), (tails[between], heads[between])),
+            shape=(number_of_components, number_of_components),
+        )
+        self._reachable_components = {}
+
+    def largest_component_nodes(self):
+        """
+        :return np.ndarray: node indices of the largest strongly connected component
+        """
+        return np.flatnonzero(self.labels == self.largest_component)
+
+    def reachable_components(self, component):
+        """
+        Returns the components reachable from a component, searched once per component.
+        :param component: label of the origin component
+        :return np.ndarray: boolean array over all component labels
+        """
+        if component not in self._reachable_components:
+            order = breadth_first_order(
+                self.condensation, component, directed=True, return_predecessors=False
+            )
+            reachable = np.zeros(len(self.component_sizes), dtype=bool)
+            reachable[order] = True
+            self._reachable_components[component] = reachable
+        return self._reachable_components[component]
+
+    def reachable(self, origins, destinations):
+        """
+        Checks for every pair whether the destination can be reached from the origin.
+        :param origins: array of origin node indices
+        :param destinations: array of destination node indices
+        :return np.ndarray: boolean array, True if a route exists
+        """
+        origin_labels = self.labels[origins]
+        destination_labels = self.labels[destinations]
+        result = origin_labels == destination_labels
+        other = np.flatnonzero(~result)
+        for component in np.unique(origin_labels[other]).tolist():
+            pairs = other[origin_labels[other] == component]
+            result[pairs] = self.reachable_components(component)[destination_labels[pairs]]
+        return result
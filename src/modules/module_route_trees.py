@@ -0,0 +1,62 @@
+"""
+Module to count the edges of many shortest routes using one shortest path tree per origin.
+"""
+
+import numpy as np
+from scipy.sparse.csgraph import dijkstra
+from .module_brandes import DISTANCE_BATCH_SIZE
+
+
+def tree_route_loads(csr_graph, origins, destinations, demand=None):
+    """
+    Counts how often every edge is used by the shortest routes between origin destination
+    pairs, or sums the demand of the pairs routed over every edge. Pairs are grouped by
+    origin, one shortest path tree is computed per distinct origin (in batches by the
+    compiled Dijkstra of scipy) and the routes of all pairs of a batch are unwound from the
+    predecessor trees at the same time. If several routes are equally short, the tree may
+    choose a different one than ox.shortest_path.
+    :param csr_graph: CsrGraph with the routing weight
+    :param origins: array of origin node indices
+    :param destinations: array of destination node indices
+    :param demand: demand of every pair. Default None counts every pair once
+    :return tuple: edge loads (one integer per edge id, floats if 'demand' is given) and a
+    boolean array marking the pairs that are connected by a route
+    """
+    origins = np.asarray(origins, dtype=np.int64)
+    destinations = np.asarray(destinations, dtype=np.int64)
+    collapsed = csr_graph.collapsed()
+    if demand is None:
+        loads = np.zeros(csr_graph.number_of_edges, dtype=np.int64)
+        demand = np.ones(len(origins), dtype=np.int64)
+    else:
+        loads = np.zeros(csr_graph.number_of_edges, dtype=np.float64)
+        demand = np.asarray(demand, dtype=np.float64)
+    routed = np.zeros(len(origins), dtype=bool)
+    sources, pair_rows = np.unique(origins, return_inverse=True)
+
+    batch = max(1, DISTANCE_BATCH_SIZE // max(csr_graph.number_of_nodes, 1))
+    for start in range(0, len(sources), batch):
+        chunk = sources[start:start + batch]
+        _, predecessors = dijkstra(
+            collapsed.matrix, directed=True, indices=chunk, return_predecessors=True
+        )
+        predecessors = np.atleast_2d(predecessors)
+
+        selected = np.flatnonzero((pair_rows >= start) & (pair_rows < start + len(chunk)))
+        rows = pair_rows[selected] - start
+        current = destinations[selected]
+        reached = (predecessors[rows, current] >= 0) & (current != origins[selected])
+        routed[selected] = reached
+        rows, current = rows[reached], current[reached]
+        amounts = demand[selected[reached]]
+
+        # Step all routes of the batch back towards their origins at once
+        while len(current):
+            previous = predecessors[rows, current]
+            active = previous >= 0
+            rows, previous, current = rows[active], previous[active], current[active]
+            amounts = amounts[active]
+            edges = collapsed.route_edge[collapsed.pair_index(previous, current)]
+            np.add.at(loads, edges, amounts)
+            current = previous
+    return loads, routed
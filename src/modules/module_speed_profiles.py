@@ -0,0 +1,429 @@
+"""
+Module to calculate edge speeds and travel times of speed profiles as NumPy arrays.
+"""
+
+import re
+import numpy as np
+from .module_csr_graph import CsrGraph
+from .module_options import DEFAULT_SPEED_PROFILE
+
+# Number of edges read from memory-mapped arrays at once
+CHUNK_SIZE = 2 ** 20
+# Kilometers per mile, to convert maxspeeds in mph
+MILES_TO_KM = 1.60934
+# Valid OSM maxspeed value of one lane, the same pattern as ox.add_edge_speeds uses
+MAXSPEED_PATTERN = re.compile(r"^([0-9][\.,0-9]+?)(?:[ ]?(?:km/h|kmh|kph|mph|knots))?$")
+
+# Typical speeds in km/h per highway class, used for edges without a maxspeed
+HWY_SPEEDS = {
+    "motorway": 100,
+    "motorway_link": 60,
+    "motorroad": 90,
+    "trunk": 85,
+    "trunk_link": 60,
+    "primary": 65,
+    "primary_link": 50,
+    "secondary": 60,
+    "secondary_link": 50,
+    "tertiary": 50,
+    "tertiary_link": 40,
+    "unclassified": 30,
+    "residential": 30,
+    "living_street": 10,
+    "service": 20,
+    "road": 20,
+    "track": 15,
+}
+
+# Congestion factors of the rush hour speeds per highway class. Arterial roads carrying the
+# commuter traffic are slowed down most, residential streets hardly
+RUSH_HOUR_FACTORS = {
+    "motorway": 0.6,
+    "motorway_link": 0.5,
+    "motorroad": 0.6,
+    "trunk": 0.55,
+    "trunk_link": 0.5,
+    "primary": 0.45,
+    "primary_link": 0.45,
+    "secondary": 0.5,
+    "secondary_link": 0.5,
+    "tertiary": 0.65,
+    "tertiary_link": 0.65,
+    "unclassified": 0.85,
+    "residential": 0.9,
+    "living_street": 1.0,
+    "service": 0.9,
+}
+
+
+class SpeedProfile:
+    """
+    Named rule to derive edge speeds. Speeds are imputed like ox.add_edge_speeds (maxspeed
+    if tagged, else the speed of the highway class) and then scaled by the factor of their
+    highway class and capped.
+    """
+    def __init__(self, name, hwy_speeds, factor=1.0, max_speed=None, class_factors=None):
+        """
+        Initializes a speed profile.
+        :param name: name of the profile
+        :param hwy_speeds: speed in km/h per highway class for edges without a maxspeed
+        :param factor: factor applied to the speeds of highway classes without a factor in
+        'class_factors'. Default 1.0
+        :param max_speed: upper bound for all speeds in km/h. Default None
+        :param class_factors: factor per highway class, applied to tagged and imputed speeds.
+        Default None applies 'factor' to all classes
+        """
+        self.name = name
+        self.hwy_speeds = hwy_speeds
+        self.factor = factor
+        self.max_speed = max_speed
+        self.class_factors = class_factors or {}
+
+    def factors(self, highway_names):
+        """
+        :param highway_names: highway class of every highway code
+        :return np.ndarray: speed factor per highway code, with 'factor' appended for edges
+        without a highway class (code -1)
+        """
+        return np.array(
+            [self.class_factors.get(name, self.factor) for name in highway_names]
+            + [self.factor],
+            dtype=np.float64,
+        )
+
+
+# Available speed profiles; "free_flow" reproduces ox.add_edge_speeds with HWY_SPEEDS
+SPEED_PROFILES = {
+    profile.name: profile for profile in (
+        SpeedProfile(DEFAULT_SPEED_PROFILE, HWY_SPEEDS),
+        SpeedProfile("rush_hour", HWY_SPEEDS, factor=0.8, class_factors=RUSH_HOUR_FACTORS),
+        SpeedProfile("truck", HWY_SPEEDS, max_speed=80),
+    )
+}
+
+
+def _clean_maxspeed(maxspeed):
+    """
+    Parses an OSM maxspeed string. Speeds per lane, separated by "|", are averaged and
+    speeds in mph converted to km/h.
+    :param maxspeed: maxspeed string
+    :return float or None: speed in km/h, None if the value is invalid
+    """
+    speeds = []
+    for value in maxspeed.split("|"):
+        match = MAXSPEED_PATTERN.match(value)
+        if match is None:
+            return None
+        try:
+            speed = float(match.group(1).replace(",", "."))
+        except ValueError:
+            return None
+        if "mph" in maxspeed.lower():
+            speed *= MILES_TO_KM
+        speeds.append(speed)
+    return float(np.mean(speeds))
+
+
+def maxspeed_kph(maxspeed):
+    """
+    Cleans an OSM maxspeed value the same way as ox.add_edge_speeds, without relying on
+    the private helpers of osmnx.
+    :param maxspeed: maxspeed attribute of an edge, a list of them or None
+    :return float: speed in km/h, NaN if the value is missing or invalid
+    """
+    if maxspeed is None:
+        return np.nan
+    if isinstance(maxspeed, list):
+        # Like osmnx, the mean of the valid values of merged edges is cut to whole km/h
+        speeds = [
+            speed for speed in (_clean_maxspeed(str(value)) for value in maxspeed)
+            if speed is not None
+        ]
+        if not speeds:
+            return np.nan
+        maxspeed = int(np.mean(speeds))
+    speed = _clean_maxspeed(str(maxspeed))
+    return np.nan if speed is None else speed
+
+
+def edge_speed_attributes(graph, edge_tuples):
+    """
+    Extracts the attributes edge speeds are derived from.
+    :param graph: Networkx graph object
+    :param edge_tuples: (u, v, key) tuples of the edges in edge id order
+    :return tuple: cleaned maxspeed in km/h per edge, highway code per edge (-1 if
+    missing) and the highway class of every code
+    """
+    maxspeeds = np.empty(len(edge_tuples), dtype=np.float64)
+    highway = np.empty(len(edge_tuples), dtype=np.int32)
+    highway_codes = {}
+    for i, (u, v, key) in enumerate(edge_tuples):
+        data = graph.edges[u, v, key]
+        maxspeeds[i] = maxspeed_kph(data.get("maxspeed"))
+
+        # Like ox.add_edge_speeds, only the first class of merged edges is kept
+        highway_class = data.get("highway")
+        if isinstance(highway_class, list):
+            highway_class = highway_class[0]
+        if highway_class is None:
+            highway[i] = -1
+        else:
+            highway[i] = highway_codes.setdefault(highway_class, len(highway_codes))
+    return maxspeeds, highway, list(highway_codes)
+
+
+def class_speeds(maxspeeds, highway, highway_names, profile, chunk_size=CHUNK_SIZE):
+    """
+    Returns the speed of the highway classes for edges without maxspeed: the speed of the
+    class in the profile, or the mean tagged speed of the class if the profile has none, or
+    the mean speed of all classes (as in ox.add_edge_speeds). The edge arrays are read in
+    chunks, so they may be memory-mapped.
+    :param maxspeeds: cleaned maxspeed in km/h per edge, NaN if not tagged
+    :param highway: highway code per edge, -1 if missing
+    :param highway_names: highway class of every highway code
+    :param profile: SpeedProfile
+    :param chunk_size: number of edges read at once. Default CHUNK_SIZE
+    :return np.ndarray: speed in km/h per highway code, with NaN appended for code -1
+    :raises ValueError: If there is no speed for any highway class
+    """
+    number_of_classes = len(highway_names)
+    sums = np.zeros(number_of_classes, dtype=np.float64)
+    counts = np.zeros(number_of_classes, dtype=np.int64)
+    for start in range(0, len(maxspeeds), chunk_size):
+        chunk_maxspeeds = np.asarray(maxspeeds[start:start + chunk_size])
+        chunk_highway = np.asarray(highway[start:start + chunk_size])
+        tagged = ~np.isnan(chunk_maxspeeds) & (chunk_highway >= 0)
+        sums += np.bincount(
+            chunk_highway[tagged], weights=chunk_maxspeeds[tagged], minlength=number_of_classes,
+        )
+        counts += np.bincount(chunk_highway[tagged], minlength=number_of_classes)
+    with np.errstate(invalid="ignore"):
+        speeds = sums / counts
+    for code, name in enumerate(highway_names):
+        if profile.hwy_speeds.get(name) is not None:
+            speeds[code] = profile.hwy_speeds[name]
+    known = np.array(list(speeds) + [
+        speed for name, speed in profile.hwy_speeds.items()
+        if speed is not None and name not in highway_names
+    ])
+    if np.isnan(known).all():
+        raise ValueError("No maxspeed or highway speed available for any edge.")
+    speeds[np.isnan(speeds)] = np.nanmean(known)
+
+    # Edges without a highway class keep NaN unless they have a maxspeed
+    return np.append(speeds, np.nan)
+
+
+def edge_speeds(maxspeeds, highway, speeds_of_classes, factors_of_classes, profile):
+    """
+    Returns the speed of every edge: its maxspeed, or else the speed of its highway class,
+    scaled by the factor of its highway class and capped by the profile.
+    :param maxspeeds: cleaned maxspeed in km/h per edge, NaN if not tagged
+    :param highway: highway code per edge, -1 if missing
+    :param speeds_of_classes: speed per highway code from class_speeds
+    :param factors_of_classes: speed factor per highway code from SpeedProfile.factors
+    :param profile: SpeedProfile
+    :return np.ndarray: speed in km/h per edge, rounded to one decimal
+    """
+    speeds = np.where(np.isnan(maxspeeds), speeds_of_classes[highway], maxspeeds)
+    speeds = speeds * factors_of_classes[highway]
+    if profile.max_speed is not None:
+        speeds = np.minimum(speeds, profile.max_speed)
+    return np.round(speeds, 1)
+
+
+def travel_times(lengths, speeds):
+    """
+    :param lengths: length in meters per edge
+    :param speeds: speed in km/h per edge
+    :return np.ndarray: travel time in seconds per edge, rounded to one decimal
+    :raises ValueError: If a speed is missing
+    """
+    if np.isnan(speeds).any():
+        raise ValueError("Edge speeds are missing for edges without highway class.")
+    return np.round((lengths / 1000) / (speeds / (60 * 60)), 1)
+
+
+def write_travel_time(compact_graph, path, profile=DEFAULT_SPEED_PROFILE, chunk_size=CHUNK_SIZE):
+    """
+    Writes the travel time of every edge of a compact graph to a memory-mapped file. Unlike
+    SpeedEngine.travel_time the edges are read and written in chunks, so the memory does
+    not grow with the size of the graph.
+    :param compact_graph: CompactGraph, loaded memory-mapped
+    :param path: .npy file of the travel times
+    :param profile: SpeedProfile or name of one of SPEED_PROFILES
+    :param chunk_size: number of edges read at once. Default CHUNK_SIZE
+    :return np.memmap: travel time in seconds per edge id, as SpeedEngine.travel_time
+    :raises ValueError: If an edge has neither a maxspeed nor a highway class
+    """
+    profile = SpeedEngine.get_profile(profile)
+    maxspeeds, highway = compact_graph.maxspeed_kph, compact_graph.highway
+    speeds_of_classes = class_speeds(
+        maxspeeds, highway, compact_graph.highway_names, profile, chunk_size
+    )
+    factors_of_classes = profile.factors(compact_graph.highway_names)
+    number_of_edges = compact_graph.number_of_edges
+    result = np.lib.format.open_memmap(
+        path, mode="w+", dtype=np.float64, shape=(max(number_of_edges, 1),)
+    )[:number_of_edges]
+    for start in range(0, number_of_edges, chunk_size):
+        end = min(start + chunk_size, number_of_edges)
+        speeds = edge_speeds(
+            np.asarray(maxspeeds[start:end]), np.asarray(highway[start:end]),
+            speeds_of_classes, factors_of_classes, profile,
+        )
+        result[start:end] = travel_times(np.asarray(compact_graph.length[start:end]), speeds)
+    result.flush()
+    return result
+
+
+class EdgeWeight:
+    """
+    Networkx weight function of a MultiDiGraph returning the weight of the edges between
+    two nodes. Unlike a closure it can be sent to worker processes.
+    """
+    def __init__(self, edge_weights):
+        """
+        Initializes the weight function.
+        :param edge_weights: dictionary of the weight of every (u, v, key) edge
+        """
+        self.edge_weights = edge_weights
+
+    def __call__(self, u, v, data):
+        """
+        Networkx passes the data of all parallel edges between u and v when routing, and
+        the data of a single key when it assigns betweenness to the parallel edges.
+        :return float: minimum weight of the edges of the keys in the data
+        """
+        edge_weights = self.edge_weights
+        if len(data) == 1:
+            for key in data:
+                return edge_weights[(u, v, key)]
+        return min(edge_weights[(u, v, key)] for key in data)
+
+
+class SpeedEngine:
+    """
+    Calculates edge speeds and travel times of speed profiles on the edge arrays of a
+    CsrGraph. Results are cached per profile; the graph itself is never modified or copied,
+    every profile shares the topology arrays of the CsrGraph.
+    """
+    def __init__(self, csr_graph, maxspeeds, highway, highway_names):
+        """
+        Initializes the engine with the edge attributes in edge id order.
+        :param csr_graph: CsrGraph with the edge lengths in meters as weights
+        :param maxspeeds: cleaned maxspeed in km/h per edge, NaN if not tagged
+        :param highway: highway code per edge, -1 if missing
+        :param highway_names: highway class of every highway code
+        """
+        self.csr_graph = csr_graph
+        self.maxspeeds = maxspeeds
+        self.highway = highway
+        self.highway_names = list(highway_names)
+        self._speeds = {}
+        self._travel_times = {}
+        self._csr_graphs = {}
+        self._weight_functions = {}
+
+    @classmethod
+    def from_graph(cls, graph):
+        """
+        Creates the engine of a Networkx graph.
+        :param graph: Networkx graph object with 'length' edge attributes
+        :return SpeedEngine: speed engine
+        """
+        csr_graph = CsrGraph.from_graph(graph, "length")
+        return cls(csr_graph, *edge_speed_attributes(graph, csr_graph.edge_tuples()))
+
+    @classmethod
+    def from_compact_graph(cls, compact_graph):
+        """
+        Creates the engine of a CompactGraph from its stored edge arrays.
+        :param compact_graph: CompactGraph
+        :return SpeedEngine: speed engine
+        """
+        return cls(
+            compact_graph.csr_graph("length"), compact_graph.maxspeed_kph,
+            compact_graph.highway, compact_graph.highway_names,
+        )
+
+    @staticmethod
+    def get_profile(profile):
+        """
+        :param profile: SpeedProfile or name of one of SPEED_PROFILES
+        :return SpeedProfile: speed profile
+        :raises ValueError: If there is no profile with this name
+        """
+        if isinstance(profile, SpeedProfile):
+            return profile
+        if profile not in SPEED_PROFILES:
+            raise ValueError(
+                f"Invalid speed profile '{profile}'. Use one of {tuple(SPEED_PROFILES)}."
+            )
+        return SPEED_PROFILES[profile]
+
+    def speed_kph(self, profile=DEFAULT_SPEED_PROFILE):
+        """
+        Returns the speed of every edge. Edges without maxspeed get the speed of their
+        highway class from the profile, or the mean tagged speed of their class if the
+        profile has none, or the mean speed of all classes (as in ox.add_edge_speeds).
+        :param profile: SpeedProfile or name of one of SPEED_PROFILES
+        :return np.ndarray: speed in km/h per edge id, rounded to one decimal
+        """
+        profile = self.get_profile(profile)
+        if profile.name not in self._speeds:
+            self._speeds[profile.name] = edge_speeds(
+                self.maxspeeds, self.highway,
+                class_speeds(self.maxspeeds, self.highway, self.highway_names, profile),
+                profile.factors(self.highway_names), profile,
+            )
+        return self._speeds[profile.name]
+
+    def travel_time(self, profile=DEFAULT_SPEED_PROFILE):
+        """
+        Returns the travel time of every edge, as ox.add_edge_travel_times.
+        :param profile: SpeedProfile or name of one of SPEED_PROFILES
+        :return np.ndarray: travel time in seconds per edge id, rounded to one decimal
+        :raises ValueError: If an edge has neither a maxspeed nor a highway class
+        """
+        profile = self.get_profile(profile)
+        if profile.name not in self._travel_times:
+            self._travel_times[profile.name] = travel_times(
+                self.csr_graph.weights, self.speed_kph(profile)
+            )
+        return self._travel_times[profile.name]
+
+    def csr_graph_for(self, profile=DEFAULT_SPEED_PROFILE):
+        """
+        Returns the CsrGraph with the travel times of a profile as weights.
+        :param profile: SpeedProfile or name of one of SPEED_PROFILES
+        :return CsrGraph: graph sharing the topology arrays, cached per profile
+        """
+        profile = self.get_profile(profile)
+        if profile.name not in self._csr_graphs:
+            self._csr_graphs[profile.name] = self.csr_graph.reweighted(
+                self.travel_time(profile)
+            )
+        return self._csr_graphs[profile.name]
+
+    def weight_function(self, profile=DEFAULT_SPEED_PROFILE):
+        """
+        Returns a Networkx weight function with the travel times of a profile, which
+        Networkx routing accepts instead of an edge attribute name.
+        :param profile: SpeedProfile or name of one of SPEED_PROFILES
+        :return EdgeWeight: weight function (u, v, data) with the travel time of the edges
+        of the MultiDiGraph
+        """
+        profile = self.get_profile(profile)
+        if profile.name not in self._weight_functions:
+            csr_graph = self.csr_graph
+            nodes = csr_graph.nodes
+            edge_times = dict(zip(
+                zip(
+                    nodes[csr_graph.sources].tolist(), nodes[csr_graph.targets].tolist(),
+                    csr_graph.keys.tolist(),
+                ),
+                self.travel_time(profile).tolist(),
+            ))
+            self._weight_functions[profile.name] = EdgeWeight(edge_times)
+        return self._weight_functions[profile.name]
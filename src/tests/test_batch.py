@@ -0,0 +1,119 @@
+"""
+Unit test for the batch runs of a job matrix
+"""
+
+import os
+import json
+import tempfile
+import unittest
+from ..modules.module_batch import (
+    expand_jobs, read_job_file, job_outputs, run_batch, BATCH_REPORT_FILE,
+)
+from ..modules.module_output_folder import create_output_folder, centrality_file_name
+
+
+def load_region(region, cache_dir):
+    """
+    Test loader which logs every region it loads.
+    :param region: name of the region
+    :param cache_dir: folder of the load log
+    :return tuple: placeholder region data, None for the region "Unknown"
+    """
+    with open(os.path.join(cache_dir, "loads.txt"), "a", encoding="utf-8") as log:
+        log.write(f"{region}\n")
+    return None if region == "Unknown" else ("edges", region)
+
+
+def run_job(
+    region, module_type, weight, number_of_routes, output_root, osm_download, cache_dir,
+    offline, speed_profiles=("free_flow",), output_format="gpkg",
+):
+    """
+    Test runner which writes empty centrality files like Main.main.
+    """
+    assert osm_download == ("edges", region)
+    folder = create_output_folder(output_root, region, module_type, weight, number_of_routes)
+    profiles = speed_profiles if weight == "travel_time" else ("free_flow",)
+    for profile in profiles:
+        name = centrality_file_name(
+            module_type, weight, number_of_routes, f".{output_format}", profile
+        )
+        with open(os.path.join(folder, name), "w", encoding="utf-8"):
+            pass
+
+
+class TestBatch(unittest.TestCase):
+    """
+    Test class for the batch module.
+    """
+    def test_expand_jobs(self):
+        """
+        Test if the job matrix is expanded per region and invalid job files are rejected.
+        """
+        jobs = expand_jobs({
+            "regions": ["A", "B"], "module_types": ["networkx", "geographical"],
+            "weights": ["length", "travel_time"], "number_of_routes": [10, 20],
+            "options": {"backend": "csr"},
+        })
+        # networkx: 2 weights, geographical: 2 weights x 2 route counts, per region
+        self.assertEqual(len(jobs), 12)
+        self.assertEqual([job["region"] for job in jobs], ["A"] * 6 + ["B"] * 6)
+        self.assertIsNone(jobs[0]["number_of_routes"])
+        self.assertEqual(jobs[0]["options"], {"backend": "csr"})
+        for invalid in (
+            {"regions": []},
+            {"regions": ["A"], "module_types": ["igraph"]},
+            {"regions": ["A"], "weights": ["speed"]},
+            {"regions": ["A"], "module_types": ["geographical"]},
+            {"regions": ["A"], "module_types": ["networkx"], "options": {"offline": True}},
+        ):
+            with self.assertRaises(ValueError):
+                expand_jobs(invalid)
+
+        with tempfile.TemporaryDirectory() as directory:
+            job_file = os.path.join(directory, "jobs.json")
+            with open(job_file, "w", encoding="utf-8") as file:
+                json.dump({"output_root": "runs", "regions": "A", "weights": "length",
+                           "module_types": "networkx"}, file)
+            jobs, output_root = read_job_file(job_file)
+            self.assertEqual(len(jobs), 1)
+            self.assertEqual(output_root, os.path.join(directory, "runs"))
+
+    def test_run_batch(self):
+        """
+        Test if the jobs run with one region load per worker and are skipped once done.
+        """
+        jobs = expand_jobs({
+            "regions": ["A", "B", "Unknown"], "module_types": ["networkx", "geographical"],
+            "weights": ["length", "travel_time"], "number_of_routes": [5],
+            "options": {"speed_profiles": ["free_flow", "rush_hour"]},
+        })
+        with tempfile.TemporaryDirectory() as directory:
+            output_root = os.path.join(directory, "runs")
+            records = run_batch(
+                jobs, run_job, output_root, directory, workers=1, loader=load_region,
+                failed_regions={"B": "download failed"},
+            )
+            statuses = {(record["region"], record["status"]) for record in records}
+            self.assertEqual(statuses, {("A", "done"), ("B", "failed"), ("Unknown", "failed")})
+            for job in jobs[:4]:
+                _, files = job_outputs(job, output_root)
+                self.assertTrue(all(map(os.path.exists, files)))
+            self.assertEqual(len(job_outputs(jobs[1], output_root)[1]), 2)
+            with open(os.path.join(directory, "loads.txt"), encoding="utf-8") as log:
+                # One worker loads every region once, failed downloads are not loaded
+                self.assertEqual(log.read().split(), ["A", "Unknown"])
+
+            # A removed output is run again, all other finished jobs are skipped
+            os.remove(job_outputs(jobs[0], output_root)[1][0])
+            records = run_batch(jobs[:4], run_job, output_root, directory, workers=2,
+                                memory_limit_gb=4, loader=load_region)
+            self.assertEqual(
+                [record["status"] for record in records], ["skipped"] * 3 + ["done"]
+            )
+            with open(os.path.join(output_root, BATCH_REPORT_FILE), encoding="utf-8") as file:
+                self.assertEqual(len(json.load(file)), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
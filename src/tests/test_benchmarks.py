@@ -0,0 +1,52 @@
+"""
+Unit test for the synthetic road networks and the pipeline benchmark
+"""
+
+import unittest
+import networkx as nx
+import osmnx as ox
+from ..benchmarks.synthetic_graphs import synthetic_graph, study_area
+from ..benchmarks.benchmark_pipeline import run_benchmarks, compare_results
+from ..modules.module_speed_profiles import SpeedEngine
+
+
+class TestBenchmarks(unittest.TestCase):
+    """
+    Test class for the offline benchmark suite.
+    """
+    def test_synthetic_graph(self):
+        """
+        Test if synthetic networks carry the attributes of osmnx drive networks.
+        """
+        for kind in ("grid", "random_geometric"):
+            graph = synthetic_graph(8, kind=kind, seed=1)
+            self.assertEqual(graph.number_of_nodes(), 64)
+            nodes, edges = ox.graph_to_gdfs(graph)
+            self.assertTrue({"osmid", "highway", "length", "geometry"} <= set(edges.columns))
+            self.assertTrue((edges["length"] > 0).all())
+            self.assertTrue(study_area(graph).contains(nodes.unary_union))
+            travel_times = SpeedEngine.from_graph(graph).travel_time()
+            self.assertTrue((travel_times > 0).all())
+        grid = synthetic_graph(8, seed=1)
+        self.assertTrue(nx.is_weakly_connected(grid))
+
+    def test_run_benchmarks(self):
+        """
+        Test if every stage of both modules is timed and regressions are detected.
+        """
+        records = run_benchmarks([4], number_of_routes=20, networkx_max_nodes=0)
+        stages = {(record["method"], record["stage"]) for record in records}
+        for stage in ("travel_time", "betweenness", "aggregation", "gpkg_output", "plot"):
+            self.assertIn(("networkx", stage), stages)
+        for stage in ("point_sampling", "snapping", "routing", "aggregation", "gpkg_output"):
+            self.assertIn(("geographical", stage), stages)
+        self.assertIn(("loading", "graph_to_gdfs"), stages)
+
+        baseline = [{**record, "seconds": 1.0} for record in records]
+        slower = [{**record, "seconds": 2.0} for record in records]
+        self.assertEqual(compare_results(records, records), [])
+        self.assertEqual(len(compare_results(slower, baseline)), len(records))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+"""
+Unit test for the memory-mappable compact graph file format.
+"""
+
+import tempfile
+import unittest
+import numpy as np
+import networkx as nx
+import geopandas as gpd
+import osmnx as ox
+from shapely.geometry import LineString, box
+from ..modules.module_compact_graph import CompactGraph
+from ..modules.module_networkx_centrality import NetworkxCentrality
+from ..modules.module_geographical_centrality import GeographicalCentrality
+
+
+class TestCompactGraph(unittest.TestCase):
+    """
+    Test class for the CompactGraph module.
+    """
+    def setUp(self):
+        """
+        Set up a small street grid with merged edges and save it as compact graph.
+        """
+        graph = nx.MultiDiGraph(crs="EPSG:4326")
+        for i in range(8):
+            for j in range(8):
+                graph.add_node(i * 8 + j, x=8.7 + 0.002 * i, y=49.4 + 0.002 * j)
+        for i in range(8):
+            for j in range(8):
+                for a, b in ((i + 1, j), (i, j + 1)):
+                    if a < 8 and b < 8:
+                        length = 150.0 + 10 * ((i * 7 + j * 3) % 11)
+                        graph.add_edge(i * 8 + j, a * 8 + b, osmid=i * 8 + j,
+                                       highway="residential", length=length)
+                        graph.add_edge(a * 8 + b, i * 8 + j, osmid=a * 8 + b,
+                                       highway="primary", maxspeed="30 mph", length=length)
+        graph.add_edge(0, 63, osmid=[5, 6], highway=["secondary", "tertiary"],
+                       maxspeed=["50", "70"], length=3000.0,
+                       geometry=LineString([(8.7, 49.4), (8.71, 49.41), (8.714, 49.414)]))
+        self.graph = graph
+        self.temporary_directory = tempfile.TemporaryDirectory()
+        CompactGraph.from_graph(graph).save(self.temporary_directory.name)
+        self.compact_graph = CompactGraph.load(self.temporary_directory.name)
+
+    def tearDown(self):
+        """
+        Remove the compact graph file.
+        """
+        self.temporary_directory.cleanup()
+
+    def test_round_trip(self):
+        """
+        Test if a loaded compact graph is memory-mapped and has the edges of ox.graph_to_gdfs.
+        """
+        self.assertTrue(CompactGraph.exists(self.temporary_directory.name))
+        self.assertIsInstance(self.compact_graph.targets, np.memmap)
+        self.assertEqual(self.compact_graph.number_of_edges, self.graph.number_of_edges())
+        self.assertEqual(self.compact_graph.crs, "EPSG:4326")
+
+        edges_gdf = self.compact_graph.edges_gdf()
+        expected = ox.graph_to_gdfs(self.graph, nodes=False).loc[edges_gdf.index]
+        self.assertTrue(edges_gdf.geometry.geom_equals_exact(expected.geometry, 0).all())
+        self.assertEqual(edges_gdf["osmid"].tolist(), expected["osmid"].tolist())
+        self.assertTrue(np.allclose(edges_gdf["length"], expected["length"]))
+        self.assertEqual(edges_gdf.loc[(0, 63, 0), "highway"], "secondary")
+
+        speeds = dict(zip(edges_gdf.index, self.compact_graph.maxspeed_kph))
+        self.assertEqual(speeds[(0, 63, 0)], 60.0)
+        self.assertAlmostEqual(speeds[(1, 0, 0)], 30 * 1.60934)
+        self.assertTrue(np.isnan(speeds[(0, 1, 0)]))
+
+    def test_networkx_centrality(self):
+        """
+        Test if the csr centrality of a compact graph equals that of the Networkx graph.
+        """
+        centrality = NetworkxCentrality(weight="length", backend="csr")
+        expected = centrality.get_centrality_short(
+            self.graph, ox.graph_to_gdfs(self.graph, nodes=False)
+        )
+        result = centrality.get_centrality_short(self.compact_graph, None)
+        self.assertTrue(np.allclose(
+            result["centrality"], expected.loc[result.index, "centrality"]
+        ))
+        self.assertEqual(result["osmid"].tolist(), expected.loc[result.index, "osmid"].tolist())
+
+    def test_geographical_centrality(self):
+        """
+        Test if tree routing on a compact graph counts the same edges as on the Networkx graph.
+        """
+        results = []
+        for graph in (self.graph, self.compact_graph):
+            gc_instance = GeographicalCentrality(
+                study_area=None, weight="length", graph=graph, edges_df=None,
+                number_of_routes=100, routing="tree",
+            )
+            gc_instance.poly_study_area = gpd.GeoDataFrame(
+                geometry=[box(8.699, 49.399, 8.715, 49.415)], crs="EPSG:4326")
+            np.random.seed(7)
+            gc_instance.generate_random_routes(graph)
+            gc_instance.analyze_centrality()
+            results.append(gc_instance.centrality_geographical_gdf)
+
+        expected, result = results
+        self.assertEqual(result["centrality"].sum(), expected["centrality"].sum())
+        self.assertTrue((result["centrality"] == expected.loc[result.index, "centrality"]).all())
+        self.assertTrue(result.geometry.geom_equals_exact(
+            expected.loc[result.index].geometry, 0).all())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,168 @@
+"""
+Unit test for the contraction hierarchy routing of geographical centrality.
+"""
+
+import os
+import pickle
+import tempfile
+import unittest
+from types import SimpleNamespace
+import numpy as np
+import networkx as nx
+import geopandas as gpd
+import osmnx as ox
+from shapely.geometry import box
+from ..modules.module_contraction_hierarchy import ContractionHierarchy
+from ..modules.module_csr_graph import CsrGraph
+from ..modules.module_route_trees import tree_route_loads
+from ..modules.module_osm_cache import OsmCache
+from ..modules.module_geographical_centrality import GeographicalCentrality
+
+
+class TestContractionHierarchy(unittest.TestCase):
+    """
+    Test class for the ContractionHierarchy module.
+    """
+    def setUp(self):
+        """
+        Set up a street grid with random lengths, one-way streets, parallel edges and a
+        node which can not be reached.
+        """
+        rng = np.random.default_rng(3)
+        graph = nx.MultiDiGraph(crs="EPSG:4326")
+        for i in range(12):
+            for j in range(12):
+                graph.add_node(i * 12 + j, x=8.7 + 0.002 * i, y=49.4 + 0.002 * j)
+        for i in range(12):
+            for j in range(12):
+                for a, b in ((i + 1, j), (i, j + 1)):
+                    if a < 12 and b < 12:
+                        length = float(rng.uniform(100, 300))
+                        graph.add_edge(i * 12 + j, a * 12 + b, length=length)
+                        if rng.random() < 0.8:
+                            graph.add_edge(a * 12 + b, i * 12 + j, length=length)
+                        if rng.random() < 0.1:
+                            graph.add_edge(i * 12 + j, a * 12 + b, length=length * 0.9)
+        graph.add_node(144, x=8.69, y=49.39)
+        graph.add_edge(144, 0, length=50.0)
+        self.graph = graph
+        self.csr_graph = CsrGraph.from_graph(graph, "length")
+        self.hierarchy = ContractionHierarchy.build(self.csr_graph)
+
+    def test_routes_match_dijkstra(self):
+        """
+        Test if the routes of the hierarchy are the routes of ox.shortest_path.
+        """
+        self.assertGreater(self.hierarchy.number_of_shortcuts, 0)
+        nodes = self.csr_graph.nodes
+        rng = np.random.default_rng(5)
+        pairs = rng.integers(self.csr_graph.number_of_nodes, size=(300, 2)).tolist()
+        for source, target in pairs + [[0, 144], [144, 143], [7, 7]]:
+            route = self.hierarchy.route(source, target)
+            expected = ox.shortest_path(self.graph, nodes[source], nodes[target], weight="length")
+            if expected is None:
+                self.assertIsNone(route)
+            else:
+                self.assertEqual(nodes[route].tolist(), expected)
+
+    def test_routes_with_ties(self):
+        """
+        Test if routes on a grid with integer weights, where many paths have the same
+        weight, are as short as the Dijkstra routes. Of equally short routes the hierarchy
+        may choose another one than the shortest path trees, so only the total weight of
+        the edge loads is compared with tree routing.
+        """
+        rng = np.random.default_rng(8)
+        graph = nx.MultiDiGraph(crs="EPSG:4326")
+        for i in range(8):
+            for j in range(8):
+                graph.add_node(i * 8 + j, x=8.7 + 0.002 * i, y=49.4 + 0.002 * j)
+        for i in range(8):
+            for j in range(8):
+                for a, b in ((i + 1, j), (i, j + 1)):
+                    if a < 8 and b < 8:
+                        for u, v in ((i * 8 + j, a * 8 + b), (a * 8 + b, i * 8 + j)):
+                            graph.add_edge(u, v, length=float(rng.integers(1, 3)))
+        csr_graph = CsrGraph.from_graph(graph, "length")
+        hierarchy = ContractionHierarchy.build(csr_graph)
+        nodes = csr_graph.nodes
+        lengths = dict(nx.all_pairs_dijkstra_path_length(nx.DiGraph(graph), weight="length"))
+        for source in range(csr_graph.number_of_nodes):
+            for target in range(csr_graph.number_of_nodes):
+                route = nodes[hierarchy.route(source, target)].tolist()
+                self.assertEqual(
+                    nx.path_weight(nx.DiGraph(graph), route, "length") if len(route) > 1 else 0,
+                    lengths[nodes[source]][nodes[target]],
+                )
+
+        number_of_nodes = csr_graph.number_of_nodes
+        origins, destinations = np.divmod(np.arange(number_of_nodes ** 2), number_of_nodes)
+        loads, count = hierarchy.route_loads(csr_graph, origins, destinations)
+        tree_loads, routed = tree_route_loads(csr_graph, origins, destinations)
+        self.assertEqual(count, routed.sum())
+        self.assertEqual(loads @ csr_graph.weights, tree_loads @ csr_graph.weights)
+
+    def test_route_loads(self):
+        """
+        Test if every route is counted once on the parallel edge of minimum weight.
+        """
+        loads, count = self.hierarchy.route_loads(self.csr_graph, [144, 0, 5], [143, 144, 5])
+        self.assertEqual(count, 1)
+        route = ox.shortest_path(self.graph, 144, 143, weight="length")
+        expected = np.zeros(self.csr_graph.number_of_edges, dtype=np.int64)
+        expected[self.csr_graph.route_edges(route)] = 1
+        self.assertTrue(np.array_equal(loads, expected))
+
+    def test_save_and_load(self):
+        """
+        Test if a saved hierarchy is loaded for its graph and rebuilt for changed weights.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            self.hierarchy.save(directory)
+            hierarchy, loaded = ContractionHierarchy.load_or_build(directory, self.csr_graph)
+            self.assertTrue(loaded)
+            for name in ("rank", "forward_heads", "backward_middles"):
+                self.assertTrue(np.array_equal(
+                    getattr(hierarchy, name), getattr(self.hierarchy, name)
+                ))
+            self.assertEqual(hierarchy.route(3, 140), self.hierarchy.route(3, 140))
+
+            for _, _, data in self.graph.edges(data=True):
+                data["length"] *= 2
+            doubled = CsrGraph.from_graph(self.graph, "length")
+            hierarchy, loaded = ContractionHierarchy.load_or_build(directory, doubled)
+            self.assertFalse(loaded)
+            _, loaded = ContractionHierarchy.load_or_build(directory, doubled)
+            self.assertTrue(loaded)
+
+        unpickled = pickle.loads(pickle.dumps(self.hierarchy))
+        self.assertEqual(unpickled.route(3, 140), self.hierarchy.route(3, 140))
+
+    def test_ch_routing(self):
+        """
+        Test if "ch" routing gives the edge loads of "shortest_path" routing and stores the
+        hierarchy in the cache of the study area.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            study_area = SimpleNamespace(area="Grid", cache=OsmCache(directory))
+            loads = {}
+            for routing in ("shortest_path", "ch", "ch"):
+                gc_instance = GeographicalCentrality(
+                    study_area=study_area, weight="length", graph=self.graph, edges_df=None,
+                    number_of_routes=200, routing=routing, seed=9,
+                )
+                gc_instance.poly_study_area = gpd.GeoDataFrame(
+                    geometry=[box(8.699, 49.399, 8.723, 49.423)], crs="EPSG:4326"
+                )
+                gc_instance.generate_random_routes(self.graph)
+                loads.setdefault(routing, []).append(gc_instance.edge_loads)
+            self.assertTrue(np.array_equal(loads["shortest_path"][0], loads["ch"][0]))
+            self.assertTrue(np.array_equal(loads["ch"][0], loads["ch"][1]))
+            self.assertEqual(
+                sum(name.startswith("contraction_hierarchy") for name in os.listdir(directory)),
+                1,
+            )
+
+
+if __name__ == '__main__':
+    unittest.main()
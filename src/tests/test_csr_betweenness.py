@@ -0,0 +1,190 @@
+"""
+Unit test to check that the CSR backend gives the same edge betweenness centrality as networkx.
+"""
+
+import random
+import unittest
+import networkx as nx
+from ..modules.module_csr_graph import CsrGraph
+from ..modules.module_brandes import edge_betweenness, approximate_edge_betweenness
+from ..modules.module_networkx_centrality import NetworkxCentrality
+
+
+class TestCsrBetweenness(unittest.TestCase):
+    """
+    Test class comparing the CSR backend to nx.edge_betweenness_centrality.
+    """
+    def setUp(self):
+        """
+        Set up a random multigraph with parallel edges and equal length routes.
+        """
+        rng = random.Random(42)
+        self.graph = nx.MultiDiGraph()
+        self.graph.add_nodes_from(range(60))
+        for _ in range(240):
+            u, v = rng.randrange(60), rng.randrange(60)
+            self.graph.add_edge(u, v, length=float(rng.randint(1, 4)))
+
+    def test_csr_graph_edges(self):
+        """
+        Test if every edge of the graph is mapped back to its (u, v, key) tuple.
+        """
+        csr_graph = CsrGraph.from_graph(self.graph, "length")
+        self.assertEqual(csr_graph.number_of_edges, self.graph.number_of_edges())
+        self.assertEqual(
+            sorted(csr_graph.edge_tuples()), sorted(self.graph.edges(keys=True))
+        )
+
+    def test_edge_betweenness_matches_networkx(self):
+        """
+        Test if both backends return the same centrality for every edge.
+        """
+        expected = nx.edge_betweenness_centrality(self.graph, weight="length")
+        result = NetworkxCentrality(weight="length", backend="csr").edge_betweenness_centrality(
+            self.graph, "length"
+        )
+        self.assertEqual(set(result.index), set(expected))
+        for edge, value in expected.items():
+            self.assertAlmostEqual(result.loc[edge, "centrality"], value, places=12)
+
+    def test_edge_betweenness_unweighted(self):
+        """
+        Test if edges without the weight attribute are counted with weight 1 like networkx.
+        """
+        expected = nx.edge_betweenness_centrality(self.graph, weight="missing")
+        csr_graph = CsrGraph.from_graph(self.graph, "missing")
+        result = dict(zip(csr_graph.edge_tuples(), edge_betweenness(csr_graph)))
+        for edge, value in expected.items():
+            self.assertAlmostEqual(result[edge], value, places=12)
+
+    def test_edge_betweenness_zero_weights(self):
+        """
+        Test if zero weights give the centrality of networkx, which depends on the order
+        the neighbours were added in, also after an incremental update.
+        """
+        rng = random.Random(7)
+        graph = nx.MultiDiGraph()
+        graph.add_nodes_from(rng.sample(range(30), 30))
+        for _ in range(90):
+            u, v = rng.randrange(30), rng.randrange(30)
+            if u != v:
+                graph.add_edge(u, v, length=float(rng.randint(0, 2)))
+        centrality = NetworkxCentrality(weight="length", backend="csr")
+        result = centrality.edge_betweenness_centrality(graph, "length")
+        expected = nx.edge_betweenness_centrality(graph, weight="length")
+        for edge, value in expected.items():
+            self.assertAlmostEqual(result.loc[edge, "centrality"], value, places=12)
+
+        edge = next(
+            (u, v, key) for u, v, key, length in graph.edges(keys=True, data="length")
+            if length > 0
+        )
+        result = centrality.update_centrality(graph, result, {edge: 0.0})
+        changed_graph = graph.copy()
+        changed_graph.edges[edge]["length"] = 0.0
+        expected = nx.edge_betweenness_centrality(changed_graph, weight="length")
+        for edge, value in expected.items():
+            self.assertAlmostEqual(result.loc[edge, "centrality"], value, places=12)
+
+    def test_parallel_matches_serial(self):
+        """
+        Test if the process pool returns the same centrality as the serial run.
+        """
+        csr_graph = CsrGraph.from_graph(self.graph, "length")
+        serial = edge_betweenness(csr_graph)
+        parallel = edge_betweenness(csr_graph, workers=2)
+        for serial_value, parallel_value in zip(serial, parallel):
+            self.assertAlmostEqual(serial_value, parallel_value, places=12)
+
+    def test_approximate_edge_betweenness(self):
+        """
+        Test if sampled centrality is reproducible, its confidence interval narrows with
+        more pivots and it equals the exact centrality once all nodes are pivots.
+        """
+        csr_graph = CsrGraph.from_graph(self.graph, "length")
+        exact = edge_betweenness(csr_graph)
+        estimate = approximate_edge_betweenness(csr_graph, pivots=30, seed=1)
+        repeated = approximate_edge_betweenness(csr_graph, pivots=30, seed=1)
+        self.assertEqual(estimate.pivots, 30)
+        self.assertTrue((estimate.centrality == repeated.centrality).all())
+        self.assertTrue((estimate.low <= estimate.centrality).all())
+        self.assertTrue((estimate.centrality <= estimate.high).all())
+        larger = approximate_edge_betweenness(csr_graph, pivots=50, seed=1)
+        self.assertLess(
+            (larger.high - larger.low).sum(), (estimate.high - estimate.low).sum()
+        )
+
+        complete = approximate_edge_betweenness(csr_graph, pivots=60)
+        for exact_value, value, low, high in zip(
+            exact, complete.centrality, complete.low, complete.high
+        ):
+            self.assertAlmostEqual(exact_value, value, places=12)
+            self.assertAlmostEqual(low, high, places=12)
+
+    def test_adaptive_edge_betweenness(self):
+        """
+        Test if adaptive sampling stops once the top edges are stable, stops at the maximum
+        number of pivots otherwise and gives confidence intervals around the estimate.
+        """
+        csr_graph = CsrGraph.from_graph(self.graph, "length")
+        estimate = approximate_edge_betweenness(
+            csr_graph, pivots=5, adaptive=True, top_n=1, patience=1
+        )
+        first_batch = approximate_edge_betweenness(csr_graph, pivots=5)
+        self.assertTrue(estimate.converged)
+        self.assertEqual(estimate.pivots, 10)
+        self.assertEqual(estimate.centrality.argmax(), first_batch.centrality.argmax())
+        self.assertTrue((estimate.low <= estimate.centrality).all())
+        self.assertTrue((estimate.centrality <= estimate.high).all())
+        self.assertTrue((estimate.low < estimate.high).any())
+
+        limited = approximate_edge_betweenness(
+            csr_graph, pivots=5, adaptive=True, top_n=5, patience=2, max_pivots=20
+        )
+        self.assertFalse(limited.converged)
+        self.assertEqual(limited.pivots, 20)
+
+        exhausted = approximate_edge_betweenness(
+            csr_graph, pivots=5, adaptive=True, top_n=5, patience=2
+        )
+        self.assertFalse(exhausted.converged)
+        self.assertEqual(exhausted.pivots, 60)
+        for exact_value, value, low, high in zip(
+            edge_betweenness(csr_graph), exhausted.centrality, exhausted.low, exhausted.high
+        ):
+            self.assertAlmostEqual(exact_value, value, places=12)
+            self.assertAlmostEqual(low, high, places=12)
+
+    def test_update_centrality(self):
+        """
+        Test if incremental updates after closures and weight changes equal a full
+        recomputation, also when chained.
+        """
+        centrality = NetworkxCentrality(weight="length", backend="csr")
+        result = centrality.edge_betweenness_centrality(self.graph, "length")
+        changed_graph = self.graph.copy()
+        parallel = next(
+            (u, v) for u, v in self.graph.edges() if self.graph.number_of_edges(u, v) > 1
+        )
+        edges = list(self.graph.edges(keys=True))
+        steps = [
+            {edges[3]: None, edges[17]: 1.0, edges[40]: 9.0},
+            {(parallel[0], parallel[1], 0): None, edges[80]: 0.5},
+        ]
+        graph = self.graph
+        for changes in steps:
+            result = centrality.update_centrality(graph, result, changes)
+            graph = centrality.scenario_graph
+            for (u, v, key), weight in changes.items():
+                if weight is None:
+                    changed_graph.remove_edge(u, v, key)
+                else:
+                    changed_graph.edges[u, v, key]["length"] = weight
+            expected = nx.edge_betweenness_centrality(changed_graph, weight="length")
+            self.assertEqual(set(result.index), set(expected))
+            for edge, value in expected.items():
+                self.assertAlmostEqual(result.loc[edge, "centrality"], value, places=12)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+"""
+Unit test for the edge removal scenarios of the edge criticality.
+"""
+
+import random
+import tempfile
+import os
+import unittest
+import numpy as np
+import networkx as nx
+import geopandas as gpd
+import osmnx as ox
+from ..modules.module_networkx_centrality import NetworkxCentrality
+from ..modules.module_edge_criticality import (
+    edge_criticality, random_od_pairs, save_edge_criticality,
+)
+
+
+class TestEdgeCriticality(unittest.TestCase):
+    """
+    Test class for the edge criticality module.
+    """
+    def setUp(self):
+        """
+        Set up a street grid with a dead end street and calculate its centrality.
+        """
+        rng = random.Random(4)
+        graph = nx.MultiDiGraph(crs="EPSG:4326")
+        for i in range(7):
+            for j in range(7):
+                graph.add_node(i * 7 + j, x=8.7 + 0.002 * i, y=49.4 + 0.002 * j)
+        for i in range(7):
+            for j in range(7):
+                for a, b in ((i + 1, j), (i, j + 1)):
+                    if a < 7 and b < 7:
+                        length = float(rng.randint(50, 300))
+                        graph.add_edge(i * 7 + j, a * 7 + b, osmid=i, length=length)
+                        graph.add_edge(a * 7 + b, i * 7 + j, osmid=j, length=length)
+        graph.add_node(49, x=8.69, y=49.4)
+        graph.add_edge(0, 49, osmid=99, length=100.0)
+        graph.add_edge(49, 0, osmid=99, length=100.0)
+        self.graph = graph
+
+        self.centrality = NetworkxCentrality(weight="length", backend="csr")
+        self.centrality.get_centrality_short(graph, ox.graph_to_gdfs(graph, nodes=False))
+        self.csr_graph = self.centrality.get_csr_graph(graph)
+        self.origins, self.destinations = random_od_pairs(self.csr_graph.number_of_nodes, 400)
+
+    def test_random_od_pairs(self):
+        """
+        Test if sampled pairs consist of distinct nodes and are reproducible.
+        """
+        self.assertTrue((self.origins != self.destinations).all())
+        origins, destinations = random_od_pairs(self.csr_graph.number_of_nodes, 400)
+        self.assertTrue((origins == self.origins).all())
+        self.assertTrue((destinations == self.destinations).all())
+
+    def test_edge_criticality(self):
+        """
+        Test if the impacts equal routing every pair on a copy of the graph without the edge.
+        """
+        criticality_gdf = edge_criticality(
+            self.centrality.centrality_short_gdf, self.csr_graph, 6,
+            self.origins, self.destinations,
+        )
+        criticality_gdf = criticality_gdf.sort_values("rank")
+        self.assertEqual(criticality_gdf["rank"].tolist(), list(range(1, 7)))
+        self.assertTrue(criticality_gdf["centrality"].is_monotonic_decreasing)
+
+        nodes = self.csr_graph.nodes
+        pairs = list(zip(nodes[self.origins].tolist(), nodes[self.destinations].tolist()))
+        for (u, v, key), row in criticality_gdf.iterrows():
+            changed_graph = self.graph.copy()
+            changed_graph.remove_edge(u, v, key)
+            added_cost = 0.0
+            unreachable = 0
+            for origin, destination in pairs:
+                old = nx.shortest_path_length(self.graph, origin, destination, weight="length")
+                try:
+                    added_cost += nx.shortest_path_length(
+                        changed_graph, origin, destination, weight="length"
+                    ) - old
+                except nx.NetworkXNoPath:
+                    unreachable += 1
+            self.assertAlmostEqual(row["delta_cost"], added_cost, places=6)
+            self.assertEqual(row["unreachable_pairs"], unreachable)
+
+    def test_dead_end_and_workers(self):
+        """
+        Test if closing the only access of a node disconnects its pairs, with the same
+        result in worker processes, and if the result is written to one GeoPackage.
+        """
+        centrality_gdf = self.centrality.centrality_short_gdf.copy()
+        centrality_gdf.loc[(0, 49, 0), "centrality"] = 1.0
+        serial = edge_criticality(
+            centrality_gdf, self.csr_graph, 4, self.origins, self.destinations
+        )
+        parallel = edge_criticality(
+            centrality_gdf, self.csr_graph, 4, self.origins, self.destinations, workers=2
+        )
+        self.assertEqual(
+            serial.loc[(0, 49, 0), "unreachable_pairs"],
+            int(((self.destinations == 49) & (self.origins != 49)).sum()),
+        )
+        self.assertTrue(np.allclose(serial["delta_cost"], parallel["delta_cost"]))
+        self.assertTrue((serial["unreachable_pairs"] == parallel["unreachable_pairs"]).all())
+
+        with tempfile.TemporaryDirectory() as directory:
+            output_file = os.path.join(directory, "Edge_criticality_length.gpkg")
+            save_edge_criticality(serial, output_file)
+            self.assertEqual(len(gpd.read_file(output_file)), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+"""
+Unit test for the output of edge results in different file formats
+"""
+
+import os
+import tempfile
+import unittest
+import importlib.util
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+from shapely.geometry import LineString
+from ..modules.module_edge_output import coerce_list_columns, save_edges, output_format
+
+
+class TestEdgeOutput(unittest.TestCase):
+    """
+    Unit test for the list column coercion and the output writers.
+    """
+    def setUp(self):
+        """
+        Set up edges with an osmid column mixing single ids and lists of ids.
+        """
+        number = 25
+        self.gdf = gpd.GeoDataFrame(
+            {
+                "centrality": np.linspace(0, 1, number),
+                "osmid": [[i, i + 1] if i % 4 == 0 else i for i in range(number)],
+            },
+            geometry=[
+                LineString([(8.7, 49.4), (8.7 + 0.001 * i, 49.41)]) for i in range(number)
+            ],
+            crs="EPSG:4326",
+        )
+
+    def test_coerce_list_columns(self):
+        """
+        Test if columns with lists become string columns and other columns are unchanged.
+        """
+        self.gdf["highway"] = [["primary", "secondary"]] + [None] * 24
+        self.gdf["name"] = ["Hauptstraße", None] * 12 + ["Ring"]
+        self.gdf["lanes"] = pd.Series([1, 2.5, None] * 8 + [3], dtype=object)
+        self.gdf["ref"] = [("B", 37)] + ["B 37"] * 24
+        coerce_list_columns(self.gdf)
+        self.assertEqual(self.gdf["osmid"].iloc[:2].tolist(), ["[0, 1]", "1"])
+        self.assertEqual(self.gdf["highway"].iloc[:2].tolist(), ["['primary', 'secondary']", None])
+        self.assertEqual(self.gdf["name"].iloc[:2].tolist(), ["Hauptstraße", None])
+        # Mixed numbers without lists keep their values
+        self.assertEqual(self.gdf["lanes"].iloc[:3].tolist(), [1, 2.5, None])
+        self.assertEqual(self.gdf["ref"].iloc[:2].tolist(), ["('B', 37)", "B 37"])
+        self.assertEqual(self.gdf["centrality"].dtype, np.float64)
+        self.assertIsInstance(self.gdf.geometry.iloc[0], LineString)
+
+    def test_chunked_gpkg(self):
+        """
+        Test if a GeoPackage written in chunks contains all edges and values.
+        """
+        coerce_list_columns(self.gdf)
+        with tempfile.TemporaryDirectory() as directory:
+            output_file = os.path.join(directory, "edges.gpkg")
+            save_edges(self.gdf.iloc[:3], output_file)
+            save_edges(self.gdf, output_file, chunk_size=7)
+            result = gpd.read_file(output_file)
+        self.assertEqual(len(result), len(self.gdf))
+        self.assertEqual(result["osmid"].tolist(), self.gdf["osmid"].tolist())
+        np.testing.assert_allclose(result["centrality"], self.gdf["centrality"])
+        self.assertTrue(result.geometry.geom_equals(self.gdf.geometry).all())
+
+    @unittest.skipIf(importlib.util.find_spec("pyarrow") is None, "pyarrow is not installed")
+    def test_geoparquet(self):
+        """
+        Test if edges are written to GeoParquet.
+        """
+        coerce_list_columns(self.gdf)
+        with tempfile.TemporaryDirectory() as directory:
+            output_file = os.path.join(directory, "edges.parquet")
+            save_edges(self.gdf, output_file)
+            result = gpd.read_parquet(output_file)
+        pd.testing.assert_series_equal(result["osmid"], self.gdf["osmid"])
+
+    def test_output_format(self):
+        """
+        Test if the output format follows the file extension.
+        """
+        self.assertEqual(output_format("a/Networkx_centrality_length.GPKG"), "gpkg")
+        self.assertEqual(output_format("edges.feather"), "arrow")
+        with self.assertRaises(ValueError):
+            output_format("edges.shp")
+
+
+if __name__ == '__main__':
+    unittest.main()
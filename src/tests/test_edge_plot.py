@@ -0,0 +1,89 @@
+"""
+Unit test for the drawing of edge values on maps.
+"""
+
+import os
+import tempfile
+import unittest
+import numpy as np
+import geopandas as gpd
+from shapely.geometry import LineString, MultiLineString
+import matplotlib
+import matplotlib.pyplot as plt
+from ..modules.module_edge_plot import edge_lines, edge_segments, rasterize_edges, plot_edges
+from ..modules.module_options import DEFAULT_RENDERER
+
+matplotlib.use("Agg")
+
+
+class TestEdgePlot(unittest.TestCase):
+    """
+    Test class for the edge_plot module.
+    """
+    def setUp(self):
+        """
+        Set up a horizontal edge, a bent edge crossing it and a two-part edge.
+        """
+        self.geometries = np.array([
+            LineString([(0, 0.5), (10, 0.5)]),
+            LineString([(0.5, 0), (0.5, 1.9), (0.6, 1.95)]),
+            MultiLineString([[(2, 1.5), (3, 1.5)], [(5, 1.5), (6, 1.5)]]),
+        ], dtype=object)
+        self.values = np.array([2.0, 3.0, 1.0])
+
+    def test_edge_lines(self):
+        """
+        Test if vertices closer to the line than the tolerance are removed and if every part
+        of a geometry becomes a line of its own.
+        """
+        lines, edge_of = edge_lines(self.geometries)
+        self.assertEqual([len(line) for line in lines], [2, 3, 2, 2])
+        self.assertEqual(edge_of.tolist(), [0, 1, 2, 2])
+        lines, _ = edge_lines(self.geometries, tolerance=0.2)
+        self.assertEqual([len(line) for line in lines], [2, 2, 2, 2])
+        segments, edge_of = edge_segments(self.geometries)
+        self.assertEqual(segments.shape, (5, 2, 2))
+        self.assertEqual(edge_of.tolist(), [0, 1, 1, 2, 2])
+        self.assertEqual(len(edge_lines(self.geometries[:0])[0]), 0)
+
+    def test_rasterize_edges(self):
+        """
+        Test if a pixel holds the maximum or the sum of the edges crossing it, counting every
+        edge once per pixel.
+        """
+        for aggregation, crossing in (("max", 3.0), ("sum", 5.0)):
+            canvas = rasterize_edges(
+                self.geometries, self.values, (0, 0, 10, 2), 10, 2, aggregation, chunk_size=2
+            )
+            expected = np.full((2, 10), np.nan)
+            expected[1] = 2.0
+            expected[1, 0] = crossing
+            expected[0, [0, 2, 5]] = [3.0, 1.0, 1.0]
+            expected[0, [3, 6]] = 1.0
+            np.testing.assert_array_equal(canvas, expected)
+
+    def test_plot_edges(self):
+        """
+        Test if every renderer saves an image and closes its figure, and if the faster
+        renderers are only used on request.
+        """
+        self.assertEqual(DEFAULT_RENDERER, "geopandas")
+        edges_gdf = gpd.GeoDataFrame(
+            {"centrality": self.values}, geometry=list(self.geometries), crs="EPSG:4326"
+        )
+        plt.close("all")
+        with tempfile.TemporaryDirectory() as directory:
+            for renderer in ("lines", "raster", "geopandas"):
+                output_path = os.path.join(directory, f"{renderer}.png")
+                plot_edges(edges_gdf, title=renderer, output_path=output_path, renderer=renderer)
+                self.assertTrue(os.path.getsize(output_path) > 0)
+            self.assertEqual(plt.get_fignums(), [])
+        ax = plot_edges(edges_gdf.iloc[:0])
+        self.assertEqual(ax.get_xlabel(), "Longitude")
+        plt.close("all")
+        with self.assertRaises(ValueError):
+            plot_edges(edges_gdf, renderer="svg")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+"""
+Unit test for the per-stage instrumentation of a run
+"""
+
+import os
+import json
+import time
+import tempfile
+import unittest
+from ..modules.module_instrumentation import (
+    enable_profiling, disable_profiling, stage, REPORT_FILE,
+)
+from .test_startup import run_python
+
+
+class TestInstrumentation(unittest.TestCase):
+    """
+    Test class for the run profiler.
+    """
+    def tearDown(self):
+        """
+        Switch profiling off after every test.
+        """
+        disable_profiling()
+
+    def test_disabled(self):
+        """
+        Test if stages are not recorded and cost little while profiling is off.
+        """
+        with stage("routing", routes=5) as counts:
+            counts["retries"] = 1
+        self.assertIsNone(disable_profiling())
+
+        start = time.perf_counter()
+        for _ in range(10000):
+            with stage("routing"):
+                pass
+        self.assertLess(time.perf_counter() - start, 0.5)
+
+    def test_report(self):
+        """
+        Test if nested stages are recorded with their counts and written to the report.
+        """
+        profiler = enable_profiling(region="Synthetic")
+        with stage("routing", routing="tree") as counts:
+            with stage("od_sampling", pairs=10):
+                sum(range(100000))
+            counts["routes"] = 10
+        with self.assertRaises(KeyError):
+            with stage("failing"):
+                raise KeyError("stage")
+        self.assertIs(disable_profiling(), profiler)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = profiler.write_report(directory)
+            self.assertEqual(os.path.basename(path), REPORT_FILE)
+            with open(path, encoding="utf-8") as report_file:
+                report = json.load(report_file)
+        self.assertEqual(report["metadata"], {"region": "Synthetic"})
+        stages = {record["stage"]: record for record in report["stages"]}
+        self.assertEqual(list(stages), ["routing/od_sampling", "routing", "failing"])
+        self.assertEqual(stages["routing"]["counts"], {"routing": "tree", "routes": 10})
+        self.assertEqual(stages["routing/od_sampling"]["counts"], {"pairs": 10})
+        for record in report["stages"]:
+            self.assertGreaterEqual(record["wall_seconds"], 0)
+            self.assertGreaterEqual(record["cpu_seconds"], 0)
+        self.assertGreaterEqual(
+            stages["routing"]["wall_seconds"], stages["routing/od_sampling"]["wall_seconds"]
+        )
+
+    def test_report_of_failed_run(self):
+        """
+        Test if Main.py writes the report of a profiled run which exits early, here because
+        the graph is not in the offline cache.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            process, _ = run_python(
+                "Main.py", "Synth,Land", "networkx", "length", "--backend", "csr",
+                "--graph-file", os.path.join(directory, "graph"), "--offline",
+                "--cache-dir", os.path.join(directory, "cache"),
+                "--output-folder", os.path.join(directory, "output"), "--profile",
+            )
+            self.assertEqual(process.returncode, 1, process.stderr)
+            path = os.path.join(
+                directory, "output", "Output_Synth_Land_networkx_length", REPORT_FILE
+            )
+            with open(path, encoding="utf-8") as report_file:
+                report = json.load(report_file)
+        self.assertEqual(report["metadata"]["region"], "Synth,Land")
+        self.assertEqual([record["stage"] for record in report["stages"]], ["download"])
+
+
+if __name__ == '__main__':
+    unittest.main()
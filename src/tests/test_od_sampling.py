@@ -0,0 +1,308 @@
+"""
+Unit test to check the batched origin destination sampling of geographical centrality.
+"""
+
+import pickle
+import random
+import unittest
+from unittest import mock
+import numpy as np
+import networkx as nx
+import pandas as pd
+import geopandas as gpd
+import osmnx as ox
+from shapely.geometry import box
+from ..modules.module_geographical_centrality import GeographicalCentrality
+from ..modules.module_csr_graph import CsrGraph
+from ..modules.module_reachability import ReachabilityIndex
+from ..modules.module_route_trees import tree_route_loads
+from ..modules.module_random_routes import RandomRoutes, route_blocks, load_stability
+
+
+class TestOdSampling(unittest.TestCase):
+    """
+    Test class for the batched origin destination sampling.
+    """
+    def setUp(self):
+        """
+        Set up a GeographicalCentrality instance on a small street grid with two separate
+        parts and a study area polygon covering both.
+        """
+        graph = nx.MultiDiGraph(crs="EPSG:4326")
+        for i in range(10):
+            for j in range(10):
+                graph.add_node(i * 10 + j, x=8.7 + 0.002 * i, y=49.4 + 0.002 * j)
+        for i in range(10):
+            for j in range(10):
+                for a, b in ((i + 1, j), (i, j + 1)):
+                    # No streets between the columns 4 and 5
+                    if a < 10 and b < 10 and not (i == 4 and a == 5):
+                        graph.add_edge(i * 10 + j, a * 10 + b, osmid=i, length=200.0)
+                        graph.add_edge(a * 10 + b, i * 10 + j, osmid=j, length=200.0)
+
+        self.gc_instance = GeographicalCentrality(
+            study_area=None,
+            weight="length",
+            graph=graph,
+            edges_df=None,
+            number_of_routes=20
+        )
+        self.gc_instance.poly_study_area = gpd.GeoDataFrame(
+            geometry=[box(8.699, 49.399, 8.719, 49.419)], crs="EPSG:4326")
+
+    def test_sample_od_nodes(self):
+        """
+        Test if sampled pairs are distinct nodes of the same component and are snapped to
+        their nearest nodes.
+        """
+        graph = self.gc_instance.graph
+        origins, destinations = self.gc_instance.sample_od_nodes(graph, 500)
+        self.assertEqual(len(origins), 500)
+        self.assertEqual(len(destinations), 500)
+        self.assertTrue((origins != destinations).all())
+
+        csr_graph = self.gc_instance.get_csr_graph(graph)
+        self.assertTrue(((csr_graph.node_x[origins] < 8.709)
+                         == (csr_graph.node_x[destinations] < 8.709)).all())
+
+        x, y = self.gc_instance.random_coordinates_in_polygon(200)
+        nearest = self.gc_instance.get_node_locator(graph).nearest(x, y)
+        distances = np.hypot(
+            (csr_graph.node_x[None, :] - x[:, None]) * np.cos(np.radians(49.41)),
+            csr_graph.node_y[None, :] - y[:, None],
+        )
+        self.assertTrue((nearest == distances.argmin(axis=1)).all())
+
+    def test_reachability_index(self):
+        """
+        Test if the strongly connected component index agrees with nx.has_path on a sparse
+        random one-way network.
+        """
+        rng = random.Random(3)
+        graph = nx.MultiDiGraph()
+        graph.add_nodes_from(range(80))
+        for _ in range(120):
+            graph.add_edge(rng.randrange(80), rng.randrange(80))
+        index = ReachabilityIndex(CsrGraph.from_graph(graph, "length"))
+
+        origins = np.array([rng.randrange(80) for _ in range(400)])
+        destinations = np.array([rng.randrange(80) for _ in range(400)])
+        expected = [nx.has_path(graph, o, d) for o, d in zip(origins, destinations)]
+        self.assertEqual(index.reachable(origins, destinations).tolist(), expected)
+
+    def test_largest_component_only(self):
+        """
+        Test if route ends are snapped only to the largest strongly connected component.
+        """
+        graph = self.gc_instance.graph
+        self.gc_instance.largest_component_only = True
+        origins, destinations = self.gc_instance.sample_od_nodes(graph, 200)
+        largest = self.gc_instance.get_reachability_index(graph).largest_component_nodes()
+        self.assertTrue(np.isin(origins, largest).all())
+        self.assertTrue(np.isin(destinations, largest).all())
+
+    def test_generate_random_routes_counts(self):
+        """
+        Test if the routes are counted per edge and the centrality equals these counts.
+        """
+        graph = self.gc_instance.graph
+        _, self.gc_instance.edges_df = ox.graph_to_gdfs(graph)
+        routes_gdf = self.gc_instance.generate_random_routes(graph)
+
+        self.assertTrue((routes_gdf["count"] > 0).all())
+        self.assertTrue(routes_gdf.geometry.notnull().all())
+        self.assertEqual(routes_gdf["count"].sum(), self.gc_instance.edge_loads.sum())
+
+        self.gc_instance.analyze_centrality()
+        centrality_gdf = self.gc_instance.centrality_geographical_gdf
+        self.assertEqual(
+            sorted(centrality_gdf.columns), ["centrality", "geometry", "osmid"]
+        )
+        self.assertTrue((centrality_gdf["centrality"] == routes_gdf["count"]).all())
+
+    def test_tree_route_loads(self):
+        """
+        Test if routes taken from shortest path trees use the same edges as ox.shortest_path
+        on a network without equally short alternatives.
+        """
+        rng = random.Random(5)
+        graph = self.gc_instance.graph
+        for _, _, data in graph.edges(data=True):
+            data["length"] = rng.uniform(100, 300)
+        csr_graph = CsrGraph.from_graph(graph, "length")
+
+        origins = np.repeat(csr_graph.node_indices([0, 11, 42]), 4)
+        destinations = csr_graph.node_indices([3, 27, 44, 0, 2, 33, 40, 35, 1, 30, 49, 42])
+        loads, routed = tree_route_loads(csr_graph, origins, destinations)
+
+        expected = np.zeros(csr_graph.number_of_edges, dtype=np.int64)
+        for origin, destination in zip(origins, destinations):
+            route = ox.shortest_path(
+                graph, csr_graph.nodes[origin], csr_graph.nodes[destination], weight="length"
+            )
+            if route is not None and len(route) > 1:
+                expected[csr_graph.route_edges(route)] += 1
+        self.assertEqual(routed.tolist(), [True] * 3 + [False] + [True] * 7 + [False])
+        self.assertTrue((loads == expected).all())
+
+    def test_tree_routing_mode(self):
+        """
+        Test if tree routing with several destinations per origin uses the same edges as
+        shortest path routing. The lengths are random, so every shortest path is unique.
+        """
+        graph = self.gc_instance.graph
+        rng = np.random.default_rng(6)
+        for _, _, data in graph.edges(data=True):
+            data["length"] = float(rng.uniform(100, 300))
+        self.gc_instance.destinations_per_origin = 5
+        self.gc_instance.number_of_routes = 53
+        self.gc_instance.seed = 8
+        origins, destinations = self.gc_instance.sample_od_nodes(graph, 53)
+        self.assertEqual(len(origins), 53)
+        self.assertLessEqual(len(np.unique(origins)), 53)
+
+        loads = {}
+        for routing in ("shortest_path", "tree"):
+            self.gc_instance.routing = routing
+            self.gc_instance.generate_random_routes(graph)
+            loads[routing] = self.gc_instance.edge_loads
+        self.assertGreater(loads["tree"].sum(), 53)
+        self.assertTrue(np.array_equal(loads["tree"], loads["shortest_path"]))
+
+    def test_parallel_routes(self):
+        """
+        Test if the same seed gives the same edge loads for any number of workers, and if
+        the route generator can be sent to worker processes.
+        """
+        graph = self.gc_instance.graph
+        self.gc_instance.routing = "tree"
+        self.gc_instance.number_of_routes = 2500
+        self.gc_instance.seed = 11
+        loads = []
+        for workers in (1, 3):
+            self.gc_instance.workers = workers
+            self.gc_instance.generate_random_routes(graph)
+            loads.append(self.gc_instance.edge_loads)
+        self.assertTrue(np.array_equal(loads[0], loads[1]))
+        self.assertGreaterEqual(loads[0].sum(), 2500)
+        self.gc_instance.seed = 12
+        self.gc_instance.generate_random_routes(graph)
+        self.assertFalse(np.array_equal(loads[0], self.gc_instance.edge_loads))
+
+        blocks = route_blocks(45, np.random.SeedSequence(1), 20)
+        self.assertEqual([number for number, _ in blocks], [20, 20, 5])
+        for _, _, data in graph.edges(data=True):
+            data["highway"] = "residential"
+        self.gc_instance.weight = "travel_time"
+        self.gc_instance.get_graph_travel_time()
+        random_routes = RandomRoutes(
+            self.gc_instance.get_csr_graph(graph), self.gc_instance.get_point_sampler(),
+            self.gc_instance.get_node_locator(graph),
+            self.gc_instance.get_reachability_index(graph), routing="shortest_path",
+            graph=graph, weight=self.gc_instance.get_speed_engine(graph).weight_function(),
+        )
+        serial = random_routes.edge_loads(45, seed=5, block_size=20)
+        parallel = pickle.loads(pickle.dumps(random_routes)).edge_loads(
+            45, seed=5, workers=2, block_size=20
+        )
+        self.assertTrue(np.array_equal(serial[0], parallel[0]))
+        self.assertEqual(serial[1:], parallel[1:])
+        self.assertEqual(serial[1], 3)
+
+    def test_adaptive_routes(self):
+        """
+        Test if adaptive route generation stops once the loads are stable or a limit is
+        reached, reproducibly for any number of workers.
+        """
+        previous = np.array([0, 1, 2, 3, 4])
+        self.assertEqual(load_stability(previous, 2 * previous, top_n=2), (1.0, 1.0))
+        correlation, overlap = load_stability(previous, previous[::-1], top_n=2)
+        self.assertLess(correlation, 0)
+        self.assertEqual(overlap, 0)
+
+        graph = self.gc_instance.graph
+        self.gc_instance.routing = "tree"
+        self.gc_instance.number_of_routes = 500
+        self.gc_instance.seed = 4
+        self.gc_instance.adaptive = True
+        self.gc_instance.tolerance = 0.1
+        results = []
+        for workers in (1, 2):
+            self.gc_instance.workers = workers
+            # The worker processes are started once for all batches
+            with mock.patch.object(
+                RandomRoutes, "worker_pool", autospec=True, side_effect=RandomRoutes.worker_pool
+            ) as worker_pool:
+                self.gc_instance.generate_random_routes(graph)
+            self.assertEqual(worker_pool.call_count, 1)
+            results.append((self.gc_instance.edge_loads, self.gc_instance.convergence))
+        (loads, convergence), (parallel_loads, parallel_convergence) = results
+        self.assertTrue(np.array_equal(loads, parallel_loads))
+        self.assertEqual(convergence["routes"], parallel_convergence["routes"])
+        self.assertEqual(convergence["stop_reason"], "tolerance")
+        self.assertTrue(convergence["converged"])
+        self.assertGreaterEqual(convergence["batches"], 3)
+        self.assertEqual(convergence["routes"], 500 * convergence["batches"])
+        self.assertGreaterEqual(convergence["rank_correlation"], 0.9)
+
+        self.gc_instance.tolerance = 0
+        self.gc_instance.max_routes = 1200
+        self.gc_instance.generate_random_routes(graph)
+        self.assertEqual(self.gc_instance.convergence["stop_reason"], "max_routes")
+        self.assertEqual(self.gc_instance.convergence["routes"], 1200)
+        self.assertEqual(
+            [record["routes"] for record in self.gc_instance.convergence["history"]],
+            [500, 1000, 1200],
+        )
+        self.gc_instance.max_routes = 300
+        self.gc_instance.generate_random_routes(graph)
+        self.assertEqual(self.gc_instance.convergence["routes"], 300)
+        self.assertEqual(self.gc_instance.convergence["batches"], 1)
+        self.gc_instance.max_routes = None
+        with self.assertRaises(ValueError):
+            self.gc_instance.generate_random_routes(graph)
+        self.gc_instance.time_budget = 1e-9
+        self.gc_instance.generate_random_routes(graph)
+        self.assertEqual(self.gc_instance.convergence["stop_reason"], "time_budget")
+        self.assertEqual(self.gc_instance.convergence["batches"], 1)
+
+    def test_demand_loads(self):
+        """
+        Test if the demand between zones is routed over the edges of shortest routes and
+        demand without a route is reported.
+        """
+        graph = self.gc_instance.graph
+        zones = gpd.GeoDataFrame(
+            geometry=[
+                box(8.699, 49.399, 8.709, 49.409),
+                box(8.699, 49.409, 8.709, 49.419),
+                box(8.709, 49.399, 8.719, 49.419),
+            ],
+            index=["a", "b", "c"], crs="EPSG:4326",
+        )
+        demand = pd.DataFrame(
+            [[0.0, 10.0, 3.0], [5.0, 0.0, 0.0], [0.0, 0.0, 2.0]],
+            index=["a", "b", "c"], columns=["a", "b", "c"],
+        )
+        routes_gdf = self.gc_instance.generate_demand_loads(graph, zones, demand)
+
+        csr_graph = self.gc_instance.get_csr_graph(graph)
+        a, b, _ = self.gc_instance.zone_nodes(graph, zones)[:, 0]
+        distance = nx.shortest_path_length(
+            graph, csr_graph.nodes[a], csr_graph.nodes[b], weight="length"
+        )
+        assigned = (self.gc_instance.edge_loads * csr_graph.weights).sum()
+        self.assertAlmostEqual(assigned, 15.0 * distance)
+        self.assertEqual(self.gc_instance.unassigned_demand, 5.0)
+        self.assertAlmostEqual(routes_gdf["count"].sum(), self.gc_instance.edge_loads.sum())
+
+        self.gc_instance.generate_demand_loads(
+            graph, zones, demand.loc[["a"], ["b"]], points_per_zone=3
+        )
+        self.assertGreater(self.gc_instance.edge_loads.sum(), 0)
+        with self.assertRaises(ValueError):
+            self.gc_instance.generate_demand_loads(graph, zones, -demand)
+
+
+if __name__ == '__main__':
+    unittest.main()
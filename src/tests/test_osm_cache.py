@@ -0,0 +1,116 @@
+"""
+Unit test for the on-disk cache of OpenStreetMap data.
+"""
+
+import io
+import os
+import time
+import pickle
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+import networkx as nx
+from ..modules.module_osm_cache import OsmCache, CacheMissError
+from ..modules.module_create_region import Region
+from .test_startup import run_python
+
+
+class TestOsmCache(unittest.TestCase):
+    """
+    Test class for the OsmCache module.
+    """
+    def setUp(self):
+        """
+        Set up an empty cache folder.
+        """
+        self.temporary_directory = tempfile.TemporaryDirectory()
+        self.directory = self.temporary_directory.name
+
+    def tearDown(self):
+        """
+        Remove the cache folder.
+        """
+        self.temporary_directory.cleanup()
+
+    def test_get_or_create(self):
+        """
+        Test if data is created once and then loaded from the cache, also in offline mode.
+        """
+        calls = []
+        cache = OsmCache(self.directory)
+        first = cache.get_or_create("graph", lambda: calls.append(1) or {"a": 1}, region="X")
+        second = cache.get_or_create("graph", lambda: calls.append(1) or {"a": 2}, region="X")
+        self.assertEqual(first, {"a": 1})
+        self.assertEqual(second, {"a": 1})
+        self.assertEqual(len(calls), 1)
+
+        offline_cache = OsmCache(self.directory, offline=True)
+        self.assertEqual(offline_cache.get_or_create("graph", dict, region="X"), {"a": 1})
+        with self.assertRaises(CacheMissError):
+            offline_cache.get_or_create("graph", dict, region="Y")
+
+    def test_failed_write(self):
+        """
+        Test if no partly written file is left in the cache if the data can not be stored.
+        """
+        cache = OsmCache(self.directory)
+        with self.assertRaises((pickle.PicklingError, AttributeError)):
+            cache.get_or_create("graph", lambda: {"a": lambda: None}, region="X")
+        self.assertEqual(os.listdir(self.directory), [])
+        self.assertFalse(cache.contains("graph", region="X"))
+
+    def test_cached_graph_message(self):
+        """
+        Test if a graph loaded from the cache is not reported as downloaded.
+        """
+        OsmCache(self.directory).get_or_create(
+            "graph", nx.MultiDiGraph, region="X", network_type="drive"
+        )
+        output = io.StringIO()
+        with redirect_stdout(output):
+            Region("X", "drive", cache=OsmCache(self.directory, offline=True)).download_graph()
+        self.assertIn("Loaded from the cache.", output.getvalue())
+        self.assertNotIn("Download complete.", output.getvalue())
+
+    def test_least_recently_used_eviction(self):
+        """
+        Test if the least recently used entry is deleted once the size limit is exceeded.
+        """
+        cache = OsmCache(self.directory, max_bytes=2500)
+        cache.get_or_create("graph", lambda: b"0" * 1000, region="A")
+        time.sleep(0.01)
+        cache.get_or_create("graph", lambda: b"0" * 1000, region="B")
+        time.sleep(0.01)
+        cache.get_or_create("graph", lambda: b"1", region="A")
+        time.sleep(0.01)
+        cache.get_or_create("graph", lambda: b"0" * 1000, region="C")
+
+        self.assertTrue(os.path.exists(cache.path("graph", region="A")))
+        self.assertFalse(os.path.exists(cache.path("graph", region="B")))
+        self.assertTrue(os.path.exists(cache.path("graph", region="C")))
+
+    def test_offline_polygon_miss(self):
+        """
+        Test if Main.py exits with an error message instead of a traceback if the graph of
+        the study area is cached but its polygon is not.
+        """
+        graph = nx.MultiDiGraph(crs="EPSG:4326")
+        graph.add_node(1, x=8.7, y=49.4)
+        graph.add_node(2, x=8.71, y=49.41)
+        graph.add_edge(1, 2, osmid=1, length=1300.0)
+        graph.add_edge(2, 1, osmid=1, length=1300.0)
+        OsmCache(self.directory).get_or_create(
+            "graph", lambda: graph, region="Synth,Land", network_type="drive"
+        )
+        process, _ = run_python(
+            "Main.py", "Synth,Land", "geographical", "length", "10", "--offline",
+            "--cache-dir", self.directory,
+            "--output-folder", os.path.join(self.directory, "output"),
+        )
+        self.assertEqual(process.returncode, 1, process.stderr)
+        self.assertNotIn("Traceback", process.stderr)
+        self.assertIn("Error downloading OpenStreetMap data: No cached polygon", process.stdout)
+
+
+if __name__ == '__main__':
+    unittest.main()
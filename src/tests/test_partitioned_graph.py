@@ -0,0 +1,157 @@
+"""
+Unit test for the tiled routing of networks too large for the memory.
+"""
+
+import os
+import tempfile
+import unittest
+import numpy as np
+import networkx as nx
+import geopandas as gpd
+from shapely.geometry import box
+from ..modules.module_compact_graph import CompactGraph
+from ..modules.module_partitioned_graph import PartitionedGraph
+from ..modules.module_route_trees import tree_route_loads
+from ..modules.module_geographical_centrality import GeographicalCentrality
+
+
+class TestPartitionedGraph(unittest.TestCase):
+    """
+    Test class for the PartitionedGraph module.
+    """
+    def setUp(self):
+        """
+        Set up a street grid with random lengths, one-way streets, parallel edges and a
+        node which can not be reached, saved as compact graph and split into 16 tiles.
+        """
+        rng = np.random.default_rng(4)
+        graph = nx.MultiDiGraph(crs="EPSG:4326")
+        for i in range(12):
+            for j in range(12):
+                graph.add_node(i * 12 + j, x=8.7 + 0.002 * i, y=49.4 + 0.002 * j)
+        for i in range(12):
+            for j in range(12):
+                for a, b in ((i + 1, j), (i, j + 1)):
+                    if a < 12 and b < 12:
+                        length = float(rng.uniform(100, 300))
+                        graph.add_edge(i * 12 + j, a * 12 + b, osmid=i, length=length,
+                                       highway="residential")
+                        if rng.random() < 0.8:
+                            graph.add_edge(a * 12 + b, i * 12 + j, osmid=j, length=length,
+                                           highway="residential")
+                        if rng.random() < 0.1:
+                            graph.add_edge(i * 12 + j, a * 12 + b, osmid=i, highway="primary",
+                                           length=length * 0.9)
+        graph.add_node(144, x=8.6995, y=49.3995)
+        graph.add_edge(144, 0, osmid=144, length=50.0, highway="residential")
+        self.graph = graph
+        self.temporary_directory = tempfile.TemporaryDirectory()
+        self.graph_folder = os.path.join(self.temporary_directory.name, "graph")
+        CompactGraph.from_graph(graph).save(self.graph_folder)
+        self.compact_graph = CompactGraph.load(self.graph_folder)
+        self.partition_folder = os.path.join(self.temporary_directory.name, "partition")
+        self.partition = PartitionedGraph.build(
+            self.compact_graph, self.compact_graph.length, self.partition_folder, 0.006,
+            chunk_size=7,
+        )
+
+    def tearDown(self):
+        """
+        Remove the compact graph and the partition.
+        """
+        self.temporary_directory.cleanup()
+
+    def test_tiles(self):
+        """
+        Test if every node and every edge inside a tile is stored in exactly one tile, and
+        if a saved partition is only reused for the same tile size and weights.
+        """
+        self.assertEqual(self.partition.number_of_tiles, 16)
+        number_of_nodes = self.compact_graph.number_of_nodes
+        node_indices = self.partition.node_indices(np.arange(number_of_nodes))
+        self.assertTrue(np.array_equal(np.sort(node_indices), np.arange(number_of_nodes)))
+
+        edge_ids = [
+            self.partition.load_tile(tile).edge_ids
+            for tile in range(16) if self.partition.node_offsets[tile + 1] >
+            self.partition.node_offsets[tile]
+        ]
+        cut_edges = self.partition.overlay_kinds[self.partition.overlay_kinds >= 0]
+        edge_ids = np.concatenate(edge_ids + [cut_edges])
+        self.assertEqual(len(edge_ids), len(np.unique(edge_ids)))
+        # Only the heavier of the parallel edges between tiles are missing
+        self.assertLessEqual(len(edge_ids), self.compact_graph.number_of_edges)
+        self.assertGreater(len(edge_ids), self.compact_graph.number_of_edges * 0.9)
+        self.assertFalse(os.path.exists(os.path.join(self.partition_folder, "node_tile.npy")))
+
+        _, loaded = PartitionedGraph.load_or_build(
+            self.partition_folder, self.compact_graph, self.compact_graph.length, 0.006
+        )
+        self.assertTrue(loaded)
+        # Changed weights with the same number of nodes and edges are not reused
+        doubled = 2 * np.asarray(self.compact_graph.length)
+        partition, loaded = PartitionedGraph.load_or_build(
+            self.partition_folder, self.compact_graph, doubled, 0.006
+        )
+        self.assertFalse(loaded)
+        self.assertTrue(np.array_equal(
+            partition.overlay_weights, 2 * self.partition.overlay_weights
+        ))
+        partition, loaded = PartitionedGraph.load_or_build(
+            self.partition_folder, self.compact_graph, self.compact_graph.length, 0.01
+        )
+        self.assertFalse(loaded)
+        self.assertEqual(partition.number_of_tiles, 9)
+
+    def test_route_loads(self):
+        """
+        Test if the tiled routes use the edges of the routes on the whole graph.
+        """
+        number_of_nodes = self.compact_graph.number_of_nodes
+        partition_index = np.empty(number_of_nodes, dtype=np.int64)
+        partition_index[self.partition.node_indices(np.arange(number_of_nodes))] = np.arange(
+            number_of_nodes
+        )
+        rng = np.random.default_rng(6)
+        origins = np.append(rng.integers(number_of_nodes, size=500), [0, 144, 5])
+        destinations = np.append(rng.integers(number_of_nodes, size=500), [144, 143, 5])
+
+        loads = np.zeros(self.compact_graph.number_of_edges, dtype=np.int64)
+        routed = self.partition.route_loads(
+            partition_index[origins], partition_index[destinations], loads
+        )
+        expected_loads, expected_routed = tree_route_loads(
+            self.compact_graph.csr_graph("length"), origins, destinations
+        )
+        self.assertTrue(np.array_equal(routed, expected_routed))
+        self.assertEqual(routed[-3:].tolist(), [False, True, False])
+        self.assertTrue(np.array_equal(loads, expected_loads))
+
+    def test_partitioned_routes(self):
+        """
+        Test if geographical centrality routes tile by tile and stores the partition in the
+        folder of the compact graph.
+        """
+        results = []
+        for _ in range(2):
+            gc_instance = GeographicalCentrality(
+                study_area=None, weight="travel_time", graph=self.compact_graph,
+                edges_df=None, number_of_routes=300, seed=3, tile_size=0.006,
+            )
+            gc_instance.poly_study_area = gpd.GeoDataFrame(
+                geometry=[box(8.699, 49.399, 8.723, 49.423)], crs="EPSG:4326"
+            )
+            gc_instance.get_graph_travel_time()
+            routes_gdf = gc_instance.generate_random_routes(self.compact_graph)
+            results.append(routes_gdf)
+        self.assertTrue(os.path.isdir(os.path.join(
+            self.graph_folder, "partition", "travel_time_free_flow_0.006"
+        )))
+        self.assertEqual(list(results[0].index.names), ["u", "v", "key"])
+        self.assertGreaterEqual(results[0]["count"].sum(), 300)
+        self.assertTrue(results[0]["count"].equals(results[1]["count"]))
+        self.assertIn("geometry", results[0].columns)
+
+
+if __name__ == '__main__':
+    unittest.main()
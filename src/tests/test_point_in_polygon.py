@@ -4,9 +4,11 @@ for geographical centrality
 """
 
 import unittest
+import numpy as np
 import geopandas as gpd
-from shapely.geometry import Polygon
+from shapely.geometry import Polygon, box
 from ..modules.module_geographical_centrality import GeographicalCentrality
+from ..modules.module_polygon_sampler import PolygonSampler
 
 
 class TestGeographicalCentrality(unittest.TestCase):
@@ -62,6 +64,26 @@ class TestGeographicalCentrality(unittest.TestCase):
 
         print("All points are within the study area polygon.")
 
+    def test_polygon_sampler_uniform(self):
+        """
+        Test the vectorized sampler on a thin L-shaped polygon which fills only a small
+        part of its bounding box.
+        Test checks:
+        1. All sampled coordinates are within the polygon.
+        2. The share of points in one leg of the polygon matches its share of the area.
+        """
+        l_shape = Polygon([(0, 0), (10, 0), (10, 0.5), (0.5, 0.5), (0.5, 10), (0, 10)])
+        sampler = PolygonSampler(l_shape)
+        x, y = sampler.sample(100000, rng=np.random.default_rng(0))
+
+        self.assertEqual(len(x), 100000)
+        self.assertTrue(((x >= 0) & (y >= 0) & ((x <= 0.5) | (y <= 0.5))).all())
+
+        leg = box(0.5, 0, 10, 0.5)
+        expected_share = leg.area / l_shape.area
+        observed_share = ((x > 0.5) & (y < 0.5)).mean()
+        self.assertAlmostEqual(observed_share, expected_share, delta=0.01)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,94 @@
+"""
+Unit test for the population weighted sampling of route ends
+"""
+
+import os
+import tempfile
+import unittest
+import numpy as np
+import geopandas as gpd
+from shapely.geometry import box
+from ..modules.module_geographical_centrality import GeographicalCentrality
+from ..modules.module_population_sampler import AliasTable, PopulationSampler, rasterio
+
+
+class TestPopulationSampler(unittest.TestCase):
+    """
+    Unit test for the alias table and the PopulationSampler class.
+    """
+    def setUp(self):
+        """
+        Set up a sampler of three populated 0.01 degree cells.
+        """
+        self.sampler = PopulationSampler(
+            cell_x=[8.705, 8.715, 8.725],
+            cell_y=[49.405, 49.405, 49.415],
+            population=[10.0, 0.0, 30.0],
+            cell_width=0.01,
+            cell_height=0.01,
+            crs="EPSG:4326",
+        )
+
+    def test_alias_table_frequencies(self):
+        """
+        Test if indices are drawn proportional to their weights.
+        """
+        weights = np.array([1.0, 0.0, 2.0, 5.0, 2.0])
+        table = AliasTable(weights)
+        draws = table.sample(200000, np.random.default_rng(1))
+        frequencies = np.bincount(draws, minlength=len(weights)) / len(draws)
+        np.testing.assert_allclose(frequencies, weights / weights.sum(), atol=0.005)
+        with self.assertRaises(ValueError):
+            AliasTable([0.0, 0.0])
+
+    def test_points_in_populated_cells(self):
+        """
+        Test if sampled points lie in populated cells, weighted by their population.
+        """
+        x, y = self.sampler.sample(20000, np.random.default_rng(2))
+        cells = np.floor((x - 8.70) / 0.01).astype(int)
+        self.assertTrue(np.isin(cells, [0, 2]).all())
+        first = cells == 0
+        self.assertTrue(((y[first] > 49.40) & (y[first] < 49.41)).all())
+        self.assertTrue(((y[~first] > 49.41) & (y[~first] < 49.42)).all())
+        self.assertAlmostEqual(first.mean(), 0.25, delta=0.02)
+
+    def test_population_sampling_strategy(self):
+        """
+        Test if GeographicalCentrality samples route ends with the population sampler.
+        """
+        centrality = GeographicalCentrality(
+            study_area=None, weight=None, graph=None, edges_df=None, number_of_routes=10,
+            sampling="population",
+        )
+        centrality.poly_study_area = gpd.GeoDataFrame(
+            geometry=[box(8.70, 49.40, 8.73, 49.42)], crs="EPSG:4326"
+        )
+        centrality.population_sampler = self.sampler
+        centrality.population_polygon = centrality.poly_study_area.geometry.values[0]
+        points = centrality.random_points_in_polygon(100)
+        self.assertEqual(len(points), 100)
+        self.assertFalse(((points["x"] > 8.71) & (points["x"] < 8.72)).any())
+        with self.assertRaises(ValueError):
+            GeographicalCentrality(None, None, None, None, 10, sampling="census")
+
+    @unittest.skipIf(rasterio is None, "rasterio is not installed")
+    def test_from_raster(self):
+        """
+        Test if only the populated cells inside the polygon are read from a raster.
+        """
+        from rasterio.transform import from_origin
+        population = np.arange(16, dtype=np.float32).reshape(4, 4)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "population.tif")
+            with rasterio.open(
+                path, "w", driver="GTiff", width=4, height=4, count=1, dtype="float32",
+                crs="EPSG:4326", transform=from_origin(8.70, 49.44, 0.01, 0.01),
+            ) as raster:
+                raster.write(population, 1)
+            sampler = PopulationSampler.from_raster(path, box(8.709, 49.409, 8.731, 49.431))
+        self.assertEqual(sorted(sampler.population.tolist()), [5.0, 6.0, 9.0, 10.0])
+
+
+if __name__ == '__main__':
+    unittest.main()
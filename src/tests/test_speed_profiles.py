@@ -0,0 +1,183 @@
+"""
+Unit test for the vectorized travel times of the speed profiles.
+"""
+
+import os
+import copy
+import tempfile
+import unittest
+import numpy as np
+import networkx as nx
+import osmnx as ox
+from ..modules.module_compact_graph import CompactGraph
+from ..modules.module_networkx_centrality import NetworkxCentrality
+from ..modules.module_speed_profiles import (
+    SpeedEngine, HWY_SPEEDS, SPEED_PROFILES, RUSH_HOUR_FACTORS, write_travel_time,
+)
+from ..modules.module_options import SPEED_PROFILE_NAMES
+
+
+class TestSpeedProfiles(unittest.TestCase):
+    """
+    Test class for the SpeedEngine module.
+    """
+    def setUp(self):
+        """
+        Set up a small street grid with tagged and untagged speeds, merged edges and a
+        highway class without a default speed.
+        """
+        classes = [
+            "residential", "primary", "cycleway", "bus_guideway", ["secondary", "primary"],
+            "motorway",
+        ]
+        maxspeeds = [
+            None, "50", "20", None, ["50", "30 mph"], "walk", None, "50|70", "7,5 km/h",
+            ["walk", "none"],
+        ]
+        graph = nx.MultiDiGraph(crs="EPSG:4326")
+        for i in range(6):
+            for j in range(6):
+                graph.add_node(i * 6 + j, x=8.7 + 0.002 * i, y=49.4 + 0.002 * j)
+        number = 0
+        for i in range(6):
+            for j in range(6):
+                for a, b in ((i + 1, j), (i, j + 1)):
+                    if a < 6 and b < 6:
+                        for u, v in ((i * 6 + j, a * 6 + b), (a * 6 + b, i * 6 + j)):
+                            data = {"osmid": number, "length": 100.0 + 7 * (number % 13),
+                                    "highway": classes[number % 6]}
+                            if maxspeeds[number % 10] is not None:
+                                data["maxspeed"] = maxspeeds[number % 10]
+                            graph.add_edge(u, v, **data)
+                            number += 1
+        self.graph = graph
+
+    def test_free_flow_matches_osmnx(self):
+        """
+        Test if the free flow travel times equal those of ox.add_edge_travel_times and the
+        graph is not modified.
+        """
+        expected_graph = ox.add_edge_travel_times(
+            ox.add_edge_speeds(copy.deepcopy(self.graph), HWY_SPEEDS)
+        )
+        engine = SpeedEngine.from_graph(self.graph)
+        expected = np.array([
+            expected_graph.edges[edge]["travel_time"]
+            for edge in engine.csr_graph.edge_tuples()
+        ])
+        self.assertTrue(np.array_equal(engine.travel_time("free_flow"), expected))
+        self.assertFalse(any("travel_time" in data for _, _, data in self.graph.edges(data=True)))
+
+        compact_engine = SpeedEngine.from_compact_graph(CompactGraph.from_graph(self.graph))
+        self.assertTrue(np.array_equal(compact_engine.travel_time("free_flow"), expected))
+
+    def test_profiles(self):
+        """
+        Test if the profiles share the topology and slow down or cap the speeds.
+        """
+        engine = SpeedEngine.from_graph(self.graph)
+        free_flow = engine.speed_kph("free_flow")
+        factors = SPEED_PROFILES["rush_hour"].factors(engine.highway_names)[engine.highway]
+        # Both speeds are rounded to one decimal
+        self.assertTrue(np.allclose(engine.speed_kph("rush_hour"), free_flow * factors, atol=0.1))
+        self.assertGreater(len(np.unique(engine.speed_kph("rush_hour") / free_flow)), 1)
+        self.assertEqual(engine.speed_kph("truck").max(), 80)
+        self.assertTrue(np.array_equal(engine.speed_kph("truck"), np.minimum(free_flow, 80)))
+        self.assertTrue((engine.travel_time("rush_hour") >= engine.travel_time("free_flow")).all())
+        self.assertIs(engine.csr_graph_for("truck").targets, engine.csr_graph.targets)
+        with self.assertRaises(ValueError):
+            engine.travel_time("unknown")
+        # The command-line choices are kept apart from the profiles for a fast startup
+        self.assertEqual(SPEED_PROFILE_NAMES, tuple(SPEED_PROFILES))
+
+    def test_rush_hour_routes(self):
+        """
+        Test if the rush hour slows down main roads more than residential streets, so the
+        fastest route and the centrality ranking change compared to free flow.
+        """
+        self.assertLess(RUSH_HOUR_FACTORS["primary"], RUSH_HOUR_FACTORS["residential"])
+        graph = nx.MultiDiGraph(crs="EPSG:4326")
+        for node, (x, y) in enumerate(((8.7, 49.4), (8.71, 49.4), (8.705, 49.401))):
+            graph.add_node(node, x=x, y=y)
+        for u, v, length, highway in (
+            (0, 1, 1000.0, "primary"), (0, 2, 240.0, "residential"),
+            (2, 1, 240.0, "residential"),
+        ):
+            graph.add_edge(u, v, length=length, highway=highway)
+            graph.add_edge(v, u, length=length, highway=highway)
+        engine = SpeedEngine.from_graph(graph)
+        routes = {
+            profile: nx.shortest_path(graph, 0, 1, weight=engine.weight_function(profile))
+            for profile in ("free_flow", "rush_hour")
+        }
+        self.assertEqual(routes, {"free_flow": [0, 1], "rush_hour": [0, 2, 1]})
+
+        edges_df = ox.graph_to_gdfs(self.graph, nodes=False)
+        rankings = {}
+        for profile in ("free_flow", "rush_hour"):
+            result = NetworkxCentrality(weight="travel_time", backend="csr").get_centrality_fast(
+                self.graph, edges_df, speed_profile=profile
+            )
+            rankings[profile] = result["centrality"].rank(method="first").tolist()
+        self.assertNotEqual(rankings["free_flow"], rankings["rush_hour"])
+
+    def test_write_travel_time(self):
+        """
+        Test if the travel times written in chunks to a file equal those of the engine.
+        """
+        compact_graph = CompactGraph.from_graph(self.graph)
+        engine = SpeedEngine.from_compact_graph(compact_graph)
+        with tempfile.TemporaryDirectory() as directory:
+            for profile in SPEED_PROFILES:
+                path = os.path.join(directory, f"{profile}.npy")
+                travel_time = write_travel_time(compact_graph, path, profile, chunk_size=7)
+                self.assertTrue(np.array_equal(travel_time, engine.travel_time(profile)))
+                self.assertTrue(np.array_equal(np.load(path), engine.travel_time(profile)))
+                del travel_time
+
+    def test_fastest_centrality(self):
+        """
+        Test if both backends reproduce the centrality on travel times added by osmnx.
+        """
+        expected_graph = ox.add_edge_travel_times(
+            ox.add_edge_speeds(copy.deepcopy(self.graph), HWY_SPEEDS)
+        )
+        expected = nx.edge_betweenness_centrality(expected_graph, weight="travel_time")
+        edges_df = ox.graph_to_gdfs(self.graph, nodes=False)
+        for backend in ("networkx", "csr"):
+            centrality = NetworkxCentrality(weight="travel_time", backend=backend)
+            result = centrality.get_centrality_fast(self.graph, edges_df)
+            self.assertTrue(np.allclose(
+                result["centrality"], [expected[edge] for edge in result.index]
+            ))
+
+    def test_parallel_edges(self):
+        """
+        Test if only the faster of two parallel edges with different maxspeeds gets the
+        centrality of their node pair.
+        """
+        graph = copy.deepcopy(self.graph)
+        for u, v in ((0, 1), (1, 0), (7, 13)):
+            graph.add_edge(u, v, osmid=1000 + u, length=graph.edges[u, v, 0]["length"],
+                           highway="motorway", maxspeed="130")
+        expected_graph = ox.add_edge_travel_times(
+            ox.add_edge_speeds(copy.deepcopy(graph), HWY_SPEEDS)
+        )
+        expected = nx.edge_betweenness_centrality(expected_graph, weight="travel_time")
+        self.assertEqual(expected[(0, 1, 0)], 0)
+        self.assertGreater(expected[(0, 1, 1)], 0)
+
+        weight = SpeedEngine.from_graph(graph).weight_function()
+        self.assertEqual(weight(0, 1, {1: {}}), expected_graph.edges[0, 1, 1]["travel_time"])
+        self.assertEqual(weight(0, 1, graph[0][1]), expected_graph.edges[0, 1, 1]["travel_time"])
+        edges_df = ox.graph_to_gdfs(graph, nodes=False)
+        for backend in ("networkx", "csr"):
+            centrality = NetworkxCentrality(weight="travel_time", backend=backend)
+            result = centrality.get_centrality_fast(graph, edges_df)
+            self.assertTrue(np.allclose(
+                result["centrality"], [expected[edge] for edge in result.index]
+            ))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+"""
+Unit test for the startup time of the command-line entry points
+"""
+
+import os
+import sys
+import time
+import tempfile
+import subprocess
+import unittest
+
+# Folder of Main.py and Batch.py
+SOURCE_FOLDER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Target for a usage error, the full imports of a run take several seconds
+STARTUP_SECONDS = 1.0
+# Libraries which must not be loaded before the arguments are checked
+HEAVY_MODULES = (
+    "numpy", "scipy", "pandas", "geopandas", "shapely", "pyproj", "networkx", "osmnx",
+    "matplotlib", "tkinter",
+)
+
+
+def run_python(*arguments):
+    """
+    Runs Python in the source folder.
+    :param arguments: command-line arguments of Python
+    :return tuple: completed process and its wall time in seconds
+    """
+    start = time.perf_counter()
+    process = subprocess.run(
+        [sys.executable, *arguments], cwd=SOURCE_FOLDER, capture_output=True, text=True,
+        check=False,
+    )
+    return process, time.perf_counter() - start
+
+
+class TestStartup(unittest.TestCase):
+    """
+    Test class for the startup of Main.py and Batch.py.
+    """
+    def test_no_heavy_imports(self):
+        """
+        Test if the entry points can be imported without loading heavy libraries.
+        """
+        process, _ = run_python(
+            "-c",
+            "import sys, Main, Batch; "
+            f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))",
+        )
+        self.assertEqual(process.returncode, 0, process.stderr)
+        self.assertEqual(process.stdout.strip(), "")
+
+    def test_usage_error_time(self):
+        """
+        Test if invalid arguments are reported within the startup time target.
+        """
+        for script, arguments in (
+            ("Main.py", ["Heidelberg", "networkx", "length", "--workers", "0"]),
+            ("Main.py", ["Heidelberg", "geographical", "length", "100", "--adaptive",
+                         "--tolerance", "0"]),
+            ("Main.py", []),
+            ("Batch.py", []),
+        ):
+            # The fastest of three runs is least affected by other processes
+            durations = []
+            for _ in range(3):
+                process, duration = run_python(script, *arguments)
+                self.assertEqual(process.returncode, 2, process.stderr)
+                self.assertIn("error", process.stderr)
+                durations.append(duration)
+            self.assertLess(min(durations), STARTUP_SECONDS, script)
+
+    def test_invalid_choices(self):
+        """
+        Test if an unknown module type or weight is rejected before an output folder is
+        created.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            for arguments in (["foo", "length"], ["networkx", "bar"]):
+                process, _ = run_python(
+                    "Main.py", "Heidelberg", *arguments, "--output-folder", directory
+                )
+                self.assertEqual(process.returncode, 2, process.stderr)
+                self.assertIn("invalid choice", process.stderr)
+            self.assertEqual(os.listdir(directory), [])
+
+
+if __name__ == '__main__':
+    unittest.main()